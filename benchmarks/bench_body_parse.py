@@ -0,0 +1,99 @@
+"""
+Microbenchmark for HTML body cleaning.
+
+Times html_to_text on every available backend over a corpus of HTML bodies,
+plus the content-hash cached parse_email_html path, and checks each backend
+produces the same text as the original html.parser code.
+
+    python -m benchmarks.bench_body_parse                  # synthetic newsletters
+    python -m benchmarks.bench_body_parse --corpus dumps/  # a directory of *.html
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from routers import email_body
+
+
+def synthetic_newsletter(i: int, sections: int = 40) -> str:
+    rnd = random.Random(i)
+    rows = []
+    for s in range(sections):
+        rows.append(
+            f'<tr><td style="padding:12px;font-family:Arial"><table width="100%"><tr>'
+            f'<td><img src="https://cdn.example.com/{i}/{s}.png" width="120"></td>'
+            f'<td><h2 style="color:#333">Story {s} for issue {i}</h2>'
+            f'<p>{" ".join(rnd.choice(["lorem", "ipsum", "dolor", "sit", "amet"]) for _ in range(60))}</p>'
+            f'<a href="https://click.example.com/?u={rnd.random()}">Read more&nbsp;&rarr;</a></td>'
+            f'</tr></table></td></tr>'
+        )
+    return (
+        f'<html><head><style>{"td{color:red}" * 200}</style></head><body>'
+        f'<table width="600" align="center">{"".join(rows)}</table>'
+        f'<script>var t = "{"x" * 2000}";</script>'
+        f'<p>Unsubscribe | Manage preferences</p></body></html>'
+    )
+
+
+def load_corpus(path: str):
+    docs = []
+    for name in sorted(os.listdir(path)):
+        if name.endswith((".html", ".htm")):
+            with open(os.path.join(path, name), encoding="utf-8", errors="ignore") as f:
+                docs.append(f.read())
+    return docs
+
+
+def available_backends():
+    backends = ["html.parser"]
+    if email_body._BS4_FEATURES == "lxml":
+        backends.append("lxml")
+    if email_body._SelectolaxParser is not None:
+        backends.append("selectolax")
+    return backends
+
+
+def time_each(fn, docs, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        for doc in docs:
+            start = time.perf_counter()
+            fn(doc)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(label: str, timings: list):
+    timings = sorted(timings)
+    print(f"{label:<22} p50={statistics.median(timings) * 1000:8.2f} ms  "
+          f"p95={timings[int(len(timings) * 0.95) - 1] * 1000:8.2f} ms  "
+          f"total={sum(timings):7.2f} s")
+
+
+def main(args):
+    docs = load_corpus(args.corpus) if args.corpus else [synthetic_newsletter(i) for i in range(args.count)]
+    if not docs:
+        raise SystemExit(f"no .html files in {args.corpus}")
+    size_kb = sum(len(d) for d in docs) / len(docs) / 1024
+    print(f"{len(docs)} bodies, avg {size_kb:.1f} KB, default backend: {email_body.HTML_BACKEND}")
+
+    baseline = [email_body.html_to_text(d, "html.parser") for d in docs]
+    for backend in available_backends():
+        report(backend, time_each(lambda d: email_body.html_to_text(d, backend), docs, args.repeat))
+        mismatches = sum(email_body.html_to_text(d, backend) != b for d, b in zip(docs, baseline))
+        if mismatches:
+            print(f"{'':<22} {mismatches} bodies differ from html.parser output")
+
+    email_body._by_content = email_body._LRU(max(len(docs), 1))
+    email_body._by_message = email_body._LRU(max(len(docs), 1))
+    report("cached (cold)", time_each(email_body.parse_email_html, docs, 1))
+    report("cached (warm)", time_each(email_body.parse_email_html, docs, args.repeat))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", help="directory of .html bodies")
+    parser.add_argument("--count", type=int, default=50, help="synthetic bodies when no corpus is given")
+    parser.add_argument("--repeat", type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,95 @@
+"""
+System-prompt prefix caching.
+
+Offline it times building the triage and agent system prompts per email the
+old way (.format every call) against the memoized builders, and reports how
+much of each request is the shared static prefix. --live sends the fixture
+mailbox to the triage model twice with the same preferences and reports
+time to first token and cached vs uncached input tokens per pass; the second
+pass is where Gemini's implicit cache should show up (it only applies to
+prompts above the model's minimum cacheable size).
+
+    python -m benchmarks.bench_prompt_cache
+    python -m benchmarks.bench_prompt_cache --live
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime
+from my_agent import prompt_cache
+from my_agent.prompts import (
+    triage_system_prompt,
+    agent_system_prompt_hitl_memory,
+    GMAIL_TOOLS_PROMPT,
+    default_background,
+    default_triage_instructions,
+    default_cal_preferences,
+    default_response_preferences,
+)
+from benchmarks.eval_triage import FIXTURES, user_prompt
+
+
+def per_call_us(fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def offline(fixtures, n):
+    today = datetime.now().strftime("%Y-%m-%d")
+    old_triage = per_call_us(lambda: triage_system_prompt.format(
+        background=default_background, triage_instructions=default_triage_instructions), n)
+    new_triage = per_call_us(lambda: prompt_cache.triage_system_content(default_triage_instructions), n)
+    old_agent = per_call_us(lambda: agent_system_prompt_hitl_memory.format(
+        tools_prompt=GMAIL_TOOLS_PROMPT, today=today, background=default_background,
+        response_preferences=default_response_preferences, cal_preferences=default_cal_preferences), n)
+    new_agent = per_call_us(lambda: prompt_cache.agent_system_message(
+        default_response_preferences, default_cal_preferences), n)
+    print(f"triage system prompt: format {old_triage:7.2f} us  memoized {new_triage:5.2f} us")
+    print(f"agent system prompt:  format {old_agent:7.2f} us  memoized {new_agent:5.2f} us")
+
+    system = len(prompt_cache.triage_system_content(default_triage_instructions))
+    shares = [system / (system + len(user_prompt(e))) for e in fixtures]
+    print(f"triage request chars in the shared prefix: median {statistics.median(shares):.0%} "
+          f"(~{system // 4} tokens of system prompt)")
+
+
+def live(fixtures):
+    from my_agent.models import triage_llm
+    system = {"role": "system", "content": prompt_cache.triage_system_content(default_triage_instructions)}
+    for run in (1, 2):
+        ttft, cached, uncached = [], 0, 0
+        for email in fixtures:
+            start = time.perf_counter()
+            first, final = None, None
+            for chunk in triage_llm.stream([system, {"role": "user", "content": user_prompt(email)}]):
+                if first is None:
+                    first = time.perf_counter() - start
+                final = chunk if final is None else final + chunk
+            ttft.append(first)
+            usage = prompt_cache.token_usage(final)
+            cached += usage["cached_input_tokens"]
+            uncached += usage["uncached_input_tokens"]
+        print(f"pass {run}: ttft p50={statistics.median(ttft) * 1000:.0f} ms  "
+              f"input tokens cached={cached} uncached={uncached}")
+
+
+def main(args):
+    with open(args.fixtures) as f:
+        fixtures = json.load(f)
+    for email in fixtures:
+        email["body_clean"] = email["body"]
+    offline(fixtures, args.iterations)
+    if args.live:
+        live(fixtures)
+    print(json.dumps(prompt_cache.usage_stats()["prompt_cache"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=FIXTURES)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--live", action="store_true")
+    main(parser.parse_args())
@@ -0,0 +1,66 @@
+"""
+Wall-clock per user for the threads.get phase of a sync: one round trip per
+thread (the old loop) against fetch_threads_batched, both hitting the local
+Gmail stand-in.
+
+    python -m benchmarks.bench_thread_fetch --threads 30 --latency-ms 80
+"""
+import argparse
+import statistics
+import time
+import httplib2
+from googleapiclient.discovery import build
+from benchmarks.gmail_standin import GmailStandIn, load_threads
+from routers.gmail_batch import fetch_threads_batched
+
+
+def sequential_fetch(service, thread_ids):
+    return {
+        tid: service.users().threads().get(userId="me", id=tid, format="full").execute()
+        for tid in thread_ids
+    }
+
+
+def run(label, fn, standin, repeat):
+    timings = []
+    trips = 0
+    for _ in range(repeat):
+        standin.round_trips = 0
+        start = time.perf_counter()
+        fetched = fn()
+        timings.append(time.perf_counter() - start)
+        trips = standin.round_trips
+    print(f"{label:<22} {statistics.median(timings) * 1000:8.1f} ms/user  "
+          f"{trips:3d} round trips  {len(fetched)} threads")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=30)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--batch-size", type=int, default=25)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--fixture", help="JSON list of recorded threads.get responses")
+    args = parser.parse_args()
+
+    standin = GmailStandIn(load_threads(args.fixture, args.threads), args.latency_ms).start()
+    service = build(
+        "gmail", "v1",
+        http=httplib2.Http(),
+        developerKey="standin",
+        static_discovery=True,
+        client_options={"api_endpoint": standin.base_url},
+    )
+    thread_ids = list(standin.threads)
+
+    try:
+        run("sequential threads.get", lambda: sequential_fetch(service, thread_ids), standin, args.repeat)
+        run(f"batched ({args.batch_size}/request)", lambda: fetch_threads_batched(
+            service, thread_ids, batch_size=args.batch_size, batch_uri=standin.batch_uri
+        ), standin, args.repeat)
+    finally:
+        standin.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+How many triage LLM calls the rule prefilter avoids on a fixture mailbox.
+
+Each pass runs the fixture mailbox through my_agent.prefilter and counts the
+emails it settles without a model. It also counts wrong ignores: emails the
+prefilter drops whose label is respond or notify. For emails that do reach
+the model, the fixture label stands in for the user's decision and is fed
+into the learned sender rules, so later passes show what those rules add.
+No model is called.
+
+    python -m benchmarks.eval_prefilter
+    python -m benchmarks.eval_prefilter --passes 4 --fixtures my_mailbox.json
+"""
+import argparse
+import json
+from collections import defaultdict
+from my_agent.prefilter import prefilter, sender_address
+from benchmarks.eval_triage import FIXTURES
+
+
+def main(args):
+    with open(args.fixtures) as f:
+        fixtures = json.load(f)
+    rules = defaultdict(lambda: {"counts": defaultdict(int)})
+
+    for n in range(1, args.passes + 1):
+        skipped, wrong = 0, []
+        for email in fixtures:
+            sender = sender_address(email)
+            rule = rules.get(sender)
+            if rule is not None:
+                rule["sender"] = sender
+            result = prefilter(email, rule)
+            if result is not None:
+                skipped += 1
+                if email["expected"] != "ignore":
+                    wrong.append(email["id"])
+                continue
+            rules[sender]["counts"][email["expected"]] += 1
+
+        print(f"pass {n}: {skipped}/{len(fixtures)} LLM calls avoided ({skipped / len(fixtures):.0%}), "
+              f"wrong ignores: {len(wrong)}{' ' + str(wrong) if wrong else ''}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=FIXTURES)
+    parser.add_argument("--passes", type=int, default=3)
+    main(parser.parse_args())
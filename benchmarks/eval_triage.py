@@ -0,0 +1,175 @@
+"""
+Offline eval for tiered triage routing.
+
+Runs the fixture mailbox through four setups and reports accuracy against the
+fixture labels, agreement with the strong-model-only baseline, per-email
+latency and how many calls reached the strong model:
+
+    strong      every email on the escalation model (the old single-model setup)
+    fast        every email on the triage model, no escalation
+    tiered      triage model, low-confidence answers re-run on the escalation model
+    batch       triage_batch with escalation (what /triage-batch does)
+
+By default both models are stubs with simulated latency: the fast stub is a
+keyword heuristic that is unsure when signals are mixed or absent, the strong
+stub answers with the fixture label. --live uses the models configured in
+routers/settings.py instead (needs GOOGLE_API_KEY).
+
+    python -m benchmarks.eval_triage
+    python -m benchmarks.eval_triage --fast-latency-ms 300 --strong-latency-ms 2500
+    python -m benchmarks.eval_triage --live
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import time
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from my_agent.prompts import default_triage_instructions, triage_user_prompt
+from my_agent.schema import RouterSchema, BatchRouterSchema, EmailClassification
+from my_agent.triage import classify_email, triage_batch, triage_system_message
+from routers.settings import TRIAGE_ESCALATION_CONFIDENCE
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "triage_emails.json")
+
+IGNORE_SIGNALS = ("unsubscribe", "noreply", "no-reply", "notification", "sale", "digest")
+RESPOND_SIGNALS = ("?", "can you", "could you", "let me know")
+
+
+class StubModel:
+    """Chat-model stand-in exposing just with_structured_output."""
+
+    def __init__(self, name: str, latency_ms: float, classify):
+        self.name = name
+        self.latency = latency_ms / 1000
+        self.classify = classify
+        self.calls = 0
+
+    def with_structured_output(self, schema, include_raw: bool = False):
+        def run(messages):
+            self.calls += 1
+            text = messages[-1]["content"]
+            blocks = re.split(r"(?=Id: )", text)
+            ids = re.findall(r"Id: (\S+)", text)
+            time.sleep(self.latency * (1 + 0.2 * (len(ids) - 1)))
+
+            decisions = [self.classify(block, email_id) for block, email_id in zip(blocks[1:], ids)]
+            if schema is BatchRouterSchema:
+                parsed = BatchRouterSchema(classifications=[
+                    EmailClassification(email_id=i, reasoning=self.name, classification=c, confidence=p)
+                    for i, (c, p) in zip(ids, decisions)
+                ])
+            else:
+                c, p = decisions[0]
+                parsed = RouterSchema(reasoning=self.name, classification=c, confidence=p)
+
+            if not include_raw:
+                return parsed
+            usage = {"input_tokens": len(text) // 4, "output_tokens": 30 * len(ids), "total_tokens": 0}
+            return {"raw": AIMessage(content="", usage_metadata=usage), "parsed": parsed, "parsing_error": None}
+
+        return RunnableLambda(run)
+
+
+def heuristic(fixtures_by_id):
+    def classify(_block, email_id):
+        email = fixtures_by_id[email_id]
+        text = f"{email['from']} {email['subject']} {email['body']}".lower()
+        ignore = any(s in text for s in IGNORE_SIGNALS)
+        respond = any(s in text for s in RESPOND_SIGNALS)
+        if ignore and respond:
+            return "ignore", 0.5
+        if ignore:
+            return "ignore", 0.9
+        if respond:
+            return "respond", 0.85
+        return "notify", 0.65
+    return classify
+
+
+def oracle(fixtures_by_id):
+    return lambda _block, email_id: (fixtures_by_id[email_id]["expected"], 0.95)
+
+
+def user_prompt(email):
+    return triage_user_prompt.format(
+        author=email["from"], to=email["to"], subject=email["subject"], body=email["body"], id=email["id"],
+    )
+
+
+def run_single(emails, router, escalation_router, threshold):
+    system = triage_system_message(default_triage_instructions)
+    labels, timings = {}, []
+    for email in emails:
+        start = time.perf_counter()
+        result, _ = classify_email(
+            router, escalation_router, [system, {"role": "user", "content": user_prompt(email)}], threshold
+        )
+        timings.append(time.perf_counter() - start)
+        labels[email["id"]] = result.classification
+    return labels, timings
+
+
+def report(name, labels, timings, fixtures, baseline, strong_calls):
+    accuracy = sum(labels.get(e["id"]) == e["expected"] for e in fixtures) / len(fixtures)
+    agreement = sum(labels.get(i) == c for i, c in baseline.items()) / len(baseline)
+    timings = sorted(timings)
+    print(f"{name:<8} accuracy={accuracy:6.1%}  agreement={agreement:6.1%}  "
+          f"p50={statistics.median(timings) * 1000:7.1f} ms  p95={timings[int(len(timings) * 0.95) - 1] * 1000:7.1f} ms  "
+          f"strong calls={strong_calls}")
+
+
+def main(args):
+    with open(args.fixtures) as f:
+        fixtures = json.load(f)
+    for email in fixtures:
+        email["body_clean"] = email["body"]
+    by_id = {e["id"]: e for e in fixtures}
+
+    if args.live:
+        from my_agent.models import triage_llm as fast, escalation_llm as strong
+    else:
+        fast = StubModel("fast", args.fast_latency_ms, heuristic(by_id))
+        strong = StubModel("strong", args.strong_latency_ms, oracle(by_id))
+
+    def strong_calls_since(before):
+        # real clients don't count their calls
+        return strong.calls - before if isinstance(strong, StubModel) else "n/a"
+
+    def strong_calls():
+        return getattr(strong, "calls", 0)
+
+    fast_router = fast.with_structured_output(RouterSchema)
+    strong_router = strong.with_structured_output(RouterSchema)
+
+    before = strong_calls()
+    baseline, timings = run_single(fixtures, strong_router, None, args.threshold)
+    report("strong", baseline, timings, fixtures, baseline, strong_calls_since(before))
+
+    labels, timings = run_single(fixtures, fast_router, None, args.threshold)
+    report("fast", labels, timings, fixtures, baseline, 0)
+
+    before = strong_calls()
+    labels, timings = run_single(fixtures, fast_router, strong_router, args.threshold)
+    report("tiered", labels, timings, fixtures, baseline, strong_calls_since(before))
+
+    before = strong_calls()
+    start = time.perf_counter()
+    outcome = triage_batch(fast, fixtures, default_triage_instructions, escalation_llm=strong, threshold=args.threshold)
+    per_email = (time.perf_counter() - start) / len(fixtures)
+    labels = {i: r["classification"] for i, r in outcome["results"].items()}
+    report("batch", labels, [per_email] * len(fixtures), fixtures, baseline,
+           strong_calls_since(before))
+    print(f"batch stats: {outcome['stats']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=FIXTURES)
+    parser.add_argument("--threshold", type=float, default=TRIAGE_ESCALATION_CONFIDENCE)
+    parser.add_argument("--fast-latency-ms", type=float, default=40)
+    parser.add_argument("--strong-latency-ms", type=float, default=250)
+    parser.add_argument("--live", action="store_true")
+    main(parser.parse_args())
@@ -0,0 +1,179 @@
+"""
+Local stand-in for the parts of the Gmail API the backend touches.
+
+Serves recorded thread resources (a JSON file of `threads.get` responses, or
+a synthetic mailbox when none is given) and adds a fixed delay per HTTP round
+trip to model the latency to Google. Understands the multipart/mixed batch
+endpoint the same way gmail.googleapis.com/batch/gmail/v1 does.
+
+    python -m benchmarks.gmail_standin --port 8765 --latency-ms 80
+"""
+import argparse
+import base64
+import json
+import re
+import threading
+import time
+from email.parser import Parser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+THREAD_PATH = re.compile(r"^/gmail/v1/users/me/threads/([^/?]+)$")
+MESSAGE_PATH = re.compile(r"^/gmail/v1/users/me/messages/([^/?]+)$")
+
+
+def synthetic_mailbox(thread_count: int = 30, messages_per_thread: int = 3) -> dict:
+    body = base64.urlsafe_b64encode(
+        ("<html><body>" + "<p>Quarterly update paragraph.</p>" * 40 + "</body></html>").encode()
+    ).decode()
+    threads = {}
+    for t in range(thread_count):
+        thread_id = f"t{t:04d}"
+        threads[thread_id] = {
+            "id": thread_id,
+            "historyId": "1000",
+            "messages": [
+                {
+                    "id": f"{thread_id}m{m}",
+                    "threadId": thread_id,
+                    "labelIds": ["INBOX", "UNREAD"] if m == messages_per_thread - 1 else ["INBOX"],
+                    "snippet": "Quarterly update",
+                    "payload": {
+                        "mimeType": "text/html",
+                        "headers": [
+                            {"name": "From", "value": f"sender{t}@example.com"},
+                            {"name": "To", "value": "me@example.com"},
+                            {"name": "Subject", "value": f"Thread {t}"},
+                            {"name": "Date", "value": f"Mon, 1 Jan 2024 10:{m:02d}:00 +0000"},
+                        ],
+                        "body": {"data": body},
+                    },
+                }
+                for m in range(messages_per_thread)
+            ],
+        }
+    return threads
+
+
+class GmailStandIn:
+    def __init__(self, threads: dict, latency_ms: float = 80, port: int = 0):
+        self.threads = threads
+        self.latency = latency_ms / 1000.0
+        self.round_trips = 0
+        self.sent = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.port = self.server.server_address[1]
+        self.base_url = f"http://127.0.0.1:{self.port}/"
+        self.batch_uri = f"{self.base_url}batch/gmail/v1"
+
+    def _route(self, method: str, path: str):
+        parsed = urlparse(path)
+        if parsed.path == "/gmail/v1/users/me/profile":
+            return 200, {"emailAddress": "me@example.com", "historyId": "1000"}
+        if parsed.path == "/gmail/v1/users/me/threads":
+            return 200, {"threads": [{"id": tid} for tid in self.threads]}
+        match = THREAD_PATH.match(parsed.path)
+        if match and match.group(1) in self.threads:
+            return 200, self.threads[match.group(1)]
+        if method == "POST" and parsed.path == "/gmail/v1/users/me/messages/send":
+            with self._lock:
+                self.sent += 1
+                sent_id = f"sent{self.sent:06d}"
+            return 200, {"id": sent_id, "threadId": sent_id, "labelIds": ["SENT"]}
+        match = MESSAGE_PATH.match(parsed.path)
+        if match:
+            for thread in self.threads.values():
+                for msg in thread["messages"]:
+                    if msg["id"] == match.group(1):
+                        return 200, msg
+        return 404, {"error": {"code": 404, "message": "Not Found"}}
+
+    def _batch(self, content_type: str, body: str):
+        message = Parser().parsestr(f"Content-Type: {content_type}\r\n\r\n{body}")
+        boundary = "batch_standin"
+        out = []
+        for part in message.get_payload():
+            request_line = part.get_payload().split("\n", 1)[0]
+            method, path, _ = request_line.split(" ", 2)
+            status, payload = self._route(method, path)
+            content_id = part["Content-ID"].strip("<>")
+            out.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Not Found'}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        out.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(out)
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, content_type, body: str):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _tick(self):
+                with standin._lock:
+                    standin.round_trips += 1
+                time.sleep(standin.latency)
+
+            def do_GET(self):
+                self._tick()
+                status, payload = standin._route("GET", self.path)
+                self._send(status, "application/json", json.dumps(payload))
+
+            def do_POST(self):
+                self._tick()
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length).decode("utf-8")
+                if self.path.startswith("/batch"):
+                    content_type, payload = standin._batch(self.headers["Content-Type"], body)
+                    self._send(200, content_type, payload)
+                else:
+                    status, payload = standin._route("POST", self.path)
+                    self._send(status, "application/json", json.dumps(payload))
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+
+def load_threads(path: str = None, thread_count: int = 30) -> dict:
+    if not path:
+        return synthetic_mailbox(thread_count)
+    with open(path) as f:
+        recorded = json.load(f)
+    return {t["id"]: t for t in recorded}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--fixture", help="JSON list of recorded threads.get responses")
+    args = parser.parse_args()
+
+    standin = GmailStandIn(load_threads(args.fixture), args.latency_ms, args.port)
+    print(f"gmail stand-in on {standin.base_url} (batch: {standin.batch_uri})")
+    print(f"point the backend at it with GMAIL_API_BASE_URL={standin.base_url} "
+          f"GMAIL_BATCH_URI={standin.batch_uri}")
+    standin.server.serve_forever()
@@ -0,0 +1,94 @@
+"""
+Concurrency load test for the API tier.
+
+Fires --requests POST /emails/send calls at --concurrency while a probe keeps
+hitting GET / on the same worker. If a handler blocks the event loop the probe
+latency climbs with the load; with the async Gmail client it stays flat.
+
+Run the backend against the local stand-in (one uvicorn worker, a Mongo with a
+token_store document for --user-id whose expiry is in the future):
+
+    python -m benchmarks.gmail_standin --port 8765 --latency-ms 150 &
+    GMAIL_API_BASE_URL=http://127.0.0.1:8765/ uvicorn main:app --workers 1 &
+    python -m benchmarks.load_test_api --user-id <user_id> --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+
+def summarize(label: str, timings: list, elapsed: float = None):
+    if not timings:
+        print(f"{label:<10} no samples")
+        return
+    timings = sorted(timings)
+    line = (f"{label:<10} n={len(timings):4d}  p50={statistics.median(timings) * 1000:7.1f} ms  "
+            f"p95={timings[int(len(timings) * 0.95) - 1] * 1000:7.1f} ms  max={timings[-1] * 1000:7.1f} ms")
+    if elapsed:
+        line += f"  {len(timings) / elapsed:6.1f} req/s"
+    print(line)
+
+
+async def send_load(client, args, timings, errors):
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def one(i):
+        async with sem:
+            start = time.perf_counter()
+            resp = await client.post("/emails/send", json={
+                "user_id": args.user_id,
+                "to_email": "loadtest@example.com",
+                "subject": f"load test {i}",
+                "body_text": "hello from the load test",
+            })
+            if resp.status_code == 200:
+                timings.append(time.perf_counter() - start)
+            else:
+                errors.append(resp.status_code)
+
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+
+
+async def probe(client, stop: asyncio.Event, timings):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/")
+        timings.append(time.perf_counter() - start)
+        await asyncio.sleep(0.05)
+
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 5)
+    async with httpx.AsyncClient(base_url=args.target, timeout=120, limits=limits) as client:
+        idle = []
+        stop = asyncio.Event()
+        idle_task = asyncio.create_task(probe(client, stop, idle))
+        await asyncio.sleep(1)
+        stop.set()
+        await idle_task
+
+        send_timings, errors, loaded = [], [], []
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(client, stop, loaded))
+        start = time.perf_counter()
+        await send_load(client, args, send_timings, errors)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await probe_task
+
+    summarize("send", send_timings, elapsed)
+    summarize("probe idle", idle)
+    summarize("probe load", loaded)
+    if errors:
+        print(f"errors: {len(errors)} (statuses {sorted(set(errors))})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", default="http://127.0.0.1:8000")
+    parser.add_argument("--user-id", required=True)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,227 @@
+"""
+Mongo-backed queue for agent runs.
+
+The API enqueues a job and returns at once; worker processes (worker.py)
+claim jobs and run them. Running jobs are bounded globally and per user by
+slot counters in agent_job_slots, taken and released with conditional
+updates so the limits hold across any number of workers. A job whose worker
+stops heartbeating is requeued (or failed after AGENT_JOB_MAX_ATTEMPTS) with
+its agent thread's claim released, and every housekeeping pass recomputes the
+counters from the jobs actually running. A job that finds its thread busy with another run
+is retried after AGENT_JOB_RETRY_DELAY_SECONDS.
+
+Only one job per agent thread can be queued or running: a duplicate
+submission gets the existing job back.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from db.mongodb import agent_jobs, agent_job_slots
+from db.agent_threads import release_threads
+from routers.settings import (
+    AGENT_JOBS_MAX_RUNNING,
+    AGENT_JOBS_PER_USER,
+    AGENT_JOB_LEASE_SECONDS,
+    AGENT_JOB_MAX_ATTEMPTS,
+    AGENT_JOB_RETRY_DELAY_SECONDS,
+)
+
+GLOBAL_SLOT = "global"
+ACTIVE = ("queued", "running")
+
+
+def _user_slot(user_id: Optional[str]) -> str:
+    return f"user:{user_id}"
+
+
+def _public(job: Optional[dict]) -> Optional[dict]:
+    if job is None:
+        return None
+    job = dict(job)
+    job["job_id"] = job.pop("_id")
+    job.pop("active_key", None)
+    return job
+
+
+def enqueue(kind: str, user_id: Optional[str], thread_id: str, payload: Dict[str, Any]) -> dict:
+    """Queue a run of `kind` on `thread_id`; the already active job for that thread if there is one."""
+    now = datetime.utcnow()
+    job = {
+        "_id": uuid4().hex,
+        "kind": kind,
+        "user_id": user_id,
+        "thread_id": thread_id,
+        "payload": payload,
+        "status": "queued",
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now,
+        "available_at": now,
+        # unique while queued/running, removed when the job finishes
+        "active_key": thread_id,
+    }
+    try:
+        agent_jobs.insert_one(job)
+        return _public(job)
+    except DuplicateKeyError:
+        existing = agent_jobs.find_one({"active_key": thread_id})
+        # finished between the insert and the lookup: try once more
+        return _public(existing) if existing else enqueue(kind, user_id, thread_id, payload)
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    return _public(agent_jobs.find_one({"_id": job_id}))
+
+
+def list_jobs(user_id: str, limit: int = 20) -> List[dict]:
+    cursor = agent_jobs.find({"user_id": user_id}, {"payload": 0, "result": 0}).sort("created_at", -1).limit(limit)
+    return [_public(job) for job in cursor]
+
+
+def _take_slot(key: str, limit: int) -> bool:
+    try:
+        agent_job_slots.update_one({"_id": key, "running": {"$lt": limit}}, {"$inc": {"running": 1}}, upsert=True)
+    except DuplicateKeyError:
+        # slot document exists and is full
+        return False
+    return True
+
+
+def _release_slot(key: str):
+    agent_job_slots.update_one({"_id": key, "running": {"$gt": 0}}, {"$inc": {"running": -1}})
+
+
+def claim_next(worker_id: str, scan: int = 50) -> Optional[dict]:
+    """The oldest queued job whose user has a free slot, marked running; None if nothing can start."""
+    ready = {"status": "queued", "available_at": {"$lte": datetime.utcnow()}}
+    candidates = list(agent_jobs.find(ready, {"user_id": 1}).sort("created_at", 1).limit(scan))
+    # an idle queue shouldn't churn the global slot on every poll
+    if not candidates or not _take_slot(GLOBAL_SLOT, AGENT_JOBS_MAX_RUNNING):
+        return None
+    claimed = None
+    try:
+        for job in candidates:
+            user_slot = _user_slot(job.get("user_id"))
+            if not _take_slot(user_slot, AGENT_JOBS_PER_USER):
+                continue
+            try:
+                now = datetime.utcnow()
+                claimed = agent_jobs.find_one_and_update(
+                    {"_id": job["_id"], "status": "queued"},
+                    {
+                        "$set": {"status": "running", "worker": worker_id, "started_at": now, "heartbeat_at": now, "updated_at": now},
+                        "$inc": {"attempts": 1},
+                    },
+                    return_document=ReturnDocument.AFTER,
+                )
+            finally:
+                if claimed is None:
+                    # another worker got it first, or the update failed
+                    _release_slot(user_slot)
+            if claimed:
+                return claimed
+    finally:
+        # slots are held only by a claimed job, even when Mongo raises part way
+        if claimed is None:
+            _release_slot(GLOBAL_SLOT)
+    return None
+
+
+def heartbeat(job_ids: List[str]):
+    if job_ids:
+        agent_jobs.update_many({"_id": {"$in": job_ids}, "status": "running"}, {"$set": {"heartbeat_at": datetime.utcnow()}})
+
+
+def _release_slots(job: dict):
+    _release_slot(_user_slot(job.get("user_id")))
+    _release_slot(GLOBAL_SLOT)
+
+
+def finish(job: dict, result: Any = None, error: Optional[str] = None):
+    now = datetime.utcnow()
+    updated = agent_jobs.update_one(
+        {"_id": job["_id"], "status": "running"},
+        {
+            "$set": {"status": "failed" if error else "done", "result": result, "error": error, "finished_at": now, "updated_at": now},
+            "$unset": {"active_key": ""},
+        },
+    )
+    # not running any more means recover_stale already took it back (and resynced the slots)
+    if updated.modified_count == 1:
+        _release_slots(job)
+
+
+def retry(job: dict, error: str, delay: float = AGENT_JOB_RETRY_DELAY_SECONDS):
+    """Put a running job back in the queue to start again after `delay`; failed once out of attempts."""
+    if job.get("attempts", 0) >= AGENT_JOB_MAX_ATTEMPTS:
+        return finish(job, error=error)
+    now = datetime.utcnow()
+    updated = agent_jobs.update_one(
+        {"_id": job["_id"], "status": "running"},
+        {"$set": {"status": "queued", "error": error, "available_at": now + timedelta(seconds=delay), "updated_at": now}},
+    )
+    if updated.modified_count == 1:
+        _release_slots(job)
+
+
+def recover_stale(now: Optional[datetime] = None) -> int:
+    """
+    Requeue (or fail) running jobs whose worker stopped heartbeating, then
+    resync the slot counters. The resync runs on every call, stale jobs or not,
+    so a slot leaked any other way (a worker dying between taking a slot and
+    claiming a job) is given back on the next pass.
+    """
+    now = now or datetime.utcnow()
+    stale = list(agent_jobs.find(
+        {"status": "running", "heartbeat_at": {"$lt": now - timedelta(seconds=AGENT_JOB_LEASE_SECONDS)}},
+        {"thread_id": 1},
+    ))
+    failed = requeued = 0
+    if stale:
+        # the dead run never reached finish_run; without this the retry would find its thread "running"
+        release_threads([job["thread_id"] for job in stale], "worker lost")
+        job_ids = [job["_id"] for job in stale]
+        failed = agent_jobs.update_many(
+            {"_id": {"$in": job_ids}, "status": "running", "attempts": {"$gte": AGENT_JOB_MAX_ATTEMPTS}},
+            {
+                "$set": {"status": "failed", "error": "worker lost", "finished_at": now, "updated_at": now},
+                "$unset": {"active_key": ""},
+            },
+        ).modified_count
+        requeued = agent_jobs.update_many(
+            {"_id": {"$in": job_ids}, "status": "running"},
+            {"$set": {"status": "queued", "error": "worker lost", "updated_at": now}},
+        ).modified_count
+    reconcile_slots()
+    return failed + requeued
+
+
+def reconcile_slots():
+    """Set every slot counter to the number of jobs actually running."""
+    per_user = {
+        _user_slot(row["_id"]): row["running"]
+        for row in agent_jobs.aggregate([
+            {"$match": {"status": "running"}},
+            {"$group": {"_id": "$user_id", "running": {"$sum": 1}}},
+        ])
+    }
+    agent_job_slots.update_one({"_id": GLOBAL_SLOT}, {"$set": {"running": sum(per_user.values())}}, upsert=True)
+    agent_job_slots.update_many({"_id": {"$nin": [GLOBAL_SLOT, *per_user]}}, {"$set": {"running": 0}})
+    for key, running in per_user.items():
+        agent_job_slots.update_one({"_id": key}, {"$set": {"running": running}}, upsert=True)
+
+
+def queue_stats() -> Dict[str, Any]:
+    counts = {row["_id"]: row["n"] for row in agent_jobs.aggregate([
+        {"$match": {"status": {"$in": list(ACTIVE)}}},
+        {"$group": {"_id": "$status", "n": {"$sum": 1}}},
+    ])}
+    oldest = agent_jobs.find_one({"status": "queued"}, {"created_at": 1}, sort=[("created_at", 1)])
+    return {
+        "queued": counts.get("queued", 0),
+        "running": counts.get("running", 0),
+        "oldest_queued_seconds": round((datetime.utcnow() - oldest["created_at"]).total_seconds(), 1) if oldest else None,
+        "limits": {"global": AGENT_JOBS_MAX_RUNNING, "per_user": AGENT_JOBS_PER_USER},
+    }
@@ -0,0 +1,178 @@
+"""
+Retention for the agent's LangGraph checkpoints.
+
+Every run gets a record in agent_threads (who it belongs to, whether it is
+running, waiting on the user or finished). Thread ids are derived from the
+user and the Gmail message, so the record doubles as a lease: a message
+being processed can't be started or resumed a second time concurrently.
+
+After each run the thread is trimmed to its latest CHECKPOINT_KEEP_LATEST
+checkpoints per namespace, and the prune job deletes finished threads after
+CHECKPOINT_COMPLETED_TTL_HOURS and any other thread after
+CHECKPOINT_ABANDONED_TTL_DAYS, so the checkpoint collections stay bounded
+however many emails are processed.
+"""
+import hashlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from pymongo.errors import DuplicateKeyError
+from db.mongodb import agent_threads, checkpoints, checkpoint_writes
+from routers.settings import (
+    AGENT_RUN_LEASE_SECONDS,
+    CHECKPOINT_KEEP_LATEST,
+    CHECKPOINT_COMPLETED_TTL_HOURS,
+    CHECKPOINT_ABANDONED_TTL_DAYS,
+    CHECKPOINT_PRUNE_BATCH,
+)
+
+
+def agent_thread_id(user_id: str, message_id: str) -> str:
+    """The one graph thread for a user's Gmail message."""
+    digest = hashlib.sha256(f"{user_id}\0{message_id}".encode("utf-8")).hexdigest()
+    return f"thread_{digest[:24]}"
+
+
+def get_thread(thread_id: str) -> Optional[dict]:
+    return agent_threads.find_one({"thread_id": thread_id}, {"_id": 0})
+
+
+def claim_thread(thread_id: str, user_id: Optional[str] = None, email_id: Optional[str] = None) -> bool:
+    """
+    Mark the thread as running, creating its record if needed. False when
+    another request already holds it (a run older than the lease is taken
+    to have died and can be claimed again).
+    """
+    now = datetime.utcnow()
+    try:
+        agent_threads.update_one(
+            {
+                "thread_id": thread_id,
+                "$or": [
+                    {"status": {"$ne": "running"}},
+                    {"updated_at": {"$lt": now - timedelta(seconds=AGENT_RUN_LEASE_SECONDS)}},
+                ],
+            },
+            {
+                "$set": {"status": "running", "updated_at": now},
+                "$setOnInsert": {"user_id": user_id, "email_id": email_id, "created_at": now},
+            },
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # the record exists and is running, so the upsert tried to insert a second one
+        return False
+    return True
+
+
+def release_threads(thread_ids: List[str], error: str) -> int:
+    """Give up the claim on threads whose run died without finish_run, so they can be run again."""
+    if not thread_ids:
+        return 0
+    return agent_threads.update_many(
+        {"thread_id": {"$in": thread_ids}, "status": "running"},
+        {"$set": {"status": "error", "error": error, "updated_at": datetime.utcnow()}},
+    ).modified_count
+
+
+def run_status(result: Any) -> str:
+    return "interrupted" if isinstance(result, dict) and result.get("__interrupt__") else "completed"
+
+
+def trim_thread(thread_id: str, keep: int = CHECKPOINT_KEEP_LATEST) -> int:
+    """Drop all but the latest `keep` checkpoints (and their writes) in each namespace of a thread."""
+    deleted = 0
+    for ns in checkpoints.distinct("checkpoint_ns", {"thread_id": thread_id}):
+        cursor = (
+            checkpoints.find({"thread_id": thread_id, "checkpoint_ns": ns}, {"_id": 0, "checkpoint_id": 1})
+            .sort("checkpoint_id", -1)
+            .skip(keep)
+        )
+        old = [doc["checkpoint_id"] for doc in cursor]
+        if not old:
+            continue
+        query = {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": {"$in": old}}
+        deleted += checkpoints.delete_many(query).deleted_count
+        checkpoint_writes.delete_many(query)
+    return deleted
+
+
+def finish_run(thread_id: str, result: Any, error: Optional[str] = None) -> str:
+    """Record how a run ended (releasing the claim) and trim the thread's checkpoint history."""
+    status = "error" if error else run_status(result)
+    now = datetime.utcnow()
+    update = {"status": status, "updated_at": now, "error": error}
+    if status == "completed":
+        update["completed_at"] = now
+    if isinstance(result, dict) and result.get("classification_decision"):
+        update["classification_decision"] = result["classification_decision"]
+    agent_threads.update_one({"thread_id": thread_id}, {"$set": update})
+    trim_thread(thread_id)
+    return status
+
+
+def delete_threads(thread_ids: List[str]) -> Dict[str, int]:
+    query = {"thread_id": {"$in": thread_ids}}
+    return {
+        "threads": agent_threads.delete_many(query).deleted_count,
+        "checkpoints": checkpoints.delete_many(query).deleted_count,
+        "writes": checkpoint_writes.delete_many(query).deleted_count,
+    }
+
+
+def prune_threads(now: Optional[datetime] = None, batch: int = CHECKPOINT_PRUNE_BATCH) -> Dict[str, int]:
+    """Delete expired threads, at most `batch` per pass of each kind."""
+    now = now or datetime.utcnow()
+    totals = {"threads": 0, "checkpoints": 0, "writes": 0}
+    expired = [
+        {"status": "completed", "updated_at": {"$lt": now - timedelta(hours=CHECKPOINT_COMPLETED_TTL_HOURS)}},
+        {"status": {"$ne": "completed"}, "updated_at": {"$lt": now - timedelta(days=CHECKPOINT_ABANDONED_TTL_DAYS)}},
+    ]
+    for query in expired:
+        thread_ids = [d["thread_id"] for d in agent_threads.find(query, {"_id": 0, "thread_id": 1}).limit(batch)]
+        if thread_ids:
+            for k, v in delete_threads(thread_ids).items():
+                totals[k] += v
+    return totals
+
+
+def adopt_untracked_threads() -> int:
+    """
+    Give checkpoints written before threads were tracked a record, so the
+    abandoned-thread TTL eventually removes them too.
+    """
+    tracked = set(agent_threads.distinct("thread_id"))
+    untracked = [t for t in checkpoints.distinct("thread_id") if t not in tracked]
+    now = datetime.utcnow()
+    for thread_id in untracked:
+        agent_threads.update_one(
+            {"thread_id": thread_id},
+            {"$setOnInsert": {"user_id": None, "status": "untracked", "created_at": now, "updated_at": now}},
+            upsert=True,
+        )
+    return len(untracked)
+
+
+def _sizes(collection, thread_ids: List[str]) -> Dict[str, int]:
+    rows = list(collection.aggregate([
+        {"$match": {"thread_id": {"$in": thread_ids}}},
+        {"$group": {"_id": None, "documents": {"$sum": 1}, "bytes": {"$sum": {"$bsonSize": "$$ROOT"}}}},
+    ]))
+    return {"documents": rows[0]["documents"], "bytes": rows[0]["bytes"]} if rows else {"documents": 0, "bytes": 0}
+
+
+def storage_report(user_id: str) -> Dict[str, Any]:
+    """Threads by status and the checkpoint storage they use, for one user."""
+    threads = list(agent_threads.find({"user_id": user_id}, {"_id": 0, "thread_id": 1, "status": 1}))
+    thread_ids = [t["thread_id"] for t in threads]
+    by_status: Dict[str, int] = {}
+    for t in threads:
+        by_status[t["status"]] = by_status.get(t["status"], 0) + 1
+    cp, writes = _sizes(checkpoints, thread_ids), _sizes(checkpoint_writes, thread_ids)
+    return {
+        "user_id": user_id,
+        "threads": len(threads),
+        "by_status": by_status,
+        "checkpoints": cp,
+        "writes": writes,
+        "total_bytes": cp["bytes"] + writes["bytes"],
+    }
@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, List, Optional, Sequence, Tuple
+from pymongo.errors import PyMongoError
+from langgraph.store.base import BaseStore, Op, PutOp, Result
+from db.mongodb_store import encode_namespace
+from routers.settings import MEMORY_CACHE_SIZE, MEMORY_CACHE_TTL_SECONDS, MEMORY_CACHE_CHANGE_STREAM
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_key(namespace, key: str) -> Tuple[Hashable, str]:
+    # same form as the stored documents, so change-stream evictions line up
+    return encode_namespace(namespace), key
+
+
+class CachedMongoDBStore(BaseStore):
+    """
+    Read-through, write-through cache in front of MongoDBStore with the same
+    raw-value interface (get_value/put_value/delete_value/list, mget/mput)
+    and the BaseStore one, so it can be passed anywhere the store is
+    (including `store=` on the graph).
+
+    Reads inside the TTL never leave the process. Past the TTL an entry is
+    revalidated by fetching only the record's version; the value is re-read
+    only if another process wrote it. Misses are cached too. With change
+    streams enabled, writes from other processes evict entries as they happen.
+    """
+
+    def __init__(
+        self,
+        store,
+        max_size: int = MEMORY_CACHE_SIZE,
+        ttl_seconds: float = MEMORY_CACHE_TTL_SECONDS,
+        change_stream: bool = MEMORY_CACHE_CHANGE_STREAM,
+    ):
+        self.store = store
+        self.collection = store.collection
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        # key -> (value, version, checked_at)
+        self._entries: "OrderedDict[Tuple[Hashable, str], Tuple[Any, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._watcher = None
+        if change_stream:
+            self._watcher = threading.Thread(target=self._watch, name="memory-cache-watch", daemon=True)
+            self._watcher.start()
+
+    def _remember(self, ck, value, version: int):
+        with self._lock:
+            self._entries[ck] = (value, version, time.monotonic())
+            self._entries.move_to_end(ck)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, namespace=None, key: Optional[str] = None):
+        """Drop one entry, or everything when called without arguments."""
+        with self._lock:
+            if namespace is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(_cache_key(namespace, key), None)
+
+    def get_value(self, namespace, key: str) -> Optional[Any]:
+        ck = _cache_key(namespace, key)
+        with self._lock:
+            entry = self._entries.get(ck)
+            if entry is not None:
+                self._entries.move_to_end(ck)
+
+        if entry is not None:
+            value, version, checked_at = entry
+            if time.monotonic() - checked_at < self.ttl:
+                self.hits += 1
+                return value
+            self.revalidations += 1
+            if self.store.get_version(namespace, key) == version:
+                self._remember(ck, value, version)
+                return value
+
+        self.misses += 1
+        value, version = self.store.get_record(namespace, key)
+        self._remember(ck, value, version)
+        return value
+
+    def put_value(self, namespace, key: str, value: Any):
+        self.store.put_value(namespace, key, value)
+        # re-read the version so the next revalidation doesn't see our own write as foreign
+        self._remember(_cache_key(namespace, key), value, self.store.get_version(namespace, key))
+
+    def delete_value(self, namespace, key: str):
+        self.store.delete_value(namespace, key)
+        self._remember(_cache_key(namespace, key), None, 0)
+
+    def list(self, namespace):
+        return self.store.list(namespace)
+
+    def mget(self, pairs: Sequence[Tuple[Any, str]]) -> List[Optional[Any]]:
+        """Cached values where fresh; everything else in a single store.mget_records."""
+        now = time.monotonic()
+        out: List[Optional[Any]] = [None] * len(pairs)
+        missing = []
+        with self._lock:
+            for i, (namespace, key) in enumerate(pairs):
+                entry = self._entries.get(_cache_key(namespace, key))
+                if entry is not None and now - entry[2] < self.ttl:
+                    out[i] = entry[0]
+                    self.hits += 1
+                else:
+                    missing.append(i)
+
+        if missing:
+            self.misses += len(missing)
+            records = self.store.mget_records([pairs[i] for i in missing])
+            for i, (value, version) in zip(missing, records):
+                out[i] = value
+                self._remember(_cache_key(*pairs[i]), value, version)
+        return out
+
+    def mput(self, items: Iterable[Tuple[Any, str, Any]]):
+        items = list(items)
+        self.store.mput(items)
+        # as in put_value, pick up the new versions (one query for all of them)
+        versions = self.store.mget_records([(namespace, key) for namespace, key, _ in items])
+        for (namespace, key, value), (_, version) in zip(items, versions):
+            self._remember(_cache_key(namespace, key), value, version)
+
+    def scan(self, namespace_prefix, limit: int = 100, offset: int = 0):
+        return self.store.scan(namespace_prefix, limit, offset)
+
+    def migrate_namespaces(self) -> int:
+        migrated = self.store.migrate_namespaces()
+        if migrated:
+            self.invalidate()
+        return migrated
+
+    def _invalidate_written(self, ops: List[Op]):
+        # after the write: a get racing it can't re-cache the old value
+        for op in ops:
+            if isinstance(op, PutOp):
+                self.invalidate(op.namespace, op.key)
+
+    def batch(self, ops: Iterable[Op]) -> List[Result]:
+        ops = list(ops)
+        try:
+            return self.store.batch(ops)
+        finally:
+            self._invalidate_written(ops)
+
+    async def abatch(self, ops: Iterable[Op]) -> List[Result]:
+        ops = list(ops)
+        try:
+            return await self.store.abatch(ops)
+        finally:
+            self._invalidate_written(ops)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+        }
+
+    def _watch(self):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        while True:
+            try:
+                with self.collection.watch(pipeline, full_document="updateLookup") as stream:
+                    for change in stream:
+                        doc = change.get("fullDocument")
+                        if doc is None:
+                            # deletes only carry the _id; drop everything rather than guess
+                            self.invalidate()
+                        else:
+                            self.invalidate(doc.get("namespace"), doc.get("key"))
+            except PyMongoError as e:
+                logger.warning("memory cache change stream stopped, relying on TTL: %s", e)
+                # a standalone server has no change streams; the TTL path still applies
+                if "replica set" in str(e).lower() or getattr(e, "code", None) == 40573:
+                    return
+                time.sleep(5)
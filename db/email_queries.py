@@ -0,0 +1,49 @@
+"""
+Read-side queries over email_threads for in-process callers (agent tools).
+
+Limits, the unread filter and the field projection all run inside Mongo, so
+only the messages a caller asked for are deserialized.
+"""
+from typing import Any, Dict, List, Sequence
+from db.mongodb import email_threads
+
+AGENT_MESSAGE_FIELDS = ("id", "from", "to", "subject", "date", "ts", "is_unread", "body_clean", "body_text", "snippet")
+
+
+def find_recent_threads(
+    user_id: str,
+    max_threads: int = 10,
+    max_messages_per_thread: int = 10,
+    include_read: bool = True,
+    fields: Sequence[str] = AGENT_MESSAGE_FIELDS,
+) -> List[Dict[str, Any]]:
+    """
+    Newest threads first, each with its latest max_messages_per_thread
+    messages (oldest to newest) and only the requested message fields.
+    With include_read=False only threads and messages that are unread.
+    """
+    match: Dict[str, Any] = {"user_id": user_id}
+    messages: Any = "$messages"
+    if not include_read:
+        match["messages.is_unread"] = True
+        messages = {"$filter": {"input": "$messages", "as": "m", "cond": {"$eq": ["$$m.is_unread", True]}}}
+
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"last_message_ts": -1, "thread_id": -1}},
+        {"$limit": max_threads},
+        {"$project": {
+            "_id": 0,
+            "thread_id": 1,
+            "subject": 1,
+            "message_count": 1,
+            "messages": {
+                "$map": {
+                    "input": {"$slice": [messages, -max_messages_per_thread]},
+                    "as": "m",
+                    "in": {f: f"$$m.{f}" for f in fields},
+                }
+            },
+        }},
+    ]
+    return list(email_threads.aggregate(pipeline))
@@ -8,7 +8,7 @@ class GmailMessage(BaseModel):
     to: str
     subject: str
     date: str
-    sent_time: str
+    ts: float = Field(0.0, description="UTC epoch seconds parsed from the Date header")
     is_unread: bool
     body_html: str
     body_clean: str
@@ -19,6 +19,8 @@ class GmailThread(BaseModel):
     message_count: int
     subject: str
     participants: List[str]
+    first_message_ts: float = 0.0
+    last_message_ts: float = 0.0
     messages: List[GmailMessage]
 
 class TokenSchema(BaseModel):
@@ -16,7 +16,15 @@ token_store = db["token_store"]
 state_store = db["state_store"]
 user_profiles = db["user_profiles"]
 agent_memory = db["agent_memory"]
-checkpoints = db["agent_checkpoints"]
+# MongoDBSaver's collections (it never honoured a custom collection_name)
+checkpoints = db["checkpoints"]
+checkpoint_writes = db["checkpoint_writes"]
+agent_threads = db["agent_threads"]
+agent_jobs = db["agent_jobs"]
+agent_job_slots = db["agent_job_slots"]
+sync_state = db["sync_state"]
+triage_cache = db["triage_cache"]
+sender_rules = db["sender_rules"]
 
 
 #documents
@@ -25,9 +33,29 @@ token_store.create_index("user_id", unique=True)
 state_store.create_index("state_key", unique=True)
 user_profiles.create_index("user_id", unique=True)
 agent_memory.create_index([("namespace", 1), ("key", 1)], unique=True)
+sync_state.create_index("user_id", unique=True)
+email_threads.create_index([("user_id", 1), ("messages.id", 1), ("messages.is_unread", 1)])
+email_threads.create_index([("user_id", 1), ("messages.is_unread", 1), ("messages.ts", -1)])
+email_threads.create_index([("user_id", 1), ("last_message_ts", -1), ("thread_id", -1)])
+email_threads.create_index([("user_id", 1), ("messages.ts", -1)])
+triage_cache.create_index([("user_id", 1), ("message_id", 1), ("body_hash", 1), ("prefs_version", 1)], unique=True)
+triage_cache.create_index("prefs_version")
+sender_rules.create_index([("user_id", 1), ("sender", 1)], unique=True)
+agent_threads.create_index("thread_id", unique=True)
+agent_threads.create_index([("user_id", 1), ("status", 1)])
+agent_threads.create_index([("status", 1), ("updated_at", 1)])
+agent_jobs.create_index([("status", 1), ("created_at", 1)])
+agent_jobs.create_index([("user_id", 1), ("created_at", -1)])
+agent_jobs.create_index([("status", 1), ("heartbeat_at", 1)])
+# one queued/running job per agent thread; the key is removed when the job finishes
+agent_jobs.create_index("active_key", unique=True, sparse=True)
+agent_jobs.create_index("finished_at", expireAfterSeconds=int(os.getenv("AGENT_JOB_RESULT_TTL_DAYS", "7")) * 86400)
+# entries for superseded preferences are purged eagerly; this catches the rest
+triage_cache.create_index("created_at", expireAfterSeconds=int(os.getenv("TRIAGE_CACHE_TTL_DAYS", "30")) * 86400)
 
 mongo_saver = MongoDBSaver(
     client=client,
     db_name=DB_NAME,
-    collection_name="agent_checkpoints",
+    checkpoint_collection_name="checkpoints",
+    writes_collection_name="checkpoint_writes",
 )
\ No newline at end of file
@@ -1,14 +1,59 @@
+import re
+import asyncio
 from datetime import datetime
-from pymongo import ASCENDING
-from typing import Any, Optional
+from urllib.parse import unquote
+from pymongo import ASCENDING, UpdateOne, DeleteOne
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 from pymongo.errors import DuplicateKeyError
+from langgraph.store.base import (
+    BaseStore,
+    GetOp,
+    Item,
+    ListNamespacesOp,
+    Op,
+    PutOp,
+    Result,
+    SearchItem,
+    SearchOp,
+)
 
+NAMESPACE_SEP = "/"
 
-class MongoDBStore:
+
+def encode_namespace(namespace) -> str:
+    """
+    Canonical string form of a namespace tuple: parts joined with "/", with
+    "%" and "/" inside a part percent-escaped. Strings are taken as already
+    encoded.
+    """
+    if isinstance(namespace, str):
+        return namespace
+    return NAMESPACE_SEP.join(
+        str(part).replace("%", "%25").replace(NAMESPACE_SEP, "%2F") for part in namespace
+    )
+
+
+def decode_namespace(namespace: str) -> Tuple[str, ...]:
+    return tuple(unquote(part) for part in namespace.split(NAMESPACE_SEP))
+
+
+def user_namespace(user_id: str, *parts: str) -> Tuple[str, ...]:
+    """Namespace owned by one user: ("users", <user_id>, *parts)."""
+    return ("users", user_id) + parts
+
+
+class MongoDBStore(BaseStore):
     """
     A persistent key-value store.
     Each record is stored with a namespace and key, allowing you to store
-    multiple users or agents memories separately.
+    multiple users or agents memories separately. Namespaces are stored in
+    their encode_namespace() string form, so a (namespace, key) lookup is a
+    single entry in the unique index; see user_namespace() for per-user ones.
+
+    get_value/put_value/delete_value work with raw values, as the agent uses
+    them. The LangGraph BaseStore API (get/put/delete/search, all built on
+    batch/abatch) works with Items; a stored value that isn't a dict is
+    exposed as {"value": v}.
     """
 
     def __init__(self, db):
@@ -18,34 +63,191 @@ class MongoDBStore:
             unique=True
         )
 
-    def put(self, namespace: str, key: str, value: Any):
+    # stored form of a namespace, also hashable for matching documents to requests
+    _ns = _ck = staticmethod(encode_namespace)
+
+    def _upsert(self, namespace, key: str, value: Any) -> Tuple[dict, dict]:
+        now = datetime.utcnow()
+        return (
+            {"namespace": self._ns(namespace), "key": key},
+            {
+                "$set": {"value": value, "updated_at": now},
+                # bumped on every write so caches in other processes can tell
+                "$inc": {"version": 1},
+                "$setOnInsert": {"created_at": now},
+            },
+        )
+
+    def put_value(self, namespace: str, key: str, value: Any):
         """Insert or update a memory record (atomic, no retry loop)."""
         try:
-            self.collection.update_one(
-                {"namespace": namespace, "key": key},
-                {
-                    "$set": {
-                        "value": value,
-                        "updated_at": datetime.utcnow(),
-                    },
-                    "$setOnInsert": {"created_at": datetime.utcnow()},
-                },
-                upsert=True,
-            )
+            self.collection.update_one(*self._upsert(namespace, key, value), upsert=True)
         except DuplicateKeyError:
             return
 
 
-    def get(self, namespace: str, key: str) -> Optional[Any]:
+    def get_value(self, namespace: str, key: str) -> Optional[Any]:
         """Retrieve a memory record."""
-        doc = self.collection.find_one({"namespace": namespace, "key": key})
+        doc = self.collection.find_one({"namespace": self._ns(namespace), "key": key})
         return doc.get("value") if doc else None
 
-    def delete(self, namespace: str, key: str):
+    def get_record(self, namespace: str, key: str) -> Tuple[Optional[Any], int]:
+        """Value and version of a memory record; (None, 0) if it doesn't exist."""
+        doc = self.collection.find_one({"namespace": self._ns(namespace), "key": key}, {"value": 1, "version": 1})
+        return (doc.get("value"), doc.get("version", 0)) if doc else (None, 0)
+
+    def get_version(self, namespace: str, key: str) -> int:
+        doc = self.collection.find_one({"namespace": self._ns(namespace), "key": key}, {"_id": 0, "version": 1})
+        return doc.get("version", 0) if doc else 0
+
+    def delete_value(self, namespace: str, key: str):
         """Delete a memory record."""
-        self.collection.delete_one({"namespace": namespace, "key": key})
+        self.collection.delete_one({"namespace": self._ns(namespace), "key": key})
 
     def list(self, namespace: str):
         """List all memory keys within a namespace."""
-        cursor = self.collection.find({"namespace": namespace}, {"key": 1, "_id": 0})
+        cursor = self.collection.find({"namespace": self._ns(namespace)}, {"key": 1, "_id": 0})
         return [doc["key"] for doc in cursor]
+
+    # multi-key operations: one round trip however many records
+
+    def _find_many(self, pairs: Sequence[Tuple[Any, str]], projection: dict) -> Dict[Tuple[Tuple, str], dict]:
+        if not pairs:
+            return {}
+        wanted = {(self._ck(ns), key) for ns, key in pairs}
+        # one branch per pair, each an exact hit on the (namespace, key) index
+        cursor = self.collection.find(
+            {"$or": [{"namespace": self._ns(ns), "key": key} for ns, key in wanted]},
+            projection,
+        )
+        found = {}
+        for doc in cursor:
+            ck = (self._ck(doc["namespace"]), doc["key"])
+            if ck in wanted:
+                found[ck] = doc
+        return found
+
+    def mget_records(self, pairs: Sequence[Tuple[Any, str]]) -> List[Tuple[Optional[Any], int]]:
+        """(value, version) for each (namespace, key), in order; (None, 0) where missing."""
+        found = self._find_many(pairs, {"_id": 0, "namespace": 1, "key": 1, "value": 1, "version": 1})
+        out = []
+        for ns, key in pairs:
+            doc = found.get((self._ck(ns), key))
+            out.append((doc.get("value"), doc.get("version", 0)) if doc else (None, 0))
+        return out
+
+    def mget(self, pairs: Sequence[Tuple[Any, str]]) -> List[Optional[Any]]:
+        """Values for each (namespace, key), in order; None where missing."""
+        return [value for value, _ in self.mget_records(pairs)]
+
+    def mput(self, items: Iterable[Tuple[Any, str, Any]]):
+        """Upsert many (namespace, key, value) records in one bulk write."""
+        operations = [UpdateOne(*self._upsert(ns, key, value), upsert=True) for ns, key, value in items]
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+    def scan(self, namespace_prefix, limit: int = 100, offset: int = 0) -> List[dict]:
+        """Every record under a namespace prefix, values included."""
+        prefix = self._ns(namespace_prefix)
+        # an anchored prefix regex is answered from the index
+        query = {"namespace": {"$regex": f"^{re.escape(prefix)}({NAMESPACE_SEP}|$)"}} if prefix else {}
+        cursor = self.collection.find(query, {"_id": 0}).sort([("namespace", 1), ("key", 1)]).skip(offset).limit(limit)
+        return list(cursor)
+
+    # langgraph BaseStore
+
+    @staticmethod
+    def _as_dict(value: Any) -> dict:
+        return value if isinstance(value, dict) else {"value": value}
+
+    def _item(self, doc: dict, cls=Item):
+        now = datetime.utcnow()
+        kwargs = dict(
+            namespace=decode_namespace(doc["namespace"]),
+            key=doc["key"],
+            value=self._as_dict(doc.get("value")),
+            created_at=doc.get("created_at", now),
+            updated_at=doc.get("updated_at", now),
+        )
+        return cls(**kwargs)
+
+    def _search(self, op: SearchOp) -> List[SearchItem]:
+        docs = self.scan(op.namespace_prefix, limit=0, offset=0) if op.filter else self.scan(
+            op.namespace_prefix, limit=op.limit, offset=op.offset
+        )
+        if op.filter:
+            docs = [
+                d for d in docs
+                if all(self._as_dict(d.get("value")).get(k) == v for k, v in op.filter.items())
+            ][op.offset:op.offset + op.limit]
+        return [self._item(d, SearchItem) for d in docs]
+
+    def _list_namespaces(self, op: ListNamespacesOp) -> List[Tuple[str, ...]]:
+        namespaces = sorted(decode_namespace(ns) for ns in self.collection.distinct("namespace") if isinstance(ns, str))
+
+        def matches(ns):
+            for cond in op.match_conditions or ():
+                path = tuple(cond.path)
+                part = ns[:len(path)] if cond.match_type == "prefix" else ns[-len(path):]
+                if len(ns) < len(path) or any(p != "*" and p != n for p, n in zip(path, part)):
+                    return False
+            return True
+
+        result = [ns[:op.max_depth] if op.max_depth else ns for ns in namespaces if matches(ns)]
+        result = list(dict.fromkeys(result))
+        return result[op.offset:op.offset + op.limit]
+
+    def batch(self, ops: Iterable[Op]) -> List[Result]:
+        ops = list(ops)
+        results: List[Result] = [None] * len(ops)
+
+        gets = [(i, op) for i, op in enumerate(ops) if isinstance(op, GetOp)]
+        if gets:
+            found = self._find_many(
+                [(op.namespace, op.key) for _, op in gets],
+                {"_id": 0},
+            )
+            for i, op in gets:
+                doc = found.get((self._ck(op.namespace), op.key))
+                results[i] = self._item(doc) if doc else None
+
+        writes = []
+        for op in ops:
+            if isinstance(op, PutOp):
+                if op.value is None:
+                    writes.append(DeleteOne({"namespace": self._ns(op.namespace), "key": op.key}))
+                else:
+                    writes.append(UpdateOne(*self._upsert(op.namespace, op.key, dict(op.value)), upsert=True))
+        if writes:
+            self.collection.bulk_write(writes, ordered=True)
+
+        for i, op in enumerate(ops):
+            if isinstance(op, SearchOp):
+                results[i] = self._search(op)
+            elif isinstance(op, ListNamespacesOp):
+                results[i] = self._list_namespaces(op)
+        return results
+
+    async def abatch(self, ops: Iterable[Op]) -> List[Result]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.batch, list(ops))
+
+    def migrate_namespaces(self) -> int:
+        """
+        Rewrite records saved with array namespaces into the string encoding.
+        Where both forms exist for a key, the most recently updated value wins.
+        """
+        migrated = 0
+        for doc in self.collection.find({"namespace": {"$type": "array"}}):
+            encoded = encode_namespace(doc["namespace"])
+            existing = self.collection.find_one({"namespace": encoded, "key": doc["key"]}, {"updated_at": 1})
+            if existing is None:
+                self.collection.update_one({"_id": doc["_id"]}, {"$set": {"namespace": encoded}})
+            else:
+                if (doc.get("updated_at") or datetime.min) > (existing.get("updated_at") or datetime.min):
+                    self.collection.update_one(
+                        {"_id": existing["_id"]},
+                        {"$set": {"value": doc.get("value"), "updated_at": doc.get("updated_at")}, "$inc": {"version": 1}},
+                    )
+                self.collection.delete_one({"_id": doc["_id"]})
+            migrated += 1
+        return migrated
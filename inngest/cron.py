@@ -1,18 +1,15 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from inngest.storage import store_threads_to_mongo, verify_mongodb_connection, clear_user_threads
+from inngest.storage import verify_mongodb_connection
+from inngest.gmail_sync import get_sync_engine, shutdown_sync_engine
 from routers.stores import get_all_tokens
-from routers.emails_router import fetch_primary_inbox_emails_threaded_sync
+from routers.token_manager import renew_expiring_tokens
+from routers.settings import CHECKPOINT_PRUNE_INTERVAL_MINUTES
+from db.agent_threads import prune_threads
+
+scheduler = None
 
-scheduler = None  
 
-def sync_user(user_id: str):
-    data = fetch_primary_inbox_emails_threaded_sync(user_id)
-    if data:
-        clear_user_threads(user_id)
-        store_threads_to_mongo(user_id, data)
-  
-        
 def run_sync_job():
     tokens = get_all_tokens()
     user_ids = [t["user_id"] for t in tokens if "user_id" in t]
@@ -21,8 +18,9 @@ def run_sync_job():
         return
     if not verify_mongodb_connection():
         return
-    for user_id in user_ids:
-        sync_user(user_id)
+    # only the users whose slot falls in this minute; the engine spreads
+    # everyone across the sync interval and runs them on its worker pool
+    get_sync_engine().tick(user_ids)
 
 
 
@@ -34,19 +32,36 @@ def start_scheduler():
     scheduler = BackgroundScheduler()
     scheduler.add_job(
         run_sync_job,
-        trigger=IntervalTrigger(minutes=10),
+        trigger=IntervalTrigger(minutes=1),
         id="email_sync_job",
-        name="Email sync every 10 minutes",
+        name="Email sync tick (each user every SYNC_INTERVAL_MINUTES)",
+        replace_existing=True,
+        max_instances=1
+    )
+    scheduler.add_job(
+        renew_expiring_tokens,
+        trigger=IntervalTrigger(minutes=1),
+        id="token_renewal_job",
+        name="Refresh OAuth tokens ahead of expiry",
+        replace_existing=True,
+        max_instances=1
+    )
+    scheduler.add_job(
+        prune_threads,
+        trigger=IntervalTrigger(minutes=CHECKPOINT_PRUNE_INTERVAL_MINUTES),
+        id="checkpoint_prune_job",
+        name="Delete expired agent threads and their checkpoints",
         replace_existing=True,
         max_instances=1
     )
     scheduler.start()
-    run_sync_job()
+    get_sync_engine().sync_all_users()
 
 
 def stop_scheduler():
     global scheduler
     if scheduler and scheduler.running:
         scheduler.shutdown(wait=False)
+        shutdown_sync_engine()
     else:
         print("scheduler was not running")
@@ -1,21 +1,240 @@
-import asyncio
-from inngest.storage import store_threads_to_mongo, clear_user_threads
-from routers.emails_router import fetch_primary_inbox_emails_threaded
+import time
+import zlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from inngest.incremental_sync import sync_user_incremental, full_resync
 from routers.stores import get_all_tokens
+from routers.settings import SYNC_MODE, SYNC_WORKERS, SYNC_USER_TIMEOUT_SECONDS, SYNC_INTERVAL_MINUTES
 
-async def sync_user_inbox(user_id: str):
-    data = await fetch_primary_inbox_emails_threaded(user_id)
-    clear_user_threads(user_id)
-    store_threads_to_mongo(user_id, data)
+logger = logging.getLogger(__name__)
 
 
-async def sync_all_users():
-    all_tokens = get_all_tokens()
-    if not all_tokens:
-        return
-    
-    user_ids = [t["user_id"] for t in all_tokens if "user_id" in t]
-    tasks = [sync_user_inbox(user_id) for user_id in user_ids]
-    await asyncio.gather(*tasks, return_exceptions=True)
+def sync_user(user_id: str):
+    if SYNC_MODE == "full":
+        return full_resync(user_id)
+    return sync_user_incremental(user_id)
 
-#731
\ No newline at end of file
+
+class SyncEngine:
+    """
+    Fans user syncs out over a bounded thread pool.
+
+    Every user gets a stable slot inside the sync interval (hash of the
+    user_id), and tick() - called once a minute - only enqueues the users
+    whose slot is due, so load is spread over the interval instead of
+    everyone hitting Gmail at minute 0. A user whose slot was missed (a late
+    or skipped tick) is picked up as soon as they are overdue. A user is
+    never synced twice at once.
+
+    At most max_workers syncs run at a time. A sync that overruns the
+    timeout gives up its place and the user can be dispatched again; its
+    thread (bounded by the Gmail socket timeout) finishes on one of the
+    spare pool threads.
+    """
+
+    def __init__(
+        self,
+        sync_fn: Callable[[str], Optional[dict]] = sync_user,
+        max_workers: int = SYNC_WORKERS,
+        user_timeout: float = SYNC_USER_TIMEOUT_SECONDS,
+        interval_minutes: int = SYNC_INTERVAL_MINUTES,
+    ):
+        self.sync_fn = sync_fn
+        self.max_workers = max_workers
+        self.user_timeout = user_timeout
+        self.interval_minutes = max(1, interval_minutes)
+        # twice the concurrency: the spare threads carry abandoned, overrunning syncs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers * 2, thread_name_prefix="gmail-sync")
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._created_at = time.time()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, dict] = {}
+        self._users: Dict[str, dict] = {}
+        self._totals = {"submitted": 0, "succeeded": 0, "failed": 0, "timed_out": 0, "skipped_busy": 0}
+
+    def slot_for(self, user_id: str) -> int:
+        return zlib.crc32(user_id.encode("utf-8")) % self.interval_minutes
+
+    def last_synced_at(self, user_id: str) -> float:
+        """Wall time the user's last sync finished (or the engine started, if none has)."""
+        with self._lock:
+            return self._users.get(user_id, {}).get("finished_at", self._created_at)
+
+    def due_users(self, user_ids: List[str], minute: Optional[int] = None, now: Optional[float] = None) -> List[str]:
+        """Users whose slot is this minute, plus any not synced for over an interval."""
+        now = time.time() if now is None else now
+        if minute is None:
+            minute = int(now // 60)
+        current = minute % self.interval_minutes
+        # a minute of slack so a user synced on their slot isn't also overdue at the next one
+        overdue = (self.interval_minutes + 1) * 60
+        return [
+            u for u in user_ids
+            if self.slot_for(u) == current or now - self.last_synced_at(u) >= overdue
+        ]
+
+    def submit(self, user_id: str) -> bool:
+        with self._lock:
+            if user_id in self._inflight:
+                self._totals["skipped_busy"] += 1
+                return False
+            entry = {"queued_at": time.monotonic(), "started_at": None, "timed_out": False, "cancelled": False, "released": False}
+            self._inflight[user_id] = entry
+            self._totals["submitted"] += 1
+        entry["future"] = self._executor.submit(self._run, user_id, entry)
+        return True
+
+    def _release(self, entry: dict):
+        # called with self._lock held; an entry gives its slot back once
+        if not entry["released"]:
+            entry["released"] = True
+            self._slots.release()
+
+    def _forget(self, user_id: str, entry: dict):
+        # called with self._lock held; a re-dispatched user may already have a newer entry
+        if self._inflight.get(user_id) is entry:
+            del self._inflight[user_id]
+
+    def _run(self, user_id: str, entry: dict):
+        self._slots.acquire()
+        with self._lock:
+            if entry["cancelled"]:
+                # timed out while waiting for a slot
+                self._release(entry)
+                return None
+            entry["started_at"] = time.monotonic()
+        status = "ok"
+        result = None
+        try:
+            result = self.sync_fn(user_id)
+        except Exception as e:
+            status = "error"
+            logger.exception("sync failed for %s: %s", user_id, e)
+        finally:
+            finished = time.monotonic()
+            with self._lock:
+                self._release(entry)
+                self._forget(user_id, entry)
+                if status == "error":
+                    self._totals["failed"] += 1
+                elif entry["timed_out"]:
+                    # already counted in timed_out by check_timeouts
+                    status = "timed_out"
+                else:
+                    self._totals["succeeded"] += 1
+                # an abandoned sync finishing late must not overwrite a later dispatch's record
+                if self._users.get(user_id, {}).get("queued_at", 0) <= entry["queued_at"]:
+                    self._users[user_id] = {
+                        "status": status,
+                        "latency_ms": round((finished - entry["started_at"]) * 1000, 1),
+                        "queue_wait_ms": round((entry["started_at"] - entry["queued_at"]) * 1000, 1),
+                        "queued_at": entry["queued_at"],
+                        "finished_at": time.time(),
+                        "mode": (result or {}).get("mode"),
+                    }
+        return result
+
+    def check_timeouts(self):
+        """
+        Drop syncs still queued past the timeout, and abandon running ones that
+        overran: both free their place and leave the user eligible again.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for user_id, entry in list(self._inflight.items()):
+                started = entry["started_at"]
+                if started is None and now - entry["queued_at"] > self.user_timeout:
+                    # a future already blocked on a slot can't be cancelled; it sees the flag instead
+                    entry["cancelled"] = True
+                    if entry.get("future"):
+                        entry["future"].cancel()
+                    self._forget(user_id, entry)
+                    self._totals["timed_out"] += 1
+                    logger.warning("sync for %s cancelled after waiting %.0fs in queue", user_id, now - entry["queued_at"])
+                elif started is not None and not entry["timed_out"] and now - started > self.user_timeout:
+                    entry["timed_out"] = True
+                    self._release(entry)
+                    self._forget(user_id, entry)
+                    self._totals["timed_out"] += 1
+                    logger.warning("sync for %s abandoned after running for %.0fs", user_id, now - started)
+
+    def tick(self, user_ids: Optional[List[str]] = None):
+        """Enqueue the users whose slot is due this minute, and any that are overdue."""
+        self.check_timeouts()
+        if user_ids is None:
+            user_ids = [t["user_id"] for t in get_all_tokens() if "user_id" in t]
+        for user_id in self.due_users(user_ids):
+            self.submit(user_id)
+
+    def sync_all_users(self, user_ids: Optional[List[str]] = None, wait: bool = False):
+        """Enqueue every user regardless of slot (startup / manual backfill)."""
+        if user_ids is None:
+            user_ids = [t["user_id"] for t in get_all_tokens() if "user_id" in t]
+        for user_id in user_ids:
+            self.submit(user_id)
+        if wait:
+            with self._lock:
+                futures = [e["future"] for e in self._inflight.values() if e.get("future")]
+            for future in futures:
+                try:
+                    future.result(timeout=self.user_timeout)
+                except Exception:
+                    pass
+
+    def metrics(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            queued = [u for u, e in self._inflight.items() if e["started_at"] is None]
+            running = {
+                u: round(now - e["started_at"], 1)
+                for u, e in self._inflight.items() if e["started_at"] is not None
+            }
+            users = dict(self._users)
+            totals = dict(self._totals)
+
+        latencies = sorted(u["latency_ms"] for u in users.values())
+        return {
+            "workers": self.max_workers,
+            "queue_depth": len(queued),
+            "running": running,
+            "totals": totals,
+            "latency_ms": {
+                "p50": latencies[len(latencies) // 2] if latencies else None,
+                "p95": latencies[int(len(latencies) * 0.95)] if latencies else None,
+                "max": latencies[-1] if latencies else None,
+            },
+            "users": users,
+        }
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_engine: Optional[SyncEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_sync_engine() -> SyncEngine:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = SyncEngine()
+        return _engine
+
+
+def shutdown_sync_engine(wait: bool = False):
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.shutdown(wait=wait)
+            _engine = None
+
+
+def sync_all_users(wait: bool = False):
+    get_sync_engine().sync_all_users(wait=wait)
+
+
+def get_sync_metrics() -> dict:
+    return get_sync_engine().metrics()
@@ -0,0 +1,155 @@
+from googleapiclient.errors import HttpError
+from inngest.storage import (
+    store_threads_to_mongo,
+    clear_user_threads,
+    get_sync_state,
+    save_history_id,
+    apply_message_changes,
+    get_stored_clean_bodies,
+    prune_thread_window,
+)
+from routers.emails_router import (
+    fetch_primary_inbox_emails_threaded_sync,
+    get_gmail_service,
+    build_thread_obj,
+)
+from routers.gmail_batch import fetch_threads_batched
+from routers.settings import SYNC_MAX_THREADS
+
+HISTORY_TYPES = ["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"]
+NON_PRIMARY_CATEGORIES = {"CATEGORY_SOCIAL", "CATEGORY_PROMOTIONS", "CATEGORY_UPDATES", "CATEGORY_FORUMS"}
+
+
+def _in_primary_inbox(label_ids) -> bool:
+    labels = set(label_ids or [])
+    return "INBOX" in labels and not (labels & NON_PRIMARY_CATEGORIES)
+
+
+def full_resync(user_id: str):
+    """Delete-and-reload path, used on first sync and when the history id has expired."""
+    data = fetch_primary_inbox_emails_threaded_sync(user_id, max_threads=SYNC_MAX_THREADS)
+    if not data:
+        return {"mode": "full", "threads": 0}
+
+    clear_user_threads(user_id)
+    store_threads_to_mongo(user_id, data)
+    if data.get("history_id"):
+        save_history_id(user_id, data["history_id"], full_sync=True)
+
+    return {"mode": "full", "threads": data.get("thread_count", 0)}
+
+
+def list_history_changes(service, start_history_id: str):
+    """
+    Walk users.history.list from start_history_id and reduce it to what
+    changed: threads to refetch, messages to drop and read/unread flips.
+    """
+    refetch_threads = set()
+    removed_ids = set()
+    read_state = {}
+    latest_history_id = start_history_id
+    page_token = None
+
+    while True:
+        resp = service.users().history().list(
+            userId="me",
+            startHistoryId=start_history_id,
+            historyTypes=HISTORY_TYPES,
+            pageToken=page_token
+        ).execute()
+
+        latest_history_id = resp.get("historyId", latest_history_id)
+
+        for record in resp.get("history", []):
+            for item in record.get("messagesAdded", []):
+                msg = item.get("message", {})
+                if _in_primary_inbox(msg.get("labelIds")):
+                    refetch_threads.add(msg.get("threadId"))
+                    removed_ids.discard(msg.get("id"))
+
+            for item in record.get("messagesDeleted", []):
+                removed_ids.add(item.get("message", {}).get("id"))
+
+            # msg.labelIds are the labels after the change
+            for item in record.get("labelsAdded", []):
+                msg = item.get("message", {})
+                labels = item.get("labelIds", [])
+                if "INBOX" in labels and _in_primary_inbox(msg.get("labelIds")):
+                    refetch_threads.add(msg.get("threadId"))
+                    removed_ids.discard(msg.get("id"))
+                elif NON_PRIMARY_CATEGORIES & set(labels):
+                    # recategorised out of Primary
+                    removed_ids.add(msg.get("id"))
+                if "UNREAD" in labels:
+                    read_state[msg.get("id")] = True
+
+            for item in record.get("labelsRemoved", []):
+                msg = item.get("message", {})
+                labels = item.get("labelIds", [])
+                if "INBOX" in labels:
+                    removed_ids.add(msg.get("id"))
+                elif NON_PRIMARY_CATEGORIES & set(labels) and _in_primary_inbox(msg.get("labelIds")):
+                    # moved into Primary from another tab
+                    refetch_threads.add(msg.get("threadId"))
+                    removed_ids.discard(msg.get("id"))
+                if "UNREAD" in labels:
+                    read_state[msg.get("id")] = False
+
+        page_token = resp.get("nextPageToken")
+        if not page_token:
+            break
+
+    refetch_threads.discard(None)
+    removed_ids.discard(None)
+    return refetch_threads, removed_ids, read_state, latest_history_id
+
+
+def sync_user_incremental(user_id: str, max_messages_per_thread: int = 10, max_threads: int = SYNC_MAX_THREADS):
+    """
+    Patch the stored inbox with whatever changed since the last stored
+    historyId. An idle inbox costs one history.list call and no Mongo writes.
+    """
+    state = get_sync_state(user_id)
+    if not state or not state.get("history_id"):
+        return full_resync(user_id)
+
+    service = get_gmail_service(user_id)
+    try:
+        refetch_threads, removed_ids, read_state, latest_history_id = list_history_changes(
+            service, state["history_id"]
+        )
+    except HttpError as e:
+        # Gmail keeps history for about a week; an older startHistoryId is a 404
+        if e.resp.status == 404:
+            return full_resync(user_id)
+        raise
+
+    threads = []
+    fetched = fetch_threads_batched(service, list(refetch_threads), format="full")
+    known_clean = get_stored_clean_bodies(user_id, fetched.keys())
+    for thread_data in fetched.values():
+        thread = build_thread_obj(user_id, thread_data, max_messages_per_thread, known_clean)
+        # refetched threads carry the current labels, so their messages are fresh
+        for msg in thread["messages"]:
+            read_state.pop(msg["id"], None)
+            removed_ids.discard(msg["id"])
+        threads.append(thread)
+
+    writes = apply_message_changes(user_id, removed_ids, read_state)
+    pruned = 0
+    if threads:
+        store_threads_to_mongo(user_id, {"threads": threads})
+        writes += len(threads)
+        # new threads push the oldest out of the window a full resync would load
+        pruned = prune_thread_window(user_id, max_threads)
+
+    if str(latest_history_id) != str(state["history_id"]):
+        save_history_id(user_id, latest_history_id)
+
+    return {
+        "mode": "incremental",
+        "threads_refetched": len(threads),
+        "messages_removed": len(removed_ids),
+        "threads_pruned": pruned,
+        "writes": writes,
+    }
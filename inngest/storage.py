@@ -1,6 +1,36 @@
 from pymongo import UpdateOne
-from db.mongodb import email_threads, user_profiles
-from datetime import datetime
+from db.mongodb import email_threads, user_profiles, sync_state
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+def message_ts(raw_date) -> float:
+    """RFC 2822 Date header -> UTC epoch seconds (0 when missing/unparseable)."""
+    try:
+        parsed = parsedate_to_datetime(raw_date)
+    except Exception:
+        return 0.0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def stamp_messages(messages: list) -> list:
+    """Make sure every message carries its parsed `ts` (sync already sets it)."""
+    for m in messages:
+        if "ts" not in m:
+            m["ts"] = message_ts(m.get("date"))
+    return messages
+
+
+def last_message_ts(messages: list) -> float:
+    return max((m["ts"] if "ts" in m else message_ts(m.get("date")) for m in messages), default=0.0)
+
+
+def first_message_ts(messages: list) -> float:
+    stamps = [m["ts"] if "ts" in m else message_ts(m.get("date")) for m in messages]
+    stamps = [ts for ts in stamps if ts]
+    return min(stamps, default=0.0)
 
 def store_threads_to_mongo(user_id: str, data: dict):
     if not user_id or not isinstance(user_id, str):
@@ -19,13 +49,16 @@ def store_threads_to_mongo(user_id: str, data: dict):
         if not thread_id:
             continue
 
+        messages = stamp_messages(thread.get("messages", []))
         doc = {
             "user_id": user_id,
             "thread_id": thread_id,
             "message_count": thread.get("message_count", 0),
             "subject": thread.get("subject", ""),
             "participants": thread.get("participants", []),
-            "messages": thread.get("messages", []),
+            "messages": messages,
+            "first_message_ts": first_message_ts(messages),
+            "last_message_ts": last_message_ts(messages),
             "created_at": datetime.utcnow().isoformat(),
             "updated_at": datetime.utcnow().isoformat(),
         }
@@ -56,6 +89,22 @@ def store_threads_to_mongo(user_id: str, data: dict):
     return False
 
 
+def get_stored_clean_bodies(user_id: str, thread_ids) -> dict:
+    """message id -> body_clean already stored for these threads, so a resync can skip re-cleaning."""
+    if not thread_ids:
+        return {}
+    cursor = email_threads.find(
+        {"user_id": user_id, "thread_id": {"$in": list(thread_ids)}},
+        {"_id": 0, "messages.id": 1, "messages.body_clean": 1}
+    )
+    known = {}
+    for doc in cursor:
+        for msg in doc.get("messages", []):
+            if msg.get("id") and msg.get("body_clean") is not None:
+                known[msg["id"]] = msg["body_clean"]
+    return known
+
+
 def get_user_threads_from_mongo(user_id: str, limit: int = 20):
     threads = list(
         email_threads.find({"user_id": user_id})
@@ -85,4 +134,134 @@ def clear_user_threads(user_id: str):
         email_threads.delete_many({"user_id": user_id})
         return True
     except :
-        return False
\ No newline at end of file
+        return False
+
+
+def get_sync_state(user_id: str):
+    return sync_state.find_one({"user_id": user_id})
+
+
+def save_history_id(user_id: str, history_id: str, full_sync: bool = False):
+    """Remember the Gmail historyId the stored threads are consistent with."""
+    now = datetime.utcnow().isoformat()
+    fields = {"history_id": str(history_id), "last_sync_at": now}
+    if full_sync:
+        fields["last_full_sync_at"] = now
+
+    sync_state.update_one(
+        {"user_id": user_id},
+        {"$set": fields},
+        upsert=True
+    )
+
+
+def prune_thread_window(user_id: str, keep: int) -> int:
+    """Delete the user's threads beyond the newest `keep` (same order as the thread listing)."""
+    cursor = (
+        email_threads.find({"user_id": user_id}, {"_id": 1})
+        .sort([("last_message_ts", -1), ("thread_id", -1)])
+        .skip(keep)
+    )
+    stale = [doc["_id"] for doc in cursor]
+    if not stale:
+        return 0
+    return email_threads.delete_many({"_id": {"$in": stale}}).deleted_count
+
+
+def apply_message_changes(user_id: str, removed_ids: set, read_state: dict):
+    """
+    Patch stored threads in place: pull removed messages and flip is_unread
+    for relabeled ones. Returns the number of write operations sent.
+    """
+    operations = []
+
+    for message_id in removed_ids:
+        # pipeline update so the thread's sort keys are recomputed from what is left
+        operations.append(
+            UpdateOne(
+                {"user_id": user_id, "messages.id": message_id},
+                [
+                    {"$set": {
+                        "messages": {"$filter": {"input": "$messages", "cond": {"$ne": ["$$this.id", message_id]}}},
+                        "updated_at": datetime.utcnow().isoformat(),
+                    }},
+                    {"$set": {
+                        "message_count": {"$size": "$messages"},
+                        "last_message_ts": {"$ifNull": [{"$max": "$messages.ts"}, 0.0]},
+                        "first_message_ts": {"$ifNull": [{"$let": {
+                            "vars": {"stamps": {"$filter": {"input": "$messages.ts", "cond": {"$gt": ["$$this", 0]}}}},
+                            "in": {"$min": "$$stamps"},
+                        }}, 0.0]},
+                    }},
+                ]
+            )
+        )
+
+    for message_id, is_unread in read_state.items():
+        if message_id in removed_ids:
+            continue
+        operations.append(
+            UpdateOne(
+                {"user_id": user_id, "messages.id": message_id},
+                {"$set": {"messages.$.is_unread": is_unread}}
+            )
+        )
+
+    if not operations:
+        return 0
+
+    email_threads.bulk_write(operations, ordered=False)
+
+    if removed_ids:
+        email_threads.delete_many({"user_id": user_id, "messages": {"$size": 0}})
+
+    return len(operations)
+
+
+def save_triage_results(user_id: str, results: dict):
+    """
+    Store batch triage decisions on their messages. respond/notify are left
+    unread and flagged queued for the interactive agent; ignore is marked read,
+    the same as mark_as_read_node does. Returns the number of writes sent.
+    """
+    now = datetime.utcnow().isoformat()
+    operations = []
+    for message_id, result in results.items():
+        classification = result.get("classification")
+        fields = {
+            "messages.$.triage": {
+                "classification": classification,
+                "reasoning": result.get("reasoning", ""),
+                "confidence": result.get("confidence"),
+                "queued": classification in ("respond", "notify"),
+                "triaged_at": now,
+            }
+        }
+        if classification == "ignore":
+            fields["messages.$.is_unread"] = False
+        operations.append(
+            UpdateOne({"user_id": user_id, "messages.id": message_id}, {"$set": fields})
+        )
+
+    if operations:
+        email_threads.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def backfill_thread_timestamps():
+    """One-off: stamp threads/messages stored before timestamps were persisted."""
+    operations = []
+    cursor = email_threads.find(
+        {"$or": [{"last_message_ts": {"$exists": False}}, {"messages.ts": {"$exists": False}}]},
+        {"messages.date": 1, "messages.ts": 1}
+    )
+    for doc in cursor:
+        messages = doc.get("messages", [])
+        fields = {f"messages.{i}.ts": message_ts(m.get("date")) for i, m in enumerate(messages) if "ts" not in m}
+        fields["first_message_ts"] = first_message_ts(messages)
+        fields["last_message_ts"] = last_message_ts(messages)
+        operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+
+    if operations:
+        email_threads.bulk_write(operations, ordered=False)
+    return len(operations)
@@ -1,17 +1,33 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routers import auth_router, emails_router, agent_router
-from routers.settings import FRONTEND_URL
+from routers.settings import FRONTEND_URL, API_THREADPOOL_SIZE, MEMORY_UPDATE_FLUSH_SECONDS
+from routers.google_async import google_client
 from inngest.cron import start_scheduler, stop_scheduler
-from inngest.storage import verify_mongodb_connection
+from inngest.gmail_sync import get_sync_metrics
+from inngest.storage import verify_mongodb_connection, backfill_thread_timestamps
+from my_agent.agent import memory_store, memory_updates
+from my_agent.prompt_cache import usage_stats
+from db.agent_threads import adopt_untracked_threads
 from contextlib import asynccontextmanager
+import anyio.to_thread
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     try:
+        # blocking Mongo/LangGraph work is offloaded to this pool
+        anyio.to_thread.current_default_thread_limiter().total_tokens = API_THREADPOOL_SIZE
         if not verify_mongodb_connection():
             print("mongoDB connection failed")
+        else:
+            backfill_thread_timestamps()
+            # agent memory saved with array namespaces -> string encoding
+            migrated = memory_store.migrate_namespaces()
+            if migrated:
+                print(f"migrated {migrated} agent memory namespaces")
+            # checkpoints from before threads were tracked fall under the retention TTL too
+            adopt_untracked_threads()
         start_scheduler()
 
     except Exception as e:
@@ -22,6 +38,9 @@ async def lifespan(app: FastAPI):
 
     try:
         stop_scheduler()
+        await google_client.aclose()
+        # apply feedback still queued for the preference profiles
+        await anyio.to_thread.run_sync(memory_updates.shutdown, MEMORY_UPDATE_FLUSH_SECONDS)
     except Exception as e:
         print(f"shutdown error: {e}")
 
@@ -43,3 +62,18 @@ app.include_router(agent_router.router)
 @app.get("/")
 def read_root():
     return {"message": "Gmail API Backend is running"}
+
+
+@app.get("/sync/metrics")
+def sync_metrics():
+    return get_sync_metrics()
+
+
+@app.get("/agent/memory-updates/metrics")
+def memory_update_metrics():
+    return memory_updates.metrics()
+
+
+@app.get("/agent/token-usage/metrics")
+def token_usage_metrics():
+    return usage_stats()
@@ -1,22 +1,27 @@
-import os
 from dotenv import load_dotenv
 from typing import Literal
 from langgraph.types import interrupt, Command
 from langgraph.store.base import BaseStore
 from langgraph.graph import StateGraph, START, END
-from langchain_google_genai import ChatGoogleGenerativeAI
 from my_agent.tools import get_tools, get_tools_by_name, mark_email_as_read
 from my_agent.schema import RouterSchema, State, StateInput
-from my_agent.prompts import triage_system_prompt, default_background, triage_system_prompt, triage_user_prompt, default_triage_instructions, MEMORY_UPDATE_INSTRUCTIONS, default_cal_preferences, default_response_preferences, agent_system_prompt_hitl_memory, GMAIL_TOOLS_PROMPT, MEMORY_UPDATE_INSTRUCTIONS_REINFORCEMENT
+from my_agent.prompts import triage_user_prompt, default_triage_instructions, MEMORY_UPDATE_INSTRUCTIONS, default_cal_preferences, default_response_preferences, MEMORY_UPDATE_INSTRUCTIONS_REINFORCEMENT
 from my_agent.utils import parse_gmail
+from my_agent.triage import triage_system_message, classify_email
+from my_agent.triage_cache import preferences_version, get_cached_triage, cache_triage, purge_other_versions
+from my_agent.prefilter import prefilter, get_sender_rule, record_decision
+from my_agent.models import triage_llm, escalation_llm, response_llm, memory_llm
+from my_agent.memory_queue import MemoryUpdateQueue
+from my_agent.prompt_cache import agent_system_message, record_usage
 from langsmith import traceable
 from db.mongodb import db
-from db.mongodb_store import MongoDBStore
+from db.mongodb_store import MongoDBStore, user_namespace
+from db.cached_store import CachedMongoDBStore
 from db.mongodb import mongo_saver
 
 load_dotenv()
 checkpointer = mongo_saver
-memory_store = MongoDBStore(db)
+memory_store = CachedMongoDBStore(MongoDBStore(db))
 
 
 tools = get_tools(["send_email", "check_calendar", "schedule_meeting", "Question", "Done"])
@@ -24,33 +29,61 @@ tools = get_tools(["send_email", "check_calendar", "schedule_meeting", "Question
 
 tools_by_name = get_tools_by_name(tools)
 
-llm = ChatGoogleGenerativeAI(model = "gemini-2.5-pro", api_key = os.getenv("GOOGLE_API_KEY"), temperature = 0)
-llm_router = llm.with_structured_output(RouterSchema)
-llm_with_tools = llm.bind_tools(tools, tool_choice = "auto")
+# per-node models, see TRIAGE_MODEL / RESPONSE_MODEL / ... in routers/settings.py
+# include_raw so classify_email can record token usage (cached vs uncached input)
+llm_router = triage_llm.with_structured_output(RouterSchema, include_raw=True)
+llm_router_escalation = escalation_llm.with_structured_output(RouterSchema, include_raw=True)
+llm_with_tools = response_llm.bind_tools(tools, tool_choice = "auto")
 
 #tocheck the llm working or not
 #result = llm.invoke("write is 3+ 2")
 #print(result) #print the whole result
 #print(result.content) 
 
-def get_memory(store, namespace, default_content=None):
-    """Fetch or safely initialize memory without causing duplicate inserts."""
-    
-    user_preferences = store.get(namespace, "user_preferences")
-    if user_preferences:
-        return user_preferences
+PREFERENCE_DEFAULTS = {
+    "triage_preferences": default_triage_instructions,
+    "cal_preferences": default_cal_preferences,
+    "response_preferences": default_response_preferences,
+}
+
+
+def memory_namespace(user_id, name):
+    """Where a user's preference profile lives; the shared legacy one without a user."""
+    if not user_id:
+        return ("email_assistant", name)
+    return user_namespace(user_id, "email_assistant", name)
 
-    try:
-        store.put(namespace, "user_preferences", default_content)
-        return default_content
-    except:
-        existing = store.get(namespace, "user_preferences")
-        return existing if existing else default_content
+
+def get_memories(store, user_id, names=tuple(PREFERENCE_DEFAULTS)):
+    """
+    The user's preference profiles by name, in one round trip. A user without
+    a profile yet starts from the shared one learned before profiles were
+    per-user, else from the prompt default; those are written back in one
+    bulk write.
+    """
+    names = list(names)
+    pairs = [(memory_namespace(user_id, name), "user_preferences") for name in names]
+    if user_id:
+        pairs += [(memory_namespace(None, name), "user_preferences") for name in names]
+    values = store.mget(pairs)
+    own, shared = values[:len(names)], values[len(names):] or [None] * len(names)
+
+    memories = {}
+    missing = []
+    for name, ns_key, value, fallback in zip(names, pairs, own, shared):
+        if value:
+            memories[name] = value
+        else:
+            memories[name] = fallback or PREFERENCE_DEFAULTS[name]
+            missing.append((ns_key[0], "user_preferences", memories[name]))
+    if missing:
+        store.mput(missing)
+    return memories
 
 def update_memory(store, namespace, messages):
     """Update memory profile in the store."""
     
-    user_preferences = store.get(namespace, "user_preferences")
+    user_preferences = store.get_value(namespace, "user_preferences")
     if user_preferences is None:
         current_profile = ""
     elif hasattr(user_preferences, 'value'):
@@ -58,14 +91,28 @@ def update_memory(store, namespace, messages):
     else:
         current_profile = str(user_preferences)
     
-    result = llm.invoke(
+    result = memory_llm.invoke(
         [
             {"role": "system", 
              "content": MEMORY_UPDATE_INSTRUCTIONS.format(current_profile=current_profile, namespace=namespace)}
         ] + messages
     )
 
-    store.put(namespace, "user_preferences", result.content if hasattr(result, 'content') else str(result))
+    record_usage("update_memory", result)
+    new_profile = result.content if hasattr(result, 'content') else str(result)
+    store.put_value(namespace, "user_preferences", new_profile)
+
+    # the user's triage answers made under the old preferences are no longer valid
+    if namespace[-1] == "triage_preferences":
+        user_id = namespace[1] if namespace[0] == "users" else None
+        purge_other_versions(preferences_version(new_profile), user_id)
+
+# feedback from the interrupt handlers is applied here, after the resume has returned
+memory_updates = MemoryUpdateQueue(update_memory)
+
+
+def queue_memory_update(store, namespace, messages):
+    memory_updates.submit(store, namespace, messages)
 
 #1st node 
 @traceable
@@ -78,17 +125,24 @@ def triage_router(state: State, store: BaseStore) -> Command[Literal["triage_int
         author=from_, to=to, subject=subject, body=body_clean, id=id_,
     )
 
-    triage_instructions = get_memory(memory_store, ("email_assistant", "triage_preferences"), default_triage_instructions)
-
-    system_prompt = triage_system_prompt.format(
-        background=default_background,
-        triage_instructions=triage_instructions,
-    )
-
-    result = llm_router.invoke([
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_prompt},
-    ])
+    email_input = state["email_input"]
+    user_id = email_input.get("user_id")
+
+    # obvious bulk mail and senders the user always ignores never reach a model
+    result = prefilter(email_input, get_sender_rule(user_id, email_input))
+    if result is None:
+        # all preference namespaces at once, so llm_call later in the run reads them from cache
+        triage_instructions = get_memories(store, user_id)["triage_preferences"]
+        prefs_version = preferences_version(triage_instructions)
+        # same message, same content, same preferences: reuse the earlier answer
+        result = get_cached_triage(user_id, email_input, prefs_version)
+    if result is None:
+        # fast model first; low-confidence answers are re-run on the stronger one
+        result, _ = classify_email(llm_router, llm_router_escalation, [
+            triage_system_message(triage_instructions),
+            {"role": "user", "content": user_prompt},
+        ])
+        cache_triage(user_id, email_input, prefs_version, result)
 
     classification = getattr(result, "classification", None)
 
@@ -96,7 +150,8 @@ def triage_router(state: State, store: BaseStore) -> Command[Literal["triage_int
         goto = "response_agent"
         update = {
             "classification_decision": classification,
-            "messages": state.get("messages", []) + [
+            # the add_messages reducer appends; only the new message goes in the update
+            "messages": [
                 {"role": "user", "content": f"Respond to the email: {user_prompt}"}
             ],
             "email_input": state.get("email_input"),
@@ -117,6 +172,7 @@ def triage_router(state: State, store: BaseStore) -> Command[Literal["triage_int
 def triage_interrupt_handler(state: State, store: BaseStore) -> Command[Literal["response_agent", "__end__"]]:
     """Handles interrupts from the triage step"""
 
+    user_id = state["email_input"].get("user_id")
     from_, to, subject, body_clean, id_ = parse_gmail(state["email_input"])
     email_markdown = {
         "author":from_,
@@ -154,7 +210,8 @@ def triage_interrupt_handler(state: State, store: BaseStore) -> Command[Literal[
                         "content": f"User wants to reply to the email. Use this feedback to respond: {user_input}"
                         })
         
-        update_memory(store, ("email_assistant", "triage_preferences"), [{
+        record_decision(user_id, state["email_input"], "respond")
+        queue_memory_update(store, memory_namespace(user_id, "triage_preferences"), [{
             "role": "user",
             "content": f"The user decided to respond to the email, so update the triage preferences to capture this."
         }] + messages)
@@ -165,7 +222,8 @@ def triage_interrupt_handler(state: State, store: BaseStore) -> Command[Literal[
                         "content": f"The user decided to ignore the email even though it was classified as notify. Update triage preferences to capture this."
                         })
         
-        update_memory(store, ("email_assistant", "triage_preferences"), messages)
+        record_decision(user_id, state["email_input"], "ignore")
+        queue_memory_update(store, memory_namespace(user_id, "triage_preferences"), messages)
         goto = END
     
     update = {
@@ -180,23 +238,17 @@ def triage_interrupt_handler(state: State, store: BaseStore) -> Command[Literal[
 def llm_call(state: State, store: BaseStore):
     """LLM decides whether to call a tool or not"""
  
-    cal_preferences = get_memory(store, ("email_assistant", "cal_preferences"), default_cal_preferences)
-    response_preferences = get_memory(store, ("email_assistant", "response_preferences"), default_response_preferences)
-
-    return {
-        "messages": [
-            llm_with_tools.invoke(
-                [
-                    {"role": "system", "content": agent_system_prompt_hitl_memory.format(
-                        tools_prompt = GMAIL_TOOLS_PROMPT,
-                        background = default_background,
-                        response_preferences = response_preferences,
-                        cal_preferences = cal_preferences
-                    )}
-                ]+state["messages"]
-            )
-        ]
-    }
+    user_id = state["email_input"].get("user_id")
+    memories = get_memories(store, user_id, ("cal_preferences", "response_preferences"))
+    cal_preferences = memories["cal_preferences"]
+    response_preferences = memories["response_preferences"]
+
+    # static prefix first, memoized per preferences: the email is in state["messages"]
+    message = llm_with_tools.invoke(
+        [agent_system_message(response_preferences, cal_preferences)] + state["messages"]
+    )
+    record_usage("llm_call", message)
+    return {"messages": [message]}
 
 # response_agent - node3
 @traceable
@@ -205,6 +257,7 @@ def interrupt_handler(state: State, store: BaseStore) -> Command[Literal["llm_ca
 
     result = []
     goto = "llm_call"
+    user_id = state["email_input"].get("user_id")
     hitl_tools = ["send_email", "schedule_meeting", "Question"]
 
     for tool_call in state["messages"][-1].tool_calls:
@@ -216,7 +269,7 @@ def interrupt_handler(state: State, store: BaseStore) -> Command[Literal["llm_ca
     hitl_tool_call = next((tc for tc in state["messages"][-1].tool_calls if tc["name"] in hitl_tools), None)
     
     if not hitl_tool_call:
-        return Command(goto="llm_call", update={"messages": state["messages"] + result})
+        return Command(goto="llm_call", update={"messages": result})
     
     tool_call = hitl_tool_call
     email_input = state["email_input"]
@@ -270,12 +323,12 @@ def interrupt_handler(state: State, store: BaseStore) -> Command[Literal["llm_ca
         result.append({"role": "tool", "content": observation, "tool_call_id": current_id})
         
         if tool_call["name"] == "send_email":
-            update_memory(store, ("email_assistant", "response_preferences"), [{
+            queue_memory_update(store, memory_namespace(user_id, "response_preferences"), [{
                 "role": "user",
                 "content": f"User edited the email with args: {edited_args}. {MEMORY_UPDATE_INSTRUCTIONS_REINFORCEMENT}."
             }])
         elif tool_call["name"] == "schedule_meeting":
-            update_memory(store, ("email_assistant", "cal_preferences"), [{
+            queue_memory_update(store, memory_namespace(user_id, "cal_preferences"), [{
                 "role": "user",
                 "content": f"User edited the meeting with args: {edited_args}. {MEMORY_UPDATE_INSTRUCTIONS_REINFORCEMENT}."
             }])
@@ -283,7 +336,7 @@ def interrupt_handler(state: State, store: BaseStore) -> Command[Literal["llm_ca
     elif response.get("type") == "ignore":
         result.append({"role": "tool", "content": "User ignored this action.", "tool_call_id": tool_call["id"]})
         goto = "__end__"
-        update_memory(store, ("email_assistant", "triage_preferences"), [{
+        queue_memory_update(store, memory_namespace(user_id, "triage_preferences"), [{
             "role": "user",
             "content": f"User ignored an action. Update preferences. {MEMORY_UPDATE_INSTRUCTIONS_REINFORCEMENT}."
         }])
@@ -293,17 +346,18 @@ def interrupt_handler(state: State, store: BaseStore) -> Command[Literal["llm_ca
         result.append({"role": "tool", "content": f"User feedback: {user_feedback}", "tool_call_id": tool_call["id"]})
         
         if tool_call["name"] == "send_email":
-            update_memory(store, ("email_assistant", "response_preferences"), [{
+            queue_memory_update(store, memory_namespace(user_id, "response_preferences"), [{
                 "role": "user",
                 "content": f"User provided feedback: {user_feedback}. {MEMORY_UPDATE_INSTRUCTIONS_REINFORCEMENT}."
             }])
         elif tool_call["name"] == "schedule_meeting":
-            update_memory(store, ("email_assistant", "cal_preferences"), [{
+            queue_memory_update(store, memory_namespace(user_id, "cal_preferences"), [{
                 "role": "user",
                 "content": f"User provided feedback: {user_feedback}. {MEMORY_UPDATE_INSTRUCTIONS_REINFORCEMENT}."
             }])
     
-    return Command(goto=goto, update={"messages": state["messages"] + result})
+    # only the new messages: re-sending the history made every checkpoint write carry all of it
+    return Command(goto=goto, update={"messages": result})
 
 # response_agent - node2
 @traceable
@@ -0,0 +1,123 @@
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from routers.settings import MEMORY_UPDATE_WORKERS, MEMORY_UPDATE_DEBOUNCE_SECONDS, MEMORY_UPDATE_MAX_EVENTS
+
+logger = logging.getLogger(__name__)
+
+
+def _key(namespace) -> Tuple:
+    return tuple(namespace) if isinstance(namespace, (tuple, list)) else (namespace,)
+
+
+class MemoryUpdateQueue:
+    """
+    Runs preference-memory rewrites off the request path.
+
+    Feedback events are queued per namespace. At most one drain runs per
+    namespace at a time, so rewrites of a profile never race and are applied
+    in the order the feedback arrived. A drain waits briefly for more events
+    to arrive, then folds everything pending (up to max_events) into a single
+    LLM rewrite; events that arrive while it runs go into the next one.
+
+    Pending events live in process memory: they are flushed on shutdown, but
+    a crash loses them (the user's action itself has already been applied).
+    """
+
+    def __init__(
+        self,
+        apply_fn: Callable[[object, tuple, List[dict]], None],
+        max_workers: int = MEMORY_UPDATE_WORKERS,
+        debounce_seconds: float = MEMORY_UPDATE_DEBOUNCE_SECONDS,
+        max_events: int = MEMORY_UPDATE_MAX_EVENTS,
+    ):
+        self.apply_fn = apply_fn
+        self.max_workers = max_workers
+        self.debounce = debounce_seconds
+        self.max_events = max(1, max_events)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="memory-update")
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        # namespace -> deque of (store, messages, queued_at)
+        self._pending: Dict[Tuple, deque] = {}
+        self._draining: set = set()
+        self._totals = {"events": 0, "rewrites": 0, "coalesced": 0, "failed": 0}
+        self._last_lag_ms: Optional[float] = None
+
+    def submit(self, store, namespace, messages: List[dict]):
+        """Queue one feedback event; returns immediately."""
+        key = _key(namespace)
+        with self._lock:
+            self._pending.setdefault(key, deque()).append((store, list(messages), time.monotonic()))
+            self._totals["events"] += 1
+            if key in self._draining:
+                return
+            self._draining.add(key)
+        self._executor.submit(self._drain, namespace, key)
+
+    def _take(self, key) -> list:
+        with self._lock:
+            queue = self._pending.get(key)
+            events = []
+            while queue and len(events) < self.max_events:
+                events.append(queue.popleft())
+            return events
+
+    def _drain(self, namespace, key):
+        try:
+            while True:
+                if self.debounce:
+                    time.sleep(self.debounce)
+                events = self._take(key)
+                if not events:
+                    return
+                store = events[-1][0]
+                messages = [m for _, event_messages, _ in events for m in event_messages]
+                try:
+                    self.apply_fn(store, namespace, messages)
+                except Exception as e:
+                    with self._lock:
+                        self._totals["failed"] += 1
+                    logger.exception("memory update for %s failed (%d events dropped): %s", key, len(events), e)
+                    continue
+                with self._lock:
+                    self._totals["rewrites"] += 1
+                    self._totals["coalesced"] += len(events) - 1
+                    self._last_lag_ms = round((time.monotonic() - events[0][2]) * 1000, 1)
+        finally:
+            with self._lock:
+                # an event may have slipped in after the last _take; hand it to a new drain
+                if self._pending.get(key):
+                    self._executor.submit(self._drain, namespace, key)
+                else:
+                    self._pending.pop(key, None)
+                    self._draining.discard(key)
+                    self._idle.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued event has been applied; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._draining:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "pending": {"/".join(k): len(q) for k, q in self._pending.items() if q},
+                "draining": ["/".join(k) for k in self._draining],
+                "totals": dict(self._totals),
+                "last_lag_ms": self._last_lag_ms,
+            }
+
+    def shutdown(self, timeout: Optional[float] = None):
+        self.flush(timeout)
+        self._executor.shutdown(wait=False, cancel_futures=True)
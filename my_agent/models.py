@@ -0,0 +1,23 @@
+import os
+from functools import lru_cache
+from langchain_google_genai import ChatGoogleGenerativeAI
+from routers.settings import (
+    TRIAGE_MODEL,
+    TRIAGE_ESCALATION_MODEL,
+    RESPONSE_MODEL,
+    MEMORY_MODEL,
+    SUMMARY_MODEL,
+)
+
+
+@lru_cache(maxsize=None)
+def chat_model(model: str) -> ChatGoogleGenerativeAI:
+    """One client per model name; nodes configured with the same model share it."""
+    return ChatGoogleGenerativeAI(model=model, api_key=os.getenv("GOOGLE_API_KEY"), temperature=0)
+
+
+triage_llm = chat_model(TRIAGE_MODEL)
+escalation_llm = chat_model(TRIAGE_ESCALATION_MODEL)
+response_llm = chat_model(RESPONSE_MODEL)
+memory_llm = chat_model(MEMORY_MODEL)
+summary_llm = chat_model(SUMMARY_MODEL)
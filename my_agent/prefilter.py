@@ -0,0 +1,125 @@
+"""
+Deterministic triage ahead of the LLM.
+
+Scores the bulk-mail signals stored with each message at sync time (category
+labels, Precedence, Auto-Submitted, List-Unsubscribe, the sender address) and
+the user's own past decisions for the sender. Only confident `ignore` answers
+are produced; anything else is left to the model.
+"""
+import re
+from datetime import datetime
+from email.utils import parseaddr
+from typing import Dict, Iterable, Optional, Tuple
+from my_agent.schema import RouterSchema
+from routers.settings import PREFILTER_IGNORE_DOMAINS, PREFILTER_MIN_DECISIONS
+
+BULK_CATEGORIES = {"CATEGORY_PROMOTIONS", "CATEGORY_SOCIAL", "CATEGORY_FORUMS"}
+BULK_PRECEDENCE = {"bulk", "junk", "list"}
+AUTOMATED_LOCAL_PART = re.compile(
+    r"^(no-?reply|do-?not-?reply|notifications?|notify|mailer-daemon|bounces?|"
+    r"calendar-notification|newsletters?|news|marketing|promo(tions)?|digest)([+._-].*)?$"
+)
+# a strong signal alone is enough to ignore, medium ones need a second signal
+STRONG, MEDIUM = 2, 1
+IGNORE_SCORE = 2
+
+
+def sender_address(email: dict) -> str:
+    return parseaddr(email.get("from") or "")[1].lower()
+
+
+def _signals(email: dict, sender: str):
+    local, _, domain = sender.partition("@")
+    if set(email.get("label_ids") or []) & BULK_CATEGORIES:
+        yield "category label", STRONG
+    if email.get("precedence") in BULK_PRECEDENCE:
+        yield f"Precedence: {email['precedence']}", STRONG
+    if domain and any(domain == d or domain.endswith("." + d) for d in PREFILTER_IGNORE_DOMAINS):
+        yield f"ignored domain {domain}", STRONG
+    auto = email.get("auto_submitted") or ""
+    if auto and auto != "no":
+        yield f"Auto-Submitted: {auto}", MEDIUM
+    if local and AUTOMATED_LOCAL_PART.match(local):
+        yield "automated sender", MEDIUM
+    if email.get("list_unsubscribe"):
+        yield "List-Unsubscribe", MEDIUM
+
+
+def _learned(rule: Optional[dict]) -> Tuple[bool, bool]:
+    """(always ignored, ever kept) for a sender rule document."""
+    counts = (rule or {}).get("counts", {})
+    kept = counts.get("respond", 0) + counts.get("notify", 0)
+    return counts.get("ignore", 0) >= PREFILTER_MIN_DECISIONS and kept == 0, kept > 0
+
+
+def prefilter(email: dict, rule: Optional[dict] = None) -> Optional[RouterSchema]:
+    """An `ignore` RouterSchema when the message is confidently bulk mail, else None."""
+    always_ignored, ever_kept = _learned(rule)
+    if always_ignored:
+        return RouterSchema(
+            reasoning=f"prefilter: the user ignored every earlier email from {rule['sender']}",
+            classification="ignore",
+            confidence=0.95,
+        )
+    # the user has acted on this sender before; let the model look at it
+    if ever_kept:
+        return None
+
+    hits = list(_signals(email, sender_address(email)))
+    score = sum(weight for _, weight in hits)
+    if score < IGNORE_SCORE:
+        return None
+    return RouterSchema(
+        reasoning="prefilter: " + ", ".join(name for name, _ in hits),
+        classification="ignore",
+        confidence=min(0.99, 0.8 + 0.05 * score),
+    )
+
+
+def _sender_rules():
+    # imported on use so the offline eval (benchmarks.eval_prefilter) needs no database
+    from db.mongodb import sender_rules
+    return sender_rules
+
+
+def get_sender_rule(user_id: str, email: dict) -> Optional[dict]:
+    sender = sender_address(email)
+    if not user_id or not sender:
+        return None
+    return _sender_rules().find_one({"user_id": user_id, "sender": sender}, {"_id": 0})
+
+
+def get_sender_rules(user_id: str, emails: Iterable[dict]) -> Dict[str, dict]:
+    """sender address -> rule for the senders of `emails`, in one query."""
+    senders = {sender_address(e) for e in emails} - {""}
+    if not senders:
+        return {}
+    cursor = _sender_rules().find({"user_id": user_id, "sender": {"$in": list(senders)}}, {"_id": 0})
+    return {doc["sender"]: doc for doc in cursor}
+
+
+def prefilter_many(user_id: str, emails: Iterable[dict]) -> Dict[str, RouterSchema]:
+    """message id -> prefilter answer for the emails that don't need the model."""
+    emails = list(emails)
+    rules = get_sender_rules(user_id, emails)
+    decided = {}
+    for email in emails:
+        result = prefilter(email, rules.get(sender_address(email)))
+        if result is not None and email.get("id"):
+            decided[email["id"]] = result
+    return decided
+
+
+def record_decision(user_id: str, email: dict, classification: str):
+    """Count a user's triage decision for the sender; these become learned rules."""
+    sender = sender_address(email)
+    if not user_id or not sender:
+        return
+    _sender_rules().update_one(
+        {"user_id": user_id, "sender": sender},
+        {
+            "$inc": {f"counts.{classification}": 1},
+            "$set": {"updated_at": datetime.utcnow()},
+        },
+        upsert=True,
+    )
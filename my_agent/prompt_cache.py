@@ -0,0 +1,93 @@
+"""
+System prompts built once per preferences version, and token accounting for
+the calls that use them.
+
+Both system prompts open with a long part that is the same for every email
+and every user (role, tools, instructions, background) and end with the
+user's preference profile. They are formatted once per distinct profile
+text - the text is what preferences_version() hashes - and reused, so every
+call with the same preferences sends a byte-identical prefix that Gemini's
+implicit context cache can serve. The per-email content always comes after
+it, in the user turn.
+"""
+import threading
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Optional
+from my_agent.prompts import (
+    triage_system_prompt,
+    agent_system_prompt_hitl_memory,
+    GMAIL_TOOLS_PROMPT,
+    default_background,
+)
+from routers.settings import PROMPT_CACHE_SIZE
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def triage_system_content(triage_instructions: str) -> str:
+    return triage_system_prompt.format(
+        background=default_background,
+        triage_instructions=triage_instructions,
+    )
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def agent_system_content(response_preferences: str, cal_preferences: str, today: str) -> str:
+    return agent_system_prompt_hitl_memory.format(
+        tools_prompt=GMAIL_TOOLS_PROMPT,
+        today=today,
+        background=default_background,
+        response_preferences=response_preferences,
+        cal_preferences=cal_preferences,
+    )
+
+
+def agent_system_message(response_preferences: str, cal_preferences: str) -> Dict[str, str]:
+    # the date sits in the static part, so the cached prefix changes once a day
+    content = agent_system_content(response_preferences, cal_preferences, date.today().isoformat())
+    return {"role": "system", "content": content}
+
+
+def token_usage(raw) -> Dict[str, int]:
+    """Input tokens split into cached and uncached, plus output, for one LLM response."""
+    usage = getattr(raw, "usage_metadata", None) or {}
+    input_tokens = usage.get("input_tokens", 0)
+    cached = (usage.get("input_token_details") or {}).get("cache_read", 0)
+    return {
+        "input_tokens": input_tokens,
+        "cached_input_tokens": cached,
+        "uncached_input_tokens": input_tokens - cached,
+        "output_tokens": usage.get("output_tokens", 0),
+    }
+
+
+_usage_lock = threading.Lock()
+_usage_totals: Dict[str, Dict[str, int]] = {}
+
+
+def record_usage(node: str, raw) -> Optional[Dict[str, int]]:
+    """Add one response's token usage to the per-node totals."""
+    if raw is None:
+        return None
+    usage = token_usage(raw)
+    with _usage_lock:
+        totals = _usage_totals.setdefault(node, {"calls": 0, **{k: 0 for k in usage}})
+        totals["calls"] += 1
+        for k, v in usage.items():
+            totals[k] += v
+    return usage
+
+
+def usage_stats() -> dict:
+    with _usage_lock:
+        nodes = {node: dict(t) for node, t in _usage_totals.items()}
+    for t in nodes.values():
+        t["cache_hit_rate"] = round(t["cached_input_tokens"] / t["input_tokens"], 3) if t["input_tokens"] else None
+    info = triage_system_content.cache_info(), agent_system_content.cache_info()
+    return {
+        "nodes": nodes,
+        "prompt_cache": {
+            "triage": {"hits": info[0].hits, "misses": info[0].misses, "size": info[0].currsize},
+            "agent": {"hits": info[1].hits, "misses": info[1].misses, "size": info[1].currsize},
+        },
+    }
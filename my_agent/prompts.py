@@ -1,4 +1,3 @@
-from datetime import datetime
 
 #triage prompt
 triage_system_prompt = """
@@ -34,6 +33,22 @@ Body: {body}
 Id: {id}
 """
 
+#batch triage: several emails in one structured call
+triage_batch_user_prompt = """
+Classify each of the {count} emails below independently. Return exactly one
+classification per email and copy its Id exactly.
+
+{emails}
+"""
+
+triage_batch_email = """<email>
+From: {author}
+TO: {to}
+Subject: {subject}
+Body: {body}
+Id: {id}
+</email>"""
+
 #check the tools for with you tools name
 agent_system_prompt_hitl_memory = """
 <Role>
@@ -52,7 +67,7 @@ When handling emails, follow these steps:
 3. If the incoming email asks the user a direct question and you do not have context to answer the question, use the Question tool to ask the user for the answer
 4. For responding to the email, draft a response email with the write_email tool
 5. For meeting requests, use the check_calendar_availability tool to find open time slots
-6. To schedule a meeting, use the schedule_meeting tool with a datetime object for the preferred_day parameter - Today's date is """ + datetime.now().strftime("%Y-%m-%d") + """ - use this for scheduling meetings accurately
+6. To schedule a meeting, use the schedule_meeting tool with a datetime object for the preferred_day parameter - Today's date is {today} - use this for scheduling meetings accurately
 7. If you scheduled a meeting, then draft a short response email using the write_email tool 
 8. After using the write_email tool, the task is complete
 9. If you have sent the email, then use the Done tool to indicate that the task is complete
@@ -224,7 +239,7 @@ EMAIL CONTEXT:
 Available Tools:
 
 1. fetch_emails(user_id, max_threads, max_messages_per_thread, include_read)
-   - Retrieves all email threads for a user
+   - Retrieves the user's most recent email threads (bodies are shortened)
    - user_id MUST be: {email_input.user_id}
 
 2. send_email(
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from typing_extensions import TypedDict, Literal, Optional
+from typing import List
 from langgraph.graph import MessagesState
 
 class RouterSchema(BaseModel):
@@ -13,6 +14,33 @@ class RouterSchema(BaseModel):
         "'notify' for important information that doesn't need a response, "
         "'respond' for emails that need a reply",
     )
+    confidence: float = Field(
+        default=1.0,
+        ge=0.0,
+        le=1.0,
+        description="How sure you are of the classification, from 0 (guess) to 1 (certain).",
+    )
+
+class EmailClassification(BaseModel):
+    """Routing decision for one email of a batch."""
+
+    email_id: str = Field(description="The Id of the email being classified, copied exactly.")
+    reasoning: str = Field(description="Short reasoning behind the classification.")
+    classification: Literal["ignore", "respond", "notify"] = Field(
+        description="'ignore' for irrelevant emails, 'notify' for important information "
+        "that doesn't need a response, 'respond' for emails that need a reply",
+    )
+    confidence: float = Field(
+        default=1.0,
+        ge=0.0,
+        le=1.0,
+        description="How sure you are of the classification, from 0 (guess) to 1 (certain).",
+    )
+
+class BatchRouterSchema(BaseModel):
+    """Classify every email in the batch, one entry per email."""
+
+    classifications: List[EmailClassification]
 
 class StateInput(TypedDict):
     email_input: dict
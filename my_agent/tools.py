@@ -1,64 +1,21 @@
-import requests
 from typing import Optional, Dict, Any, List
 from langchain_core.tools import tool
-from bs4 import BeautifulSoup
-import re
-from routers.settings import BACKEND_URL
+from routers.settings import AGENT_EMAIL_TOKEN_BUDGET, AGENT_EMAIL_BODY_CHARS, AGENT_EMAIL_MAX_THREADS
 from google.oauth2.credentials import Credentials
-from routers.settings import CLIENT_CONFIG, SCOPES
-from google.auth.transport.requests import Request as GoogleAuthRequest
-from googleapiclient.discovery import build
+from routers import google_services
 from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Callable, Any, Optional
 from langchain_core.tools import BaseTool
 from pydantic import BaseModel
-from routers.stores import get_token
 from routers.emails_router import send_email_function
+from db.email_queries import find_recent_threads
 
 #helper funcitons
-def parse_email_html(html_content: str) -> str:
-    if not html_content:
-        return ""
-    
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
-    for element in soup(["script", "style", "head"]):
-        element.decompose()
-    
-    text = soup.get_text(separator='\n')
-    
-    lines = []
-    for line in text.splitlines():
-        cleaned = line.strip()
-        if cleaned and cleaned != '&nbsp;':
-            lines.append(cleaned)
-    
-    clean_text = '\n'.join(lines)
-    clean_text = re.sub(r'\n{3,}', '\n\n', clean_text)
-    
-    return clean_text.strip()
-
 def get_credentials(user_id: str) -> Credentials:
-    tok = get_token(user_id)
-    creds = Credentials(
-        token=tok.get("access_token"),
-        refresh_token=tok.get("refresh_token"),
-        token_uri=CLIENT_CONFIG["web"]["token_uri"],
-        client_id=CLIENT_CONFIG["web"]["client_id"],
-        client_secret=CLIENT_CONFIG["web"]["client_secret"],
-        scopes=SCOPES,
-    )
-    
-    if not creds.valid:
-        creds.refresh(GoogleAuthRequest())
-        get_token(user_id)["access_token"] = creds.token
-        get_token(user_id)["expiry"] = creds.expiry.isoformat() if creds.expiry else None
-    
-    return creds
+    return google_services.get_credentials(user_id)
 
 def mark_email_as_read(user_id: str, message_id: str) -> Dict[str, Any]:
-    creds = get_credentials(user_id)
-    service = build("gmail", "v1", credentials=creds)
+    service = google_services.get_gmail_service(user_id)
     result = service.users().messages().modify(
         userId="me",
         id=message_id,
@@ -67,6 +24,60 @@ def mark_email_as_read(user_id: str, message_id: str) -> Dict[str, Any]:
 
     return True
 
+def _clip(text: str, max_chars: int) -> str:
+    text = (text or "").strip()
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + " …"
+
+
+def summarize_threads(
+    threads: List[Dict[str, Any]],
+    token_budget: int = AGENT_EMAIL_TOKEN_BUDGET,
+    body_chars: int = AGENT_EMAIL_BODY_CHARS
+) -> Dict[str, Any]:
+    """
+    Compact, LLM-facing view of stored threads. Bodies are clipped to
+    body_chars and threads stop being added once the rough token estimate
+    (4 chars per token) would pass token_budget.
+    """
+    budget_chars = token_budget * 4
+    used = 0
+    out = []
+    truncated = False
+
+    for thread in threads:
+        messages = []
+        for m in thread.get("messages", []):
+            body = m.get("body_clean") or m.get("body_text") or m.get("snippet") or ""
+            messages.append({
+                "id": m.get("id"),
+                "from": m.get("from"),
+                "to": m.get("to"),
+                "date": m.get("date"),
+                "unread": bool(m.get("is_unread")),
+                "body": _clip(body, body_chars),
+            })
+        entry = {
+            "thread_id": thread.get("thread_id"),
+            "subject": thread.get("subject") or "",
+            "message_count": thread.get("message_count", len(messages)),
+            "messages": messages,
+        }
+
+        size = len(entry["subject"]) + sum(len(m["body"]) + 80 for m in messages)
+        if out and used + size > budget_chars:
+            truncated = True
+            break
+        used += size
+        out.append(entry)
+
+    return {
+        "thread_count": len(out),
+        "threads": out,
+        "approx_tokens": used // 4,
+        "truncated": truncated,
+    }
+
+
 @tool
 def fetch_emails(
     user_id: str,
@@ -76,35 +87,16 @@ def fetch_emails(
 ) -> Dict[str, Any]:
     """fetch emails of the userid"""
 
-    url = f"{BACKEND_URL}/emails/full-threaded/{user_id}"
-    params = {
-        "max_threads": max_threads,
-        "max_messages_per_thread": max_messages_per_thread,
-        "include_read": include_read
-    }
-    
-    response = requests.get(url, params=params, timeout=30)
-    response.raise_for_status()
-    
-    data = response.json()
-        
-    for thread in data.get("threads", []):
-        for message in thread.get("messages", []):
-            # Add clean body field
-            if message.get("body_html"):
-                message["body"] = parse_email_html(message["body_html"])
-            elif message.get("body_text"):
-                message["body"] = message["body_text"]
-            else:
-                message["body"] = message.get("snippet", "")
-            
-            message.pop("body_html", None)
-            message.pop("body_text", None)
-            message.pop("snippet", None)
+    threads = find_recent_threads(
+        user_id,
+        max_threads=max(1, min(max_threads, AGENT_EMAIL_MAX_THREADS)),
+        max_messages_per_thread=max(1, max_messages_per_thread),
+        include_read=include_read
+    )
 
     return {
         "success": True,
-        "data": data
+        "data": summarize_threads(threads)
     }
         
 
@@ -142,8 +134,7 @@ def check_calendar(
 ) -> Dict[str, Any]:
     """check the calendar for the these dates"""
 
-    creds = get_credentials(user_id)
-    service = build("calendar", "v3", credentials=creds)
+    service = google_services.get_calendar_service(user_id)
     
     ist = timezone(timedelta(hours=5, minutes=30))
     date_ranges = []
@@ -259,8 +250,7 @@ def schedule_meeting(
     description: Optional[str] = ""
 ) -> Dict[str, Any]:
     """schedule meetings for that date"""
-    creds = get_credentials(user_id)
-    service = build("calendar", "v3", credentials=creds)
+    service = google_services.get_calendar_service(user_id)
 
     start_dt = datetime.fromisoformat(start_time)
     end_dt = datetime.fromisoformat(end_time)
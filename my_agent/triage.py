@@ -0,0 +1,159 @@
+import time
+from typing import Any, Dict, List, Tuple
+from my_agent.schema import RouterSchema, BatchRouterSchema
+from my_agent.prompts import (
+    triage_user_prompt,
+    triage_batch_user_prompt,
+    triage_batch_email,
+)
+from my_agent.prompt_cache import triage_system_content, token_usage, record_usage
+from my_agent.utils import parse_gmail
+from routers.settings import (
+    TRIAGE_BATCH_SIZE,
+    TRIAGE_CONCURRENCY,
+    TRIAGE_BODY_CHARS,
+    TRIAGE_ESCALATION_CONFIDENCE,
+)
+
+
+def triage_system_message(triage_instructions: str) -> Dict[str, str]:
+    # memoized per preferences text: identical prefix for every email
+    return {"role": "system", "content": triage_system_content(triage_instructions)}
+
+
+def _email_fields(email: dict, body_chars: int) -> Dict[str, str]:
+    from_, to, subject, body_clean, id_ = parse_gmail(email)
+    return {"author": from_, "to": to, "subject": subject, "body": (body_clean or "")[:body_chars], "id": id_}
+
+
+def needs_escalation(result, threshold: float = TRIAGE_ESCALATION_CONFIDENCE) -> bool:
+    return result is None or getattr(result, "confidence", 1.0) < threshold
+
+
+def _parsed(out, node: str):
+    if isinstance(out, dict) and "parsed" in out:
+        record_usage(node, out.get("raw"))
+        return out["parsed"]
+    return out
+
+
+def classify_email(
+    router,
+    escalation_router,
+    messages: List[dict],
+    threshold: float = TRIAGE_ESCALATION_CONFIDENCE,
+) -> Tuple[RouterSchema, bool]:
+    """
+    Single-email triage on the fast router, re-run on escalation_router when
+    the answer is missing or less confident than threshold. Returns the
+    result and whether it was escalated. Routers built with include_raw=True
+    get their token usage recorded.
+    """
+    result = _parsed(router.invoke(messages), "triage")
+    if escalation_router is None or not needs_escalation(result, threshold):
+        return result, False
+    return _parsed(escalation_router.invoke(messages), "triage_escalation"), True
+
+
+def _result(item, escalated: bool = False) -> Dict[str, Any]:
+    return {
+        "classification": item.classification,
+        "reasoning": item.reasoning,
+        "confidence": item.confidence,
+        "escalated": escalated,
+    }
+
+
+def triage_batch(
+    llm,
+    emails: List[dict],
+    triage_instructions: str,
+    batch_size: int = TRIAGE_BATCH_SIZE,
+    concurrency: int = TRIAGE_CONCURRENCY,
+    body_chars: int = TRIAGE_BODY_CHARS,
+    escalation_llm=None,
+    threshold: float = TRIAGE_ESCALATION_CONFIDENCE,
+) -> Dict[str, Any]:
+    """
+    Classify many emails with few LLM calls: emails are packed batch_size at a
+    time into one structured call (BatchRouterSchema) and up to `concurrency`
+    of those calls run at once. Any email the model leaves out of its answer
+    is re-triaged on its own with the single-email RouterSchema, and with an
+    escalation_llm every answer below threshold is re-run there one by one.
+    """
+    start = time.perf_counter()
+    system = triage_system_message(triage_instructions)
+    batch_router = llm.with_structured_output(BatchRouterSchema, include_raw=True)
+    single_router = llm.with_structured_output(RouterSchema, include_raw=True)
+
+    by_id = {e["id"]: e for e in emails if e.get("id")}
+    chunks = [list(by_id.values())[i:i + batch_size] for i in range(0, len(by_id), batch_size)]
+    prompts = [
+        [system, {"role": "user", "content": triage_batch_user_prompt.format(
+            count=len(chunk),
+            emails="\n\n".join(triage_batch_email.format(**_email_fields(e, body_chars)) for e in chunk),
+        )}]
+        for chunk in chunks
+    ]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    tokens = {"input_tokens": 0, "cached_input_tokens": 0, "uncached_input_tokens": 0, "output_tokens": 0}
+    llm_calls = len(prompts)
+
+    def count(raw):
+        for k, v in token_usage(raw).items():
+            tokens[k] += v
+        record_usage("triage_batch", raw)
+
+    for out in batch_router.batch(prompts, config={"max_concurrency": concurrency}, return_exceptions=True):
+        if isinstance(out, Exception):
+            continue
+        count(out.get("raw"))
+        parsed = out.get("parsed")
+        for item in getattr(parsed, "classifications", None) or []:
+            if item.email_id in by_id:
+                results[item.email_id] = _result(item)
+
+    def run_single(router, email_ids, escalated):
+        nonlocal llm_calls
+        prompts = [
+            [system, {"role": "user", "content": triage_user_prompt.format(**_email_fields(by_id[i], body_chars))}]
+            for i in email_ids
+        ]
+        llm_calls += len(prompts)
+        outs = router.batch(prompts, config={"max_concurrency": concurrency}, return_exceptions=True)
+        for email_id, out in zip(email_ids, outs):
+            if isinstance(out, Exception) or out.get("parsed") is None:
+                continue
+            count(out.get("raw"))
+            results[email_id] = _result(out["parsed"], escalated)
+
+    missing = [email_id for email_id in by_id if email_id not in results]
+    if missing:
+        run_single(single_router, missing, False)
+
+    escalated = []
+    if escalation_llm is not None:
+        escalated = [
+            email_id for email_id in by_id
+            if email_id not in results or results[email_id]["confidence"] < threshold
+        ]
+        if escalated:
+            run_single(escalation_llm.with_structured_output(RouterSchema, include_raw=True), escalated, True)
+
+    elapsed = time.perf_counter() - start
+    triaged = len(results)
+    return {
+        "results": results,
+        "failed": [email_id for email_id in by_id if email_id not in results],
+        "stats": {
+            "emails": len(by_id),
+            "triaged": triaged,
+            "llm_calls": llm_calls,
+            "escalated": len(escalated),
+            "elapsed_seconds": round(elapsed, 3),
+            "emails_per_minute": round(triaged * 60 / elapsed, 1) if elapsed else None,
+            **tokens,
+            "tokens_per_email": round((tokens["input_tokens"] + tokens["output_tokens"]) / triaged, 1) if triaged else None,
+        },
+    }
@@ -0,0 +1,98 @@
+"""
+Persistent triage results, keyed by message id, a hash of what the classifier
+saw and a version of the triage preferences it saw them with.
+
+The version is a hash of the preferences text, so any change to
+triage_preferences (update_memory) makes every older entry unreachable;
+update_memory also deletes them right away.
+"""
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+from pymongo import UpdateOne
+from db.mongodb import triage_cache
+from my_agent.schema import RouterSchema
+from my_agent.utils import parse_gmail
+
+
+def _digest(*parts: str) -> str:
+    h = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        h.update((part or "").encode("utf-8", errors="ignore"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def preferences_version(triage_instructions) -> str:
+    return _digest(str(triage_instructions or ""))
+
+
+def email_hash(email: dict) -> str:
+    from_, to, subject, body_clean, _ = parse_gmail(email)
+    return _digest(from_, to, subject, body_clean)
+
+
+def _key(user_id: str, email: dict, version: str) -> Dict[str, str]:
+    return {
+        "user_id": user_id,
+        "message_id": email.get("id"),
+        "body_hash": email_hash(email),
+        "prefs_version": version,
+    }
+
+
+def get_cached_triage(user_id: str, email: dict, version: str) -> Optional[RouterSchema]:
+    doc = triage_cache.find_one(_key(user_id, email, version), {"_id": 0, "result": 1})
+    return RouterSchema(**doc["result"]) if doc else None
+
+
+def get_cached_triage_many(user_id: str, emails: Iterable[dict], version: str) -> Dict[str, RouterSchema]:
+    """message id -> cached result for whichever of `emails` have one; a single query."""
+    hashes = {e["id"]: email_hash(e) for e in emails if e.get("id")}
+    if not hashes:
+        return {}
+    cursor = triage_cache.find(
+        {"user_id": user_id, "prefs_version": version, "message_id": {"$in": list(hashes)}},
+        {"_id": 0, "message_id": 1, "body_hash": 1, "result": 1},
+    )
+    return {
+        doc["message_id"]: RouterSchema(**doc["result"])
+        for doc in cursor
+        if hashes.get(doc["message_id"]) == doc["body_hash"]
+    }
+
+
+def cache_triage(user_id: str, email: dict, version: str, result: Any):
+    cache_triage_many(user_id, [(email, result)], version)
+
+
+def cache_triage_many(user_id: str, entries: Iterable[tuple], version: str):
+    """entries: (email, result) pairs, result being a RouterSchema or a triage result dict."""
+    operations = []
+    for email, result in entries:
+        if not email.get("id") or result is None:
+            continue
+        if not isinstance(result, dict):
+            result = result.model_dump()
+        operations.append(UpdateOne(
+            _key(user_id, email, version),
+            {"$set": {
+                "result": {
+                    "classification": result["classification"],
+                    "reasoning": result.get("reasoning", ""),
+                    "confidence": result.get("confidence", 1.0),
+                },
+                "created_at": datetime.utcnow(),
+            }},
+            upsert=True,
+        ))
+    if operations:
+        triage_cache.bulk_write(operations, ordered=False)
+
+
+def purge_other_versions(version: str, user_id: Optional[str]) -> int:
+    """Drop the user's entries not made with `version` of the preferences; nothing without a user."""
+    if not user_id:
+        # versions are per user: one user's new profile says nothing about anyone else's entries
+        return 0
+    return triage_cache.delete_many({"user_id": user_id, "prefs_version": {"$ne": version}}).deleted_count
@@ -1,10 +1,21 @@
-from fastapi import APIRouter, HTTPException
+import json
+import anyio
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, Optional, List
-from uuid import uuid4
+from typing import Dict, Any, Optional, List, AsyncIterator, Awaitable, Callable, Tuple
 from langgraph.types import Command
 from langchain_core.messages import AIMessage, HumanMessage
-from my_agent.agent import email_assistant, memory_store, llm
+from my_agent.agent import email_assistant, memory_store, get_memories
+from my_agent.models import triage_llm, escalation_llm, summary_llm
+from my_agent.triage import triage_batch
+from my_agent.prefilter import prefilter_many
+from my_agent.triage_cache import preferences_version, get_cached_triage_many, cache_triage_many
+from inngest.storage import save_triage_results
+from db.agent_threads import agent_thread_id, get_thread, claim_thread, finish_run, storage_report
+from db import agent_jobs
 from db.mongodb import db
 
 router = APIRouter(prefix="/api/agent", tags=["agent-v2"])
@@ -17,34 +28,109 @@ class ProcessEmailRequest(BaseModel):
 class ResumeRequest(BaseModel):
     thread_id: str
     user_response: Dict[str, Any]
+    # the interrupt being answered; a repeated answer to one already handled is a no-op
+    interrupt_id: Optional[str] = None
 
 class SummarizeRequest(BaseModel):
     user_id: str
 
+class TriageBatchRequest(BaseModel):
+    user_id: str
+    limit: int = 50
+    order: Optional[str] = "newest"
+    retriage: bool = False
+
 def _email_threads_collection():
     return db["email_threads"]
 
-def fetch_unread_emails(user_id: str, order: str = "newest") -> List[Dict[str, Any]]:
+# the fields the agent and UI need from an unread message; bodies other than
+# body_clean never leave Mongo
+UNREAD_MESSAGE_FIELDS = [
+    "id", "from", "to", "subject", "body_clean", "body", "date", "ts", "is_unread", "triage",
+    "label_ids", "list_unsubscribe", "precedence", "auto_submitted",
+]
+PREFILTER_FIELDS = ("label_ids", "list_unsubscribe", "precedence", "auto_submitted")
+
+
+def _unread_projection(prefix: str) -> Dict[str, Any]:
+    clean = f"${prefix}.body_clean"
+    return {
+        "_id": 0,
+        "id": f"${prefix}.id",
+        "from": {"$ifNull": [f"${prefix}.from", ""]},
+        "to": {"$ifNull": [f"${prefix}.to", ""]},
+        "subject": {"$ifNull": [f"${prefix}.subject", ""]},
+        "body": {
+            "$cond": [
+                {"$ne": [{"$ifNull": [clean, ""]}, ""]},
+                clean,
+                {"$ifNull": [f"${prefix}.body", ""]}
+            ]
+        },
+        "time": {"$ifNull": [f"${prefix}.date", ""]},
+        "ts": {"$ifNull": [f"${prefix}.ts", 0]},
+        "triage": f"${prefix}.triage",
+        **{f: f"${prefix}.{f}" for f in PREFILTER_FIELDS},
+        "thread_id": "$thread_id",
+        "user_id": "$user_id"
+    }
+
+
+def fetch_unread_emails(
+    user_id: str,
+    order: str = "newest",
+    limit: Optional[int] = None,
+    offset: int = 0,
+    untriaged_only: bool = False
+) -> List[Dict[str, Any]]:
     coll = _email_threads_collection()
     sort_dir = -1 if order == "newest" else 1
-    unread_threads = list(
-        coll.find({"user_id": user_id, "messages.is_unread": True}).sort("created_at", sort_dir)
+    unread_match = {"messages.is_unread": True}
+    if untriaged_only:
+        unread_match["messages.triage"] = {"$exists": False}
+
+    pipeline = [
+        {"$match": {"user_id": user_id, "messages.is_unread": True}},
+        {"$project": {"user_id": 1, "thread_id": 1, **{f"messages.{f}": 1 for f in UNREAD_MESSAGE_FIELDS}}},
+        {"$unwind": "$messages"},
+        {"$match": unread_match},
+        # order by when each message was sent, not when its thread was synced
+        {"$sort": {"messages.ts": sort_dir, "messages.id": sort_dir}},
+    ]
+    if offset:
+        pipeline.append({"$skip": offset})
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline.append({"$project": _unread_projection("messages")})
+
+    return list(coll.aggregate(pipeline))
+
+
+def get_unread_email(user_id: str, email_id: str) -> Optional[Dict[str, Any]]:
+    """Single unread message by Gmail id; one index hit, only that element is returned."""
+    coll = _email_threads_collection()
+    match = {"id": email_id, "is_unread": True}
+    doc = coll.find_one(
+        {"user_id": user_id, "messages": {"$elemMatch": match}},
+        {"_id": 0, "user_id": 1, "thread_id": 1, "messages": {"$elemMatch": match}}
     )
-    emails: List[Dict[str, Any]] = []
-    for thread in unread_threads:
-        for msg in thread.get("messages", []):
-            if msg.get("is_unread"):
-                emails.append({
-                    "id": msg.get("id"),
-                    "from": msg.get("from", ""),
-                    "to": msg.get("to", ""),
-                    "subject": msg.get("subject", ""),
-                    "body": msg.get("body_clean", "") or msg.get("body", ""),
-                    "time": msg.get("date", ""),
-                    "thread_id": thread.get("thread_id"),
-                    "user_id": thread.get("user_id")
-                })
-    return emails
+    if not doc or not doc.get("messages"):
+        return None
+
+    msg = doc["messages"][0]
+    return {
+        "id": msg.get("id"),
+        "from": msg.get("from") or "",
+        "to": msg.get("to") or "",
+        "subject": msg.get("subject") or "",
+        "body": msg.get("body_clean", "") or msg.get("body", ""),
+        "time": msg.get("date") or "",
+        "ts": msg.get("ts", 0),
+        "triage": msg.get("triage"),
+        **{f: msg.get(f) for f in PREFILTER_FIELDS},
+        "thread_id": doc.get("thread_id"),
+        "user_id": doc.get("user_id")
+    }
 
 
 def _extract_interrupt(agent_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -57,28 +143,91 @@ def _extract_interrupt(agent_result: Dict[str, Any]) -> Optional[Dict[str, Any]]
     return None
 
 @router.get("/get-unread-emails")
-async def get_unread_emails(user_id: str, order: str = "newest"):
-    unread = fetch_unread_emails(user_id, order=order)
+async def get_unread_emails(
+    user_id: str,
+    order: str = "newest",
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    offset: int = Query(0, ge=0)
+):
+    unread = await run_in_threadpool(fetch_unread_emails, user_id, order, limit, offset)
     return {"status": "success", "emails": unread, "count": len(unread)}
 
+@router.get("/unread-email/{email_id}")
+async def get_unread_email_endpoint(email_id: str, user_id: str):
+    email = await run_in_threadpool(get_unread_email, user_id, email_id)
+    if not email:
+        raise HTTPException(status_code=404, detail="unread email not found")
+    return {"status": "success", "email": email}
+
+def _running_response(thread_id: str) -> Dict[str, Any]:
+    return {"status": "running", "thread_id": thread_id, "message": "This email is already being processed"}
+
+def _interrupt_id(result: Dict[str, Any]) -> Optional[str]:
+    interrupts = result.get("__interrupt__") or []
+    return getattr(interrupts[0], "id", None) if interrupts else None
+
+def _thread_state(thread_id: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    (record, state) for a thread that has been started, the state shaped like
+    an invoke() result with any pending interrupt; nothing is run.
+    """
+    record = get_thread(thread_id)
+    if record is None:
+        return None
+    snapshot = email_assistant.get_state({"configurable": {"thread_id": thread_id}})
+    state = dict(snapshot.values or {})
+    if record.get("classification_decision"):
+        state.setdefault("classification_decision", record["classification_decision"])
+    if snapshot.interrupts:
+        state["__interrupt__"] = list(snapshot.interrupts)
+    return record, state
+
+def _start_process(user_id: str, email_id: str) -> Tuple[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """
+    (thread_id, response, email). A message that already has a run gets that
+    run's response and nothing is re-run; otherwise the thread is claimed and
+    the email to run with is returned.
+    """
+    thread_id = agent_thread_id(user_id, email_id)
+    existing = _thread_state(thread_id)
+    if existing is not None:
+        record, state = existing
+        if record["status"] in ("interrupted", "completed"):
+            return thread_id, _process_response(state, thread_id, state.get("email_input") or {}), None
+
+    current_email = get_unread_email(user_id, email_id)
+    if not current_email:
+        return thread_id, {"status": "done", "message": "No unread emails found", "next": False}, None
+    if not claim_thread(thread_id, user_id, email_id):
+        return thread_id, _running_response(thread_id), None
+    if existing is not None:
+        # an earlier run failed or died part way: start over on a clean thread
+        email_assistant.checkpointer.delete_thread(thread_id)
+    return thread_id, None, current_email
+
 @router.post("/process-email")
 async def process_email(req: ProcessEmailRequest):
-    user_id = req.user_id
-    email_id = req.email_id
-    order = (req.order or "newest").lower()
-    unread = fetch_unread_emails(user_id, order=order)
+    return await run_in_threadpool(run_process_email, req.user_id, req.email_id)
 
-    if not unread:
-        return {"status": "done", "message": "No unread emails found", "next": False}
+def run_process_email(user_id: str, email_id: str) -> Dict[str, Any]:
+    """The whole blocking /process-email run; also what agent workers execute."""
+    thread_id, response, current_email = _start_process(user_id, email_id)
+    if response is not None:
+        return response
 
-    current_email = next((e for e in unread if e["id"] == email_id), None)
-    thread_id = f"thread_{uuid4().hex[:12]}"
+    try:
+        result = email_assistant.invoke(
+            input={"email_input": current_email, "messages": []},
+            config={"configurable": {"thread_id": thread_id}},
+            store=memory_store
+        )
+    except Exception as e:
+        finish_run(thread_id, None, str(e))
+        raise
+    finish_run(thread_id, result)
+    return _process_response(result, thread_id, current_email)
 
-    result = email_assistant.invoke(
-        input={"email_input": current_email, "messages": []},
-        config={"configurable": {"thread_id": thread_id}},
-        store=memory_store
-    )
+def _process_response(result: Dict[str, Any], thread_id: str, current_email: Dict[str, Any]) -> Dict[str, Any]:
     interrupt = _extract_interrupt(result)
     if interrupt:
         mail_preview = {
@@ -90,6 +239,7 @@ async def process_email(req: ProcessEmailRequest):
         return {
             "status": "interrupted",
             "thread_id": thread_id,
+            "interrupt_id": _interrupt_id(result),
             "mail_preview": mail_preview,
             "interrupt_payload": interrupt.get("interrupt_payload", [])
         }
@@ -100,11 +250,11 @@ async def process_email(req: ProcessEmailRequest):
         "next": True
     }
 
-@router.post("/resume")
-async def resume(req: ResumeRequest):
-    config = {"configurable": {"thread_id": req.thread_id}}
-    user_response_data = req.user_response
-
+def _resume_input(config: Dict[str, Any], user_response_data: Dict[str, Any]):
+    """
+    What to run the graph with for a resume. An edit of a pending tool call is
+    written into the checkpoint first and the graph is simply continued.
+    """
     if user_response_data.get("type") == "edit":
         snapshot = email_assistant.get_state(config)
         existing_messages = snapshot.values.get("messages", [])
@@ -122,27 +272,62 @@ async def resume(req: ResumeRequest):
                 response_metadata=last_msg.response_metadata
             )
             email_assistant.update_state(config, {"messages": updated_msg})
-            result = email_assistant.invoke(None, config=config, store=memory_store)
-        else:
-            result = email_assistant.invoke(
-                Command(resume=user_response_data),
-                config=config,
-                store=memory_store
-            )
-    else:
-        result = email_assistant.invoke(
-            Command(resume=user_response_data),
-            config=config,
-            store=memory_store
-        )
+            return None
+    return Command(resume=user_response_data)
+
+def _start_resume(thread_id: str, interrupt_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    The response when there is nothing to resume - no pending interrupt, or
+    not the one being answered - or the thread is busy; None once the thread
+    is claimed for this resume.
+    """
+    existing = _thread_state(thread_id)
+    if existing is None:
+        raise HTTPException(status_code=404, detail="unknown thread")
+    record, state = existing
+    pending = state.get("__interrupt__") or []
+    if not pending:
+        return _running_response(thread_id) if record["status"] == "running" else _resume_response(state, thread_id)
+    if interrupt_id and interrupt_id not in {getattr(i, "id", None) for i in pending}:
+        # already answered; report where the thread is now
+        return _resume_response(state, thread_id)
+    if not claim_thread(thread_id):
+        return _running_response(thread_id)
+    return None
 
+@router.post("/resume")
+async def resume(req: ResumeRequest):
+    return await run_in_threadpool(run_resume, req.thread_id, req.user_response, req.interrupt_id)
+
+def run_resume(thread_id: str, user_response: Dict[str, Any], interrupt_id: Optional[str] = None) -> Dict[str, Any]:
+    """The whole blocking /resume run; also what agent workers execute."""
+    response = _start_resume(thread_id, interrupt_id)
+    if response is not None:
+        return response
+
+    config = {"configurable": {"thread_id": thread_id}}
+    try:
+        graph_input = _resume_input(config, user_response)
+        result = email_assistant.invoke(graph_input, config=config, store=memory_store)
+    except Exception as e:
+        finish_run(thread_id, None, str(e))
+        raise
+    finish_run(thread_id, result)
+    return _resume_response(result, thread_id)
+
+def _resume_response(result: Dict[str, Any], thread_id: str) -> Dict[str, Any]:
     if "__interrupt__" in result:
         interrupt_data = result.get("__interrupt__", [])
         interrupt_payload = []
         if isinstance(interrupt_data, list) and interrupt_data:
             interrupt_obj = interrupt_data[0]
             interrupt_payload = getattr(interrupt_obj, "value", interrupt_data)
-        return {"status": "interrupted", "thread_id": req.thread_id, "interrupt_payload": interrupt_payload}
+        return {
+            "status": "interrupted",
+            "thread_id": thread_id,
+            "interrupt_id": _interrupt_id(result),
+            "interrupt_payload": interrupt_payload,
+        }
 
     return {
         "status": "completed",
@@ -151,16 +336,264 @@ async def resume(req: ResumeRequest):
         "next": True
     }
 
+# streaming variants: the same runs, pushed over Server-Sent Events as they happen
+#   event: start  {"thread_id"}                          as soon as the request is accepted
+#   event: node   {"node", "graph"}                      every node that finishes
+#   event: token  {"node", "text"}                       partial draft text from the response model
+#   event: tool_call_chunk {"node", "name", "args", "id", "index"}   partial tool arguments
+#   event: final  <the /process-email or /resume response body>
+#   event: error  {"detail"}
+STREAMED_NODES = {"llm_call"}
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+def _chunk_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    # gemini can return a list of parts
+    return "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content or [])
+
+async def _stream_run(
+    thread_id: str,
+    claim: Callable[[], Awaitable[Optional[Dict[str, Any]]]],
+    prepare: Callable[[], Any],
+    respond: Callable[[Dict[str, Any]], Dict[str, Any]],
+) -> AsyncIterator[str]:
+    """
+    The SSE stream of one run. `claim` returns the response for a request that
+    needs no run, or None once it has claimed the thread; it is only called
+    when the body starts, so a response that is never sent holds no claim.
+    `prepare` (blocking) gives the graph input for the claimed run.
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+    interrupts = {}
+    claimed = released = False
+    stream = None
+    try:
+        yield _sse("start", {"thread_id": thread_id})
+        response = await claim()
+        if response is not None:
+            yield _sse("final", response)
+            return
+        claimed = True
+        graph_input = await run_in_threadpool(prepare)
+        stream = email_assistant.astream(
+            graph_input,
+            config=config,
+            store=memory_store,
+            stream_mode=["updates", "messages"],
+            subgraphs=True,
+        )
+        async for namespace, mode, chunk in stream:
+            if mode == "messages":
+                message, metadata = chunk
+                node = metadata.get("langgraph_node")
+                if node not in STREAMED_NODES:
+                    continue
+                text = _chunk_text(getattr(message, "content", ""))
+                if text:
+                    yield _sse("token", {"node": node, "text": text})
+                for tc in getattr(message, "tool_call_chunks", None) or []:
+                    yield _sse("tool_call_chunk", {"node": node, **tc})
+                continue
+
+            for node, update in chunk.items():
+                if node == "__interrupt__":
+                    # a subgraph's interrupt is reported again by the parent
+                    interrupts.update({getattr(i, "id", id(i)): i for i in update})
+                else:
+                    yield _sse("node", {"node": node, "graph": namespace[-1].split(":")[0] if namespace else None})
+
+        snapshot = await email_assistant.aget_state(config)
+        result = dict(snapshot.values)
+        if interrupts:
+            result["__interrupt__"] = list(interrupts.values())
+        released = True
+        await run_in_threadpool(finish_run, thread_id, result)
+        yield _sse("final", respond(result))
+    except Exception as e:
+        if claimed and not released:
+            released = True
+            await run_in_threadpool(finish_run, thread_id, None, str(e))
+        yield _sse("error", {"detail": str(e)})
+    finally:
+        if claimed and not released:
+            # the client went away mid-run (CancelledError/GeneratorExit skip the handler
+            # above). Stop the in-flight step before giving the thread up, so a new run
+            # can't start while this one is still writing checkpoints; shielded because
+            # the surrounding task is being cancelled.
+            with anyio.CancelScope(shield=True):
+                if stream is not None:
+                    await stream.aclose()
+                await run_in_threadpool(finish_run, thread_id, None, "client disconnected")
+
+def _event_stream(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/process-email/stream")
+async def process_email_stream(req: ProcessEmailRequest):
+    """/process-email over SSE: node transitions and draft tokens while the run is going."""
+    thread_id = agent_thread_id(req.user_id, req.email_id)
+    email: Dict[str, Any] = {}
+
+    async def claim():
+        _, response, current_email = await run_in_threadpool(_start_process, req.user_id, req.email_id)
+        email.update(current_email or {})
+        return response
+
+    return _event_stream(_stream_run(
+        thread_id,
+        claim,
+        lambda: {"email_input": email, "messages": []},
+        lambda result: _process_response(result, thread_id, email),
+    ))
+
+@router.post("/resume/stream")
+async def resume_stream(req: ResumeRequest):
+    """/resume over SSE."""
+    if await run_in_threadpool(get_thread, req.thread_id) is None:
+        raise HTTPException(status_code=404, detail="unknown thread")
+
+    config = {"configurable": {"thread_id": req.thread_id}}
+    return _event_stream(_stream_run(
+        req.thread_id,
+        lambda: run_in_threadpool(_start_resume, req.thread_id, req.interrupt_id),
+        lambda: _resume_input(config, req.user_response),
+        lambda result: _resume_response(result, req.thread_id),
+    ))
+
+@router.get("/pending-interrupt")
+async def pending_interrupt(user_id: str, email_id: str):
+    """Where the agent run for a message stands, with its pending interrupt if it is waiting on the user."""
+    thread_id = agent_thread_id(user_id, email_id)
+    existing = await run_in_threadpool(_thread_state, thread_id)
+    if existing is None:
+        raise HTTPException(status_code=404, detail="no agent run for this email")
+    record, state = existing
+    if record["status"] == "running":
+        return _running_response(thread_id)
+    return _process_response(state, thread_id, state.get("email_input") or {})
+
+@router.get("/storage-report")
+async def storage_report_endpoint(user_id: str):
+    """Agent threads by status and the checkpoint storage they take up."""
+    return await run_in_threadpool(storage_report, user_id)
+
+# queued variants: the run is handed to a worker process (python -m worker) and
+# the request returns at once with a job to poll; the job's result is the
+# /process-email or /resume response body. Interrupted runs stay in the
+# checkpointer, so the answer can be queued (or sent to /resume) any time later.
+def _job_response(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {"job_id": job["job_id"], "status": job["status"], "kind": job["kind"], "thread_id": job["thread_id"]}
+
+@router.post("/jobs/process-email", status_code=202)
+async def enqueue_process_email(req: ProcessEmailRequest):
+    thread_id = agent_thread_id(req.user_id, req.email_id)
+    job = await run_in_threadpool(
+        agent_jobs.enqueue, "process_email", req.user_id, thread_id,
+        {"user_id": req.user_id, "email_id": req.email_id},
+    )
+    return _job_response(job)
+
+@router.post("/jobs/resume", status_code=202)
+async def enqueue_resume(req: ResumeRequest):
+    record = await run_in_threadpool(get_thread, req.thread_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="unknown thread")
+    job = await run_in_threadpool(
+        agent_jobs.enqueue, "resume", record.get("user_id"), req.thread_id,
+        {"thread_id": req.thread_id, "user_response": req.user_response, "interrupt_id": req.interrupt_id},
+    )
+    return _job_response(job)
+
+@router.get("/jobs/stats")
+async def job_queue_stats():
+    """Queued and running agent jobs, the age of the oldest queued one, and the concurrency limits."""
+    return await run_in_threadpool(agent_jobs.queue_stats)
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await run_in_threadpool(agent_jobs.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    job.pop("payload", None)
+    return jsonable_encoder(job)
+
+@router.get("/jobs")
+async def list_jobs(user_id: str, limit: int = Query(20, ge=1, le=100)):
+    return {"jobs": jsonable_encoder(await run_in_threadpool(agent_jobs.list_jobs, user_id, limit))}
+
+def run_triage_batch(user_id: str, limit: int, order: str, retriage: bool) -> Dict[str, Any]:
+    emails = fetch_unread_emails(user_id, order, limit, untriaged_only=not retriage)
+    if not emails:
+        return {"triaged": 0, "queued": [], "ignored": [], "failed": [], "stats": {"emails": 0}}
+
+    by_id = {e["id"]: e for e in emails}
+
+    triage_instructions = get_memories(memory_store, user_id, ("triage_preferences",))["triage_preferences"]
+    prefs_version = preferences_version(triage_instructions)
+
+    ruled = prefilter_many(user_id, emails)
+    cached = get_cached_triage_many(user_id, [e for e in emails if e["id"] not in ruled], prefs_version)
+    to_classify = [e for e in emails if e["id"] not in ruled and e["id"] not in cached]
+    outcome = triage_batch(triage_llm, to_classify, triage_instructions, escalation_llm=escalation_llm)
+    cache_triage_many(
+        user_id, [(by_id[i], r) for i, r in outcome["results"].items()], prefs_version
+    )
+    outcome["results"].update({
+        i: {"classification": r.classification, "reasoning": r.reasoning, "confidence": r.confidence, "escalated": False}
+        for i, r in {**cached, **ruled}.items()
+    })
+    outcome["stats"]["cache_hits"] = len(cached)
+    outcome["stats"]["prefiltered"] = len(ruled)
+    save_triage_results(user_id, outcome["results"])
+
+    queued, ignored = [], []
+    for email_id, result in outcome["results"].items():
+        if result["classification"] == "ignore":
+            ignored.append(email_id)
+        else:
+            queued.append({
+                "email_id": email_id,
+                "thread_id": by_id[email_id].get("thread_id"),
+                "subject": by_id[email_id].get("subject", ""),
+                "classification": result["classification"],
+            })
+
+    return {
+        "triaged": len(outcome["results"]),
+        "queued": queued,
+        "ignored": ignored,
+        "failed": outcome["failed"],
+        "stats": outcome["stats"],
+    }
+
+@router.post("/triage-batch")
+async def triage_batch_endpoint(req: TriageBatchRequest):
+    """
+    Classify up to `limit` untriaged unread emails in a few packed LLM calls.
+    ignore is marked read; respond/notify come back as `queued` for
+    /process-email, which reuses the stored classification.
+    """
+    limit = max(1, min(req.limit, 500))
+    result = await run_in_threadpool(run_triage_batch, req.user_id, limit, req.order, req.retriage)
+    return {"status": "success", **result}
+
 @router.post("/summarize")
 async def summarize_inbox(req: SummarizeRequest):
     user_id = req.user_id
 
-    unread_emails = fetch_unread_emails(user_id, order="newest")
+    top_emails = await run_in_threadpool(fetch_unread_emails, user_id, "newest", 10)
 
-    if not unread_emails:
+    if not top_emails:
         return {"status": "success", "summary": "You have no unread emails! 🎉"}
 
-    top_emails = unread_emails[:10]
     email_text = ""
     for e in top_emails:
         clean_body = (e.get("body") or "").replace("\n", " ").strip()[:300]
@@ -174,7 +607,7 @@ async def summarize_inbox(req: SummarizeRequest):
     {email_text}
     """
 
-    response = llm.invoke([HumanMessage(content=prompt)])
+    response = await summary_llm.ainvoke([HumanMessage(content=prompt)])
     return {"status": "success", "summary": response.content}
 
 
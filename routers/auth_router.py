@@ -7,6 +7,7 @@ from datetime import datetime
 from pydantic import BaseModel
 from routers.settings import CLIENT_CONFIG, SCOPES, REDIRECT_URI, CLIENT_ID, FRONTEND_URL
 from routers.stores import save_state_key, get_state_key, delete_state_key, save_token, delete_token 
+from routers.google_services import invalidate_user
 
 router = APIRouter(prefix="/auth/google", tags=["Authentication"])
 
@@ -63,10 +64,12 @@ async def auth_callback(code: str, state: str):
         scopes=list(credentials.scopes),
         expiry=credentials.expiry.isoformat() if credentials.expiry else None
     )
+    invalidate_user(user_id)
     
     return RedirectResponse(url=f"{FRONTEND_URL}/dashboard/{user_id}")
 
 @router.post("/logout")
 async def logout(req: LogoutRequest):
     delete_token(req.user_id)
+    invalidate_user(req.user_id)
     return {"status": "success", "message": "Logged out successfully"}
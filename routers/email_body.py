@@ -0,0 +1,210 @@
+"""
+MIME body extraction and HTML -> text cleaning for synced messages.
+
+The HTML parser is picked once at import: selectolax if installed, then
+BeautifulSoup on lxml, then BeautifulSoup's pure-Python html.parser (the
+original behaviour). Cleaned text is memoized twice: by Gmail message id
+plus a hash of its HTML, which also holds the body_clean already stored for
+a message, and by the hash alone, which catches the same newsletter landing
+in many inboxes. Sync and the agent tools both go
+through clean_body, so a message is cleaned at most once per process, and the
+stored body_clean is reused across restarts (see known_clean below).
+"""
+import base64
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from bs4 import BeautifulSoup
+from routers.settings import EMAIL_MAX_BODY_BYTES, EMAIL_MAX_CLEAN_CHARS, EMAIL_CLEAN_CACHE_SIZE
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as _SelectolaxParser
+except ImportError:
+    _SelectolaxParser = None
+
+try:
+    import lxml  # noqa: F401
+    _BS4_FEATURES = "lxml"
+except ImportError:
+    _BS4_FEATURES = "html.parser"
+
+HTML_BACKEND = "selectolax" if _SelectolaxParser is not None else _BS4_FEATURES
+STRIP_TAGS = ("script", "style", "head")
+_BLANK_RUNS = re.compile(r'\n{3,}')
+
+
+def decode_part(part, max_bytes: int = EMAIL_MAX_BODY_BYTES) -> str:
+    """Base64url-decode a body part, reading no more than max_bytes of it."""
+    body_data = part.get("body", {}).get("data")
+    if not body_data:
+        return ""
+    # 4 base64 chars carry 3 bytes, so only the needed prefix is decoded
+    limit = -(-max_bytes // 3) * 4
+    chunk = body_data[:limit]
+    chunk += "=" * (-len(chunk) % 4)
+    return base64.urlsafe_b64decode(chunk.encode("ascii"))[:max_bytes].decode("utf-8", errors="ignore")
+
+
+def extract_mime_parts(payload, max_bytes: int = EMAIL_MAX_BODY_BYTES) -> Tuple[str, str]:
+    """
+    Walk the MIME tree depth-first without recursion and collect text/plain
+    and text/html parts, each capped at max_bytes in total.
+    """
+    text_parts, html_parts = [], []
+    budget = {"text/plain": max_bytes, "text/html": max_bytes}
+    stack = [payload]
+
+    while stack:
+        node = stack.pop()
+        mime_type = node.get("mimeType", "")
+        if "multipart" in mime_type:
+            # reversed so parts come off the stack in document order
+            stack.extend(reversed(node.get("parts", [])))
+            continue
+
+        remaining = budget.get(mime_type, 0)
+        if remaining <= 0:
+            continue
+        decoded = decode_part(node, remaining)
+        budget[mime_type] = remaining - len(decoded.encode("utf-8"))
+        (text_parts if mime_type == "text/plain" else html_parts).append(decoded)
+
+    return "".join(text_parts), "".join(html_parts)
+
+
+def _raw_text_selectolax(html_content: str) -> str:
+    tree = _SelectolaxParser(html_content)
+    for node in tree.css(",".join(STRIP_TAGS)):
+        node.decompose()
+    root = tree.body or tree.root
+    return root.text(separator='\n', deep=True) if root is not None else ""
+
+
+def _raw_text_bs4(html_content: str, features: str) -> str:
+    soup = BeautifulSoup(html_content, features)
+    for element in soup(list(STRIP_TAGS)):
+        element.decompose()
+    return soup.get_text(separator='\n')
+
+
+def _tidy(text: str) -> str:
+    lines = []
+    for line in text.splitlines():
+        cleaned = line.strip()
+        if cleaned and cleaned != '&nbsp;':
+            lines.append(cleaned)
+
+    clean_text = '\n'.join(lines)
+    clean_text = _BLANK_RUNS.sub('\n\n', clean_text)
+    return clean_text.strip()
+
+
+def html_to_text(html_content: str, backend: Optional[str] = None) -> str:
+    """Uncached HTML -> readable text with the configured (or given) backend."""
+    if not html_content:
+        return ""
+    backend = backend or HTML_BACKEND
+    if backend == "selectolax":
+        raw = _raw_text_selectolax(html_content)
+    else:
+        raw = _raw_text_bs4(html_content, backend)
+    return _tidy(raw)[:EMAIL_MAX_CLEAN_CHARS]
+
+
+def content_hash(html_content: str) -> str:
+    return hashlib.blake2b(html_content.encode("utf-8", errors="ignore"), digest_size=16).hexdigest()
+
+
+class _LRU:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: str):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+_by_message = _LRU(EMAIL_CLEAN_CACHE_SIZE)
+_by_content = _LRU(EMAIL_CLEAN_CACHE_SIZE)
+
+
+def _message_key(message_id: str, key: str) -> str:
+    # the hash keeps an id reused across mailboxes (or a changed body) from hitting
+    return f"{message_id}:{key}"
+
+
+def clean_body(html_content: str, message_id: Optional[str] = None) -> str:
+    """
+    Cleaned text for an HTML body. A message whose body_clean is known is
+    not parsed again; otherwise identical HTML is only parsed once.
+    """
+    if not html_content:
+        return ""
+    key = content_hash(html_content)
+    if message_id:
+        cached = _by_message.get(_message_key(message_id, key))
+        if cached is not None:
+            return cached
+
+    clean = _by_content.get(key)
+    if clean is None:
+        clean = html_to_text(html_content)
+        _by_content.put(key, clean)
+    if message_id:
+        _by_message.put(_message_key(message_id, key), clean)
+    return clean
+
+
+def parse_email_html(html_content: str) -> str:
+    return clean_body(html_content)
+
+
+def remember_clean(message_id: str, html_content: str, body_clean: str):
+    """Seed the message cache with a body_clean that is already stored for this HTML."""
+    if message_id and html_content and body_clean is not None:
+        _by_message.put(_message_key(message_id, content_hash(html_content)), body_clean)
+
+
+def cache_stats() -> dict:
+    return {
+        "message_hits": _by_message.hits,
+        "message_misses": _by_message.misses,
+        "content_hits": _by_content.hits,
+        "content_misses": _by_content.misses,
+    }
+
+
+def process_payload(
+    payload,
+    message_id: Optional[str] = None,
+    known_clean: Optional[str] = None,
+    max_bytes: int = EMAIL_MAX_BODY_BYTES,
+) -> Tuple[str, str, str]:
+    """
+    (body_text, body_html, body_clean) for a Gmail message payload. Pass the
+    body_clean already stored for message_id as known_clean to skip cleaning.
+    """
+    body_text, body_html = extract_mime_parts(payload, max_bytes)
+    if known_clean is not None:
+        remember_clean(message_id, body_html, known_clean)
+        return body_text, body_html, known_clean
+    return body_text, body_html, clean_body(body_html, message_id)
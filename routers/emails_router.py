@@ -1,21 +1,22 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request as GoogleAuthRequest
-from googleapiclient.discovery import build
-from datetime import datetime, timedelta, timezone
-from email.utils import parsedate_to_datetime
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 import base64
 import logging
 from typing import Optional
 from pydantic import BaseModel
-from routers.settings import CLIENT_CONFIG, SCOPES
-from routers.stores import save_token, get_token, update_access_token, delete_token
+from routers.stores import get_token
+from routers import google_services
+from routers.gmail_batch import fetch_threads_batched
+from routers.email_body import process_payload
+from routers.google_async import google_client
 from db.mongodb import email_threads
+from inngest.storage import message_ts, get_stored_clean_bodies
 import threading
-from bs4 import BeautifulSoup
-import re
 from db.mongodb import user_profiles
 
 
@@ -31,6 +32,80 @@ class GmailRequest(BaseModel):
 
 token_lock = threading.Lock()
 
+
+def get_gmail_credentials(user_id: str) -> Credentials:
+    return google_services.get_credentials(user_id)
+
+
+def get_gmail_service(user_id: str):
+    return google_services.get_gmail_service(user_id)
+
+
+def build_message_obj(msg: dict, known_clean: Optional[str] = None) -> dict:
+    """
+    Turn a Gmail API message resource (format=full) into the stored message shape.
+    known_clean is the body_clean already stored for this message, if any.
+    """
+    payload = msg.get("payload", {})
+    headers = payload.get("headers", [])
+
+    def h(name):
+        return next((h["value"] for h in headers if h["name"].lower() == name.lower()), None)
+
+    body_text, body_html, body_clean = process_payload(payload, msg.get("id"), known_clean)
+
+
+    label_ids = msg.get("labelIds", [])
+    is_unread = "UNREAD" in label_ids
+
+    raw_date = h("Date")
+
+    return {
+        "id": msg.get("id"),
+        "snippet": msg.get("snippet"),
+        "from": h("From"),
+        "to": h("To"),
+        "subject": h("Subject"),
+        "date": raw_date,
+        # parsed once here; everything downstream sorts/filters on ts
+        "ts": message_ts(raw_date),
+        "is_unread": is_unread,
+        "label_ids": label_ids,
+        # bulk-mail signals for the triage prefilter
+        "list_unsubscribe": h("List-Unsubscribe") is not None,
+        "precedence": (h("Precedence") or "").strip().lower(),
+        "auto_submitted": (h("Auto-Submitted") or "").strip().lower(),
+        "body_text": body_text.strip(),
+        "body_html": body_html.strip(),
+        "body_clean": body_clean
+    }
+
+
+def build_thread_obj(
+    user_id: str,
+    thread_data: dict,
+    max_messages_per_thread: int = 10,
+    known_clean: Optional[dict] = None
+) -> dict:
+    """Turn a Gmail API thread resource (format=full) into the stored thread shape."""
+    known_clean = known_clean or {}
+    thread_msgs = [
+        build_message_obj(msg, known_clean.get(msg.get("id")))
+        for msg in thread_data.get("messages", [])[:max_messages_per_thread]
+    ]
+
+    thread_msgs.sort(key=lambda m: m["ts"])
+
+    return {
+        "userId": user_id,
+        "threadId": thread_data.get("id"),
+        "message_count": len(thread_msgs),
+        "subject": thread_msgs[0]["subject"] if thread_msgs else None,
+        "participants": list({m["from"] for m in thread_msgs if m.get("from")}),
+        "messages": thread_msgs
+    }
+
+
 def fetch_primary_inbox_emails_threaded_sync(
     user_id: str,
     max_threads: int = 30, #later change this 20
@@ -38,31 +113,15 @@ def fetch_primary_inbox_emails_threaded_sync(
     include_read: bool = True
 ):
     
-    tok = get_token(user_id)
-
-    creds = Credentials(
-        token=tok.get("access_token"),
-        refresh_token=tok.get("refresh_token"),
-        token_uri=CLIENT_CONFIG["web"]["token_uri"],
-        client_id=CLIENT_CONFIG["web"]["client_id"],
-        client_secret=CLIENT_CONFIG["web"]["client_secret"],
-        scopes=SCOPES,
-    )
-
-    if not creds.valid:
-        creds.refresh(GoogleAuthRequest())
-        update_access_token(
-            user_id,
-            creds.token,
-            creds.expiry.isoformat() if creds.expiry else None
-        )
-
-    service = build("gmail", "v1", credentials=creds)
+    service = get_gmail_service(user_id)
     profile_info = service.users().getProfile(userId="me").execute()
     gmail_id = profile_info.get("emailAddress")
+    # captured before listing so that changes made during the fetch are
+    # replayed by the next incremental sync instead of being lost
+    history_id = profile_info.get("historyId")
 
     try:
-        oauth_service = build("oauth2", "v2", credentials=creds)
+        oauth_service = google_services.get_oauth2_service(user_id)
         user_info = oauth_service.userinfo().get().execute()
         user_name = user_info.get("given_name", "")
         profile_photo = user_info.get("picture", "")
@@ -80,133 +139,18 @@ def fetch_primary_inbox_emails_threaded_sync(
         maxResults=max_threads
     ).execute()
 
-    threads = threads_resp.get("threads", [])
-    all_threads = []
-
-    def decode_part(part):
-        body_data = part.get("body", {}).get("data")
-        if not body_data:
-            return ""
-        return base64.urlsafe_b64decode(body_data.encode("utf-8")).decode("utf-8", errors="ignore")
-
-    def extract_mime_parts(payload):
-        body_text, body_html = "", ""
-        mime_type = payload.get("mimeType", "")
-        if "multipart" in mime_type:
-            for part in payload.get("parts", []):
-                t, h = extract_mime_parts(part)
-                body_text += t
-                body_html += h
-        else:
-            if mime_type == "text/plain":
-                body_text += decode_part(payload)
-            elif mime_type == "text/html":
-                body_html += decode_part(payload)
-        return body_text, body_html
-
-    def parse_email_html(html_content: str) -> str:
-        if not html_content:
-            return ""
-        
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        for element in soup(["script", "style", "head"]):
-            element.decompose()
-        
-        text = soup.get_text(separator='\n')
-        
-        lines = []
-        for line in text.splitlines():
-            cleaned = line.strip()
-            if cleaned and cleaned != '&nbsp;':
-                lines.append(cleaned)
-        
-        clean_text = '\n'.join(lines)
-        clean_text = re.sub(r'\n{3,}', '\n\n', clean_text)
-        
-        return clean_text.strip()
-
-    for thread in threads:
-        thread_id = thread.get("id")
-        thread_data = service.users().threads().get(userId="me", id=thread_id, format="full").execute()
-
-        thread_msgs = []
-        for msg in thread_data.get("messages", [])[:max_messages_per_thread]:
-            payload = msg.get("payload", {})
-            headers = payload.get("headers", [])
-
-            def h(name):
-                return next((h["value"] for h in headers if h["name"].lower() == name.lower()), None)
-
-            body_text, body_html = extract_mime_parts(payload)
-            
-            #make the room for boooooody_clean
-            body_clean = parse_email_html(body_html)
-
-
-            label_ids = msg.get("labelIds", [])
-            is_unread = "UNREAD" in label_ids
-
-            raw_date = h("Date")
-
-            try:
-                parsed_date = parsedate_to_datetime(raw_date)
-
-                if parsed_date.tzinfo is None:
-                    parsed_date = parsed_date.replace(tzinfo=timezone.utc)
-
-                # Convert to IST
-                ist = timezone(timedelta(hours=5, minutes=30))
-                parsed_date = parsed_date.astimezone(ist)
-
-                now = datetime.now(ist)
-
-                if parsed_date.date() == now.date():
-                    sent_time = parsed_date.strftime("Today, %I:%M %p")
-                elif parsed_date.date() == (now - timedelta(days=1)).date():
-                    sent_time = parsed_date.strftime("Yesterday, %I:%M %p")
-                else:
-                    sent_time = parsed_date.strftime("%d %b, %I:%M %p")
-
-            except Exception:
-                sent_time = raw_date or "Unknown"
-
-
-            msg_obj = {
-                "id": msg.get("id"),
-                "snippet": msg.get("snippet"),
-                "from": h("From"),
-                "to": h("To"),
-                "subject": h("Subject"),
-                "date": raw_date,
-                "sent_time": sent_time,
-                "is_unread": is_unread,
-                "body_text": body_text.strip(),
-                "body_html": body_html.strip(),
-                "body_clean": body_clean
-            }
-            thread_msgs.append(msg_obj)
-
-        def parse_date_safe(d):
-            try:
-                return parsedate_to_datetime(d)
-            except Exception:
-                return datetime.min
-
-        thread_msgs.sort(key=lambda m: parse_date_safe(m.get("date")))
-
-        all_threads.append({
-            "userId": user_id,
-            "threadId": thread_id,
-            "message_count": len(thread_msgs),
-            "subject": thread_msgs[0]["subject"] if thread_msgs else None,
-            "participants": list({m["from"] for m in thread_msgs if m.get("from")}),
-            "messages": thread_msgs
-        })
+    thread_ids = [t.get("id") for t in threads_resp.get("threads", [])]
+    fetched = fetch_threads_batched(service, thread_ids, format="full")
+    known_clean = get_stored_clean_bodies(user_id, thread_ids)
+    all_threads = [
+        build_thread_obj(user_id, fetched[thread_id], max_messages_per_thread, known_clean)
+        for thread_id in thread_ids if thread_id in fetched
+    ]
 
     return {
         "thread_count": len(all_threads),
         "threads": all_threads,
+        "history_id": history_id,
         "user_info": {
             "user_id": user_id,
             "gmail_id": gmail_id,
@@ -217,58 +161,190 @@ def fetch_primary_inbox_emails_threaded_sync(
 
 
 @router.get("/full-threaded/{user_id}")
-async def get_full_threaded_emails(user_id: str):
-    threads_docs = list(
-        email_threads.find({"user_id": user_id})
-    )
+async def get_full_threaded_emails(user_id: str, tz: Optional[str] = None):
+    return await run_in_threadpool(_load_full_threaded_emails, user_id, tz)
 
-    if not threads_docs:
-        return {
-            "thread_count": 0,
-            "threads": [],
-            "user_info": None
-        }
 
-    def get_last_msg_date(thread_doc):
-        messages = thread_doc.get("messages", [])
-        if not messages:
-            return datetime.min
+BODY_FIELDS = ("body_html", "body_text", "body_clean")
+# what the frontend has always been shown; callers pass ?tz= to override
+DEFAULT_DISPLAY_TZ = "Asia/Kolkata"
 
-        last_msg = messages[-1] 
-        raw_date = last_msg.get("date")
 
-        try:
-            return parsedate_to_datetime(raw_date)
-        except:
-            return datetime.min
-
-    threads_docs.sort(key=get_last_msg_date, reverse=True)
-
-    transformed_threads = [
-        {
-            "threadId": t.get("thread_id"),
-            "message_count": t.get("message_count", 0),
-            "subject": t.get("subject", ""),
-            "participants": t.get("participants", []),
-            "messages": t.get("messages", [])
-        }
-        for t in threads_docs
-    ]
+def resolve_tz(tz_name: Optional[str]):
+    try:
+        return ZoneInfo(tz_name or DEFAULT_DISPLAY_TZ)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"unknown timezone: {tz_name}")
+
+
+def humanize_ts(ts: Optional[float], tz, fallback: Optional[str] = None) -> str:
+    """Render a stored epoch as "Today, 10:32 AM" / "Yesterday, ..." / "05 Mar, ..." in tz."""
+    if not ts:
+        return fallback or "Unknown"
+
+    sent = datetime.fromtimestamp(ts, tz)
+    today = datetime.now(tz).date()
+
+    if sent.date() == today:
+        return sent.strftime("Today, %I:%M %p")
+    if sent.date() == today - timedelta(days=1):
+        return sent.strftime("Yesterday, %I:%M %p")
+    return sent.strftime("%d %b, %I:%M %p")
+
 
+THREAD_SORT = [("last_message_ts", -1), ("thread_id", -1)]
+
+
+def _transform_thread(t: dict, tz) -> dict:
+    messages = t.get("messages", [])
+    for m in messages:
+        m["sent_time"] = humanize_ts(m.get("ts"), tz, m.get("date"))
+
+    return {
+        "threadId": t.get("thread_id"),
+        "message_count": t.get("message_count", 0),
+        "subject": t.get("subject", ""),
+        "participants": t.get("participants", []),
+        "last_message_ts": t.get("last_message_ts"),
+        "messages": messages
+    }
+
+
+def _load_user_info(user_id: str):
     user_profile = user_profiles.find_one({"user_id": user_id})
-    user_info = {
+    return {
         "gmail_id": user_profile.get("gmail_id"),
         "profile_photo": user_profile.get("profile_photo"),
         "user_name": user_profile.get("user_name")
     } if user_profile else None
 
+
+def encode_cursor(thread_doc: dict) -> str:
+    raw = f"{thread_doc.get('last_message_ts') or 0}|{thread_doc.get('thread_id')}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    try:
+        ts, thread_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+        return float(ts), thread_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+def list_threads_page(
+    user_id: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    include_bodies: bool = False,
+    tz: Optional[str] = None
+):
+    zone = resolve_tz(tz)
+    query = {"user_id": user_id}
+    if cursor:
+        ts, thread_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"last_message_ts": {"$lt": ts}},
+            {"last_message_ts": ts, "thread_id": {"$lt": thread_id}},
+        ]
+
+    projection = {"_id": 0}
+    if not include_bodies:
+        projection.update({f"messages.{field}": 0 for field in BODY_FIELDS})
+
+    # one extra row tells us whether there is a next page
+    docs = list(email_threads.find(query, projection).sort(THREAD_SORT).limit(limit + 1))
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+
+    return {
+        "thread_count": len(docs),
+        "threads": [_transform_thread(t, zone) for t in docs],
+        "next_cursor": encode_cursor(docs[-1]) if has_more else None,
+        # the profile only changes on sync, first page is enough
+        "user_info": None if cursor else _load_user_info(user_id)
+    }
+
+
+@router.get("/threads/{user_id}")
+async def list_threads(
+    user_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    include_bodies: bool = False,
+    tz: Optional[str] = None
+):
+    return await run_in_threadpool(list_threads_page, user_id, limit, cursor, include_bodies, tz)
+
+
+@router.get("/threads/{user_id}/{thread_id}")
+async def get_thread(user_id: str, thread_id: str, tz: Optional[str] = None):
+    zone = resolve_tz(tz)
+    doc = await run_in_threadpool(
+        email_threads.find_one, {"user_id": user_id, "thread_id": thread_id}, {"_id": 0}
+    )
+    if not doc:
+        raise HTTPException(status_code=404, detail="thread not found")
+    return _transform_thread(doc, zone)
+
+
+def _load_full_threaded_emails(user_id: str, tz: Optional[str] = None):
+    zone = resolve_tz(tz)
+    threads_docs = list(
+        email_threads.find({"user_id": user_id}, {"_id": 0}).sort(THREAD_SORT)
+    )
+
+    if not threads_docs:
+        return {
+            "thread_count": 0,
+            "threads": [],
+            "user_info": None
+        }
+
+    transformed_threads = [_transform_thread(t, zone) for t in threads_docs]
+
     return {
         "thread_count": len(transformed_threads),
         "threads": transformed_threads,
-        "user_info": user_info
+        "user_info": _load_user_info(user_id)
     }
 
 
+def reply_subject(original_msg: dict) -> str:
+    headers = original_msg.get("payload", {}).get("headers", [])
+    original_subject = next(
+        (h["value"] for h in headers if h["name"] == "Subject"),
+        "No Subject"
+    )
+    
+    if not original_subject.lower().startswith("re:"):
+        return f"Re: {original_subject}"
+    return original_subject
+
+
+def build_send_body(
+    body_text: str,
+    recipient: str,
+    subject: Optional[str],
+    thread_id: Optional[str],
+    reply_to_message_id: Optional[str],
+    is_reply: bool
+) -> dict:
+    message = MIMEMultipart("alternative")
+    message["to"] = recipient
+    message["subject"] = subject if subject else "(No Subject)"
+    if is_reply:
+        message["In-Reply-To"] = reply_to_message_id
+        message["References"] = reply_to_message_id
+
+    message.attach(MIMEText(body_text, "plain"))
+    raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
+    body = {"raw": raw_message}
+    if thread_id and thread_id.strip():
+        body["threadId"] = thread_id
+    return body
+
+
 def send_email_function(
     user_id: str,
     body_text: str,
@@ -279,24 +355,7 @@ def send_email_function(
 ):
 
     tok = get_token(user_id)
-    creds = Credentials(
-        token=tok.get("access_token"),
-        refresh_token=tok.get("refresh_token"),
-        token_uri=CLIENT_CONFIG["web"]["token_uri"],
-        client_id=CLIENT_CONFIG["web"]["client_id"],
-        client_secret=CLIENT_CONFIG["web"]["client_secret"],
-        scopes=SCOPES,
-    )
-
-    if not creds.valid:
-        creds.refresh(GoogleAuthRequest())
-        update_access_token(
-            user_id,
-            creds.token,
-            creds.expiry.isoformat() if creds.expiry else None
-        )
-
-    service = build("gmail", "v1", credentials=creds)
+    service = get_gmail_service(user_id)
     is_reply = bool(reply_to_message_id and thread_id)
     if is_reply and not subject:
         try:
@@ -306,39 +365,52 @@ def send_email_function(
                 format="metadata",
                 metadataHeaders=["Subject"]
             ).execute()
-            
-            headers = original_msg.get("payload", {}).get("headers", [])
-            original_subject = next(
-                (h["value"] for h in headers if h["name"] == "Subject"),
-                "No Subject"
-            )
-            
-            if not original_subject.lower().startswith("re:"):
-                subject = f"Re: {original_subject}"
-            else:
-                subject = original_subject
+            subject = reply_subject(original_msg)
         except Exception as e:
             subject = "Re: (No Subject)"
 
-    message = MIMEMultipart("alternative")
     recipient = to_email or tok.get("user_email")
     if not recipient:
         profile = service.users().getProfile(userId="me").execute()
         recipient = profile.get("emailAddress")
 
-    message["to"] = recipient
-    message["subject"] = subject if subject else "(No Subject)"
-    if is_reply:
-        message["In-Reply-To"] = reply_to_message_id
-        message["References"] = reply_to_message_id
+    body = build_send_body(body_text, recipient, subject, thread_id, reply_to_message_id, is_reply)
+    sent_msg = service.users().messages().send(userId="me", body=body).execute()
+    return {
+        "status": "success",
+        "message_id": sent_msg.get("id"),
+        "thread_id": sent_msg.get("threadId")
+    }
 
-    message.attach(MIMEText(body_text, "plain"))
-    raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
-    body = {"raw": raw_message}
-    if thread_id and thread_id.strip():
-        body["threadId"] = thread_id
 
-    sent_msg = service.users().messages().send(userId="me", body=body).execute()
+async def send_email_async(
+    user_id: str,
+    body_text: str,
+    to_email: Optional[str] = None,
+    subject: Optional[str] = None,
+    thread_id: Optional[str] = None,
+    reply_to_message_id: Optional[str] = None
+):
+    """Same as send_email_function, but never blocks the event loop."""
+
+    tok = await run_in_threadpool(get_token, user_id)
+    is_reply = bool(reply_to_message_id and thread_id)
+    if is_reply and not subject:
+        try:
+            original_msg = await google_client.get_message(
+                user_id, reply_to_message_id, format="metadata", metadata_headers=["Subject"]
+            )
+            subject = reply_subject(original_msg)
+        except Exception as e:
+            subject = "Re: (No Subject)"
+
+    recipient = to_email or tok.get("user_email")
+    if not recipient:
+        profile = await google_client.get_profile(user_id)
+        recipient = profile.get("emailAddress")
+
+    body = build_send_body(body_text, recipient, subject, thread_id, reply_to_message_id, is_reply)
+    sent_msg = await google_client.send_message(user_id, body)
     return {
         "status": "success",
         "message_id": sent_msg.get("id"),
@@ -347,11 +419,11 @@ def send_email_function(
 
 @router.post("/send")
 async def send_email_endpoint(request: GmailRequest):
-    return send_email_function(
+    return await send_email_async(
         user_id=request.user_id,
         body_text=request.body_text,
         to_email=request.to_email,
         subject=request.subject,
         thread_id=request.thread_id,
         reply_to_message_id=request.reply_to_message_id
-    )
\ No newline at end of file
+    )
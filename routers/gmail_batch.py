@@ -0,0 +1,83 @@
+import time
+import random
+import logging
+from typing import Dict, List, Optional
+from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
+from routers.settings import GMAIL_BATCH_SIZE, GMAIL_BATCH_MAX_RETRIES, GMAIL_BATCH_URI
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _is_retryable(exception) -> bool:
+    return isinstance(exception, HttpError) and exception.resp.status in RETRYABLE_STATUSES
+
+
+def _new_batch(service, callback, batch_uri: Optional[str]):
+    if batch_uri:
+        return BatchHttpRequest(callback=callback, batch_uri=batch_uri)
+    return service.new_batch_http_request(callback=callback)
+
+
+def fetch_threads_batched(
+    service,
+    thread_ids: List[str],
+    format: str = "full",
+    batch_size: int = GMAIL_BATCH_SIZE,
+    max_retries: int = GMAIL_BATCH_MAX_RETRIES,
+    batch_uri: Optional[str] = GMAIL_BATCH_URI,
+) -> Dict[str, dict]:
+    """
+    Fetch many threads through Gmail's HTTP batch endpoint, batch_size
+    sub-requests per round trip. Items that come back 429/5xx are retried
+    with exponential backoff; threads that no longer exist (404) are skipped.
+    Returns {thread_id: thread_resource}.
+    """
+    results: Dict[str, dict] = {}
+    pending = [tid for tid in dict.fromkeys(thread_ids) if tid]
+    attempt = 0
+
+    while pending:
+        retry = []
+        failures = []
+
+        def callback(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+            elif _is_retryable(exception):
+                retry.append(request_id)
+            elif isinstance(exception, HttpError) and exception.resp.status == 404:
+                logger.info("thread %s disappeared before it could be fetched", request_id)
+            else:
+                failures.append(exception)
+
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            batch = _new_batch(service, callback, batch_uri)
+            for thread_id in chunk:
+                batch.add(
+                    service.users().threads().get(userId="me", id=thread_id, format=format),
+                    request_id=thread_id
+                )
+            try:
+                batch.execute()
+            except HttpError as e:
+                # the whole batch was throttled rather than individual items
+                if not _is_retryable(e):
+                    raise
+                retry.extend(tid for tid in chunk if tid not in results)
+
+        if failures:
+            raise failures[0]
+
+        if retry and attempt >= max_retries:
+            raise RuntimeError(f"gave up on {len(retry)} thread(s) after {max_retries} retries")
+
+        pending = retry
+        if pending:
+            time.sleep((2 ** attempt) + random.random())
+            attempt += 1
+
+    return results
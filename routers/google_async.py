@@ -0,0 +1,99 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+import httpx
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from routers.google_services import get_credentials, cached_credentials
+from routers.settings import (
+    GMAIL_API_BASE_URL,
+    GMAIL_HTTP_TIMEOUT_SECONDS,
+    GOOGLE_HTTP_MAX_CONNECTIONS,
+)
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class AsyncGoogleClient:
+    """
+    Non-blocking Gmail REST client for the request path.
+
+    One pooled httpx.AsyncClient is shared by every request in the worker, so
+    TLS connections to Google stay warm. Credentials come from the shared
+    per-user cache; a cold lookup or refresh is pushed onto the threadpool.
+    """
+
+    def __init__(
+        self,
+        gmail_base_url: str = GMAIL_API_BASE_URL,
+        timeout: float = GMAIL_HTTP_TIMEOUT_SECONDS,
+        max_connections: int = GOOGLE_HTTP_MAX_CONNECTIONS,
+        max_retries: int = 2,
+    ):
+        self.gmail_base_url = gmail_base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _access_token(self, user_id: str) -> str:
+        creds = cached_credentials(user_id)
+        if creds is None:
+            creds = await run_in_threadpool(get_credentials, user_id)
+        return creds.token
+
+    async def request(self, user_id: str, method: str, url: str, **kwargs) -> Dict[str, Any]:
+        token = await self._access_token(user_id)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        for attempt in range(self.max_retries + 1):
+            resp = await self.client.request(method, url, headers=headers, **kwargs)
+            if resp.status_code not in RETRYABLE_STATUSES or attempt == self.max_retries:
+                break
+            await asyncio.sleep(0.5 * (2 ** attempt))
+
+        if resp.status_code >= 400:
+            raise HTTPException(status_code=resp.status_code, detail=resp.text)
+        return resp.json() if resp.content else {}
+
+    # gmail
+    async def get_profile(self, user_id: str) -> Dict[str, Any]:
+        return await self.request(user_id, "GET", f"{self.gmail_base_url}/gmail/v1/users/me/profile")
+
+    async def get_message(
+        self,
+        user_id: str,
+        message_id: str,
+        format: str = "full",
+        metadata_headers: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        params = {"format": format}
+        if metadata_headers:
+            params["metadataHeaders"] = metadata_headers
+        return await self.request(
+            user_id, "GET", f"{self.gmail_base_url}/gmail/v1/users/me/messages/{message_id}", params=params
+        )
+
+    async def send_message(self, user_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.request(
+            user_id, "POST", f"{self.gmail_base_url}/gmail/v1/users/me/messages/send", json=body
+        )
+
+
+google_client = AsyncGoogleClient()
@@ -0,0 +1,158 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import httplib2
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+from routers.settings import GMAIL_HTTP_TIMEOUT_SECONDS, GOOGLE_SERVICE_CACHE_SIZE
+from routers.stores import get_token
+from routers.token_manager import credentials_from_token, ensure_fresh, is_fresh
+
+_local = threading.local()
+# per-user single-flight locks are striped: a fixed set that eviction never touches
+USER_LOCK_STRIPES = 64
+
+
+def _thread_http() -> httplib2.Http:
+    """One keep-alive httplib2.Http per thread; httplib2 itself is not thread-safe."""
+    http = getattr(_local, "http", None)
+    if http is None:
+        http = httplib2.Http(timeout=GMAIL_HTTP_TIMEOUT_SECONDS)
+        _local.http = http
+    return http
+
+
+class _Entry:
+    def __init__(self, creds: Credentials):
+        self.creds = creds
+        self.services: Dict[Tuple[str, str], object] = {}
+        self.lock = threading.Lock()
+
+    def fresh(self) -> bool:
+        return is_fresh(self.creds.token, self.creds.expiry)
+
+
+class GoogleServiceCache:
+    """
+    Process-wide, per-user cache of OAuth credentials and discovery-built
+    Gmail/Calendar service objects.
+
+    Entries live until their token expires; at that point the credentials are
+    brought up to date in place through the token manager (usually by picking
+    up the token the renewal job already stored) so the cached service objects
+    keep working. Least recently used users are evicted past max_size.
+    """
+
+    def __init__(self, max_size: int = GOOGLE_SERVICE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._user_locks = [threading.Lock() for _ in range(USER_LOCK_STRIPES)]
+
+    def _user_lock(self, user_id: str) -> threading.Lock:
+        # a user keeps the same lock whether or not their entry is cached
+        return self._user_locks[hash(user_id) % USER_LOCK_STRIPES]
+
+    def _peek(self, user_id: str) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+            return entry
+
+    def _remember(self, user_id: str, entry: _Entry):
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _load(self, user_id: str) -> _Entry:
+        tok = get_token(user_id)
+        if not tok:
+            raise LookupError(f"no stored token for user {user_id}")
+        return _Entry(credentials_from_token(tok))
+
+    def _entry(self, user_id: str) -> _Entry:
+        entry = self._peek(user_id)
+        if entry is not None and entry.fresh():
+            return entry
+
+        # single flight: one thread loads/refreshes, the rest wait and reuse it
+        with self._user_lock(user_id):
+            entry = self._peek(user_id)
+            if entry is None:
+                entry = self._load(user_id)
+            if not entry.fresh():
+                ensure_fresh(user_id, entry.creds)
+            self._remember(user_id, entry)
+            return entry
+
+    def get_credentials(self, user_id: str) -> Credentials:
+        return self._entry(user_id).creds
+
+    def cached_credentials(self, user_id: str) -> Optional[Credentials]:
+        """Warm, unexpired credentials or None; never touches Mongo or Google."""
+        entry = self._peek(user_id)
+        return entry.creds if entry is not None and entry.fresh() else None
+
+    def get_service(self, user_id: str, name: str, version: str):
+        entry = self._entry(user_id)
+        key = (name, version)
+        service = entry.services.get(key)
+        if service is not None:
+            return service
+
+        with entry.lock:
+            service = entry.services.get(key)
+            if service is None:
+                creds = entry.creds
+
+                def request_builder(http, *args, **kwargs):
+                    return HttpRequest(AuthorizedHttp(creds, http=_thread_http()), *args, **kwargs)
+
+                # static_discovery uses the discovery documents bundled with
+                # google-api-python-client, so build() never hits the network
+                service = build(
+                    name,
+                    version,
+                    http=AuthorizedHttp(creds, http=_thread_http()),
+                    requestBuilder=request_builder,
+                    static_discovery=True,
+                    cache_discovery=False,
+                )
+                entry.services[key] = service
+            return service
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+service_cache = GoogleServiceCache()
+
+
+def get_credentials(user_id: str) -> Credentials:
+    return service_cache.get_credentials(user_id)
+
+
+def cached_credentials(user_id: str) -> Optional[Credentials]:
+    return service_cache.cached_credentials(user_id)
+
+
+def get_gmail_service(user_id: str):
+    return service_cache.get_service(user_id, "gmail", "v1")
+
+
+def get_calendar_service(user_id: str):
+    return service_cache.get_service(user_id, "calendar", "v3")
+
+
+def get_oauth2_service(user_id: str):
+    return service_cache.get_service(user_id, "oauth2", "v2")
+
+
+def invalidate_user(user_id: str):
+    service_cache.invalidate(user_id)
@@ -10,6 +10,117 @@ FRONTEND_MAIL_PAGE = os.getenv("FRONTEND_MAIL_PAGE")
 FRONTEND_URL = os.getenv("FRONTEND_URL")
 BACKEND_URL = os.getenv("BACKEND_URL")
 
+# "incremental" patches threads from Gmail history, "full" deletes and reloads every cycle
+SYNC_MODE = os.getenv("SYNC_MODE", "incremental")
+# primary-inbox threads kept per user: what a full resync loads, and what
+# incremental syncs trim back to after adding new threads
+SYNC_MAX_THREADS = int(os.getenv("SYNC_MAX_THREADS", "30"))
+
+# multi-user sync engine: every user is synced once per interval, spread over
+# the interval by a stable per-user slot, on a bounded worker pool
+SYNC_INTERVAL_MINUTES = int(os.getenv("SYNC_INTERVAL_MINUTES", "10"))
+SYNC_WORKERS = int(os.getenv("SYNC_WORKERS", "8"))
+SYNC_USER_TIMEOUT_SECONDS = float(os.getenv("SYNC_USER_TIMEOUT_SECONDS", "120"))
+# socket timeout for each Gmail API call so a hung connection can't pin a worker
+GMAIL_HTTP_TIMEOUT_SECONDS = float(os.getenv("GMAIL_HTTP_TIMEOUT_SECONDS", "30"))
+
+# async request-path client; the base url only changes when pointing at a local stand-in
+GMAIL_API_BASE_URL = os.getenv("GMAIL_API_BASE_URL", "https://gmail.googleapis.com")
+GOOGLE_HTTP_MAX_CONNECTIONS = int(os.getenv("GOOGLE_HTTP_MAX_CONNECTIONS", "100"))
+# threads available to FastAPI for blocking work (Mongo, LangGraph runs)
+API_THREADPOOL_SIZE = int(os.getenv("API_THREADPOOL_SIZE", "64"))
+
+# users whose credentials + built Gmail/Calendar services are kept warm per process
+GOOGLE_SERVICE_CACHE_SIZE = int(os.getenv("GOOGLE_SERVICE_CACHE_SIZE", "256"))
+
+# the scheduler refreshes tokens this long before they expire
+TOKEN_RENEW_AHEAD_MINUTES = int(os.getenv("TOKEN_RENEW_AHEAD_MINUTES", "5"))
+
+# Gmail HTTP batch endpoint: sub-requests per round trip (Google caps it at 100,
+# but anything over ~50 tends to get rate limited) and per-item retry budget
+GMAIL_BATCH_SIZE = int(os.getenv("GMAIL_BATCH_SIZE", "25"))
+GMAIL_BATCH_MAX_RETRIES = int(os.getenv("GMAIL_BATCH_MAX_RETRIES", "3"))
+# only set this to point the batch endpoint at a local stand-in
+GMAIL_BATCH_URI = os.getenv("GMAIL_BATCH_URI")
+
+# bytes decoded per body (text and html each) and characters kept after cleaning;
+# newsletters past this are mostly markup and tracking
+EMAIL_MAX_BODY_BYTES = int(os.getenv("EMAIL_MAX_BODY_BYTES", str(512 * 1024)))
+EMAIL_MAX_CLEAN_CHARS = int(os.getenv("EMAIL_MAX_CLEAN_CHARS", "50000"))
+# cleaned bodies kept in memory, keyed by a hash of the html
+EMAIL_CLEAN_CACHE_SIZE = int(os.getenv("EMAIL_CLEAN_CACHE_SIZE", "2048"))
+
+# what the agent's fetch_emails tool may put in front of the model
+AGENT_EMAIL_TOKEN_BUDGET = int(os.getenv("AGENT_EMAIL_TOKEN_BUDGET", "4000"))
+AGENT_EMAIL_BODY_CHARS = int(os.getenv("AGENT_EMAIL_BODY_CHARS", "1200"))
+AGENT_EMAIL_MAX_THREADS = int(os.getenv("AGENT_EMAIL_MAX_THREADS", "25"))
+
+# batch triage: emails packed into one structured call, calls in flight at once,
+# and how much of each body the classifier sees
+TRIAGE_BATCH_SIZE = int(os.getenv("TRIAGE_BATCH_SIZE", "10"))
+TRIAGE_CONCURRENCY = int(os.getenv("TRIAGE_CONCURRENCY", "4"))
+TRIAGE_BODY_CHARS = int(os.getenv("TRIAGE_BODY_CHARS", "2000"))
+
+# model per agent node: triage and summaries are cheap classification/condensing
+# jobs, drafting and memory rewrites keep the stronger model
+TRIAGE_MODEL = os.getenv("TRIAGE_MODEL", "gemini-2.5-flash")
+TRIAGE_ESCALATION_MODEL = os.getenv("TRIAGE_ESCALATION_MODEL", "gemini-2.5-pro")
+RESPONSE_MODEL = os.getenv("RESPONSE_MODEL", "gemini-2.5-pro")
+MEMORY_MODEL = os.getenv("MEMORY_MODEL", "gemini-2.5-pro")
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gemini-2.5-flash")
+# triage answers below this self-reported confidence are re-run on the escalation model
+TRIAGE_ESCALATION_CONFIDENCE = float(os.getenv("TRIAGE_ESCALATION_CONFIDENCE", "0.7"))
+
+# rule prefilter ahead of triage: extra comma-separated sender domains that are
+# always ignored, and how many consistent user decisions make a learned rule
+PREFILTER_IGNORE_DOMAINS = [d.strip().lower() for d in os.getenv("PREFILTER_IGNORE_DOMAINS", "").split(",") if d.strip()]
+PREFILTER_MIN_DECISIONS = int(os.getenv("PREFILTER_MIN_DECISIONS", "2"))
+
+# per-process cache in front of the agent memory store: entries older than the
+# TTL are revalidated against the record's version; with change streams on
+# (needs a replica set, e.g. Atlas) other processes' writes evict immediately
+MEMORY_CACHE_SIZE = int(os.getenv("MEMORY_CACHE_SIZE", "1024"))
+MEMORY_CACHE_TTL_SECONDS = float(os.getenv("MEMORY_CACHE_TTL_SECONDS", "30"))
+MEMORY_CACHE_CHANGE_STREAM = os.getenv("MEMORY_CACHE_CHANGE_STREAM", "false").lower() == "true"
+
+# preference-memory rewrites run in the background: feedback for a namespace
+# that arrives within the debounce window (or while a rewrite is running) is
+# folded into one LLM call, at most MAX_EVENTS events per call
+MEMORY_UPDATE_WORKERS = int(os.getenv("MEMORY_UPDATE_WORKERS", "2"))
+MEMORY_UPDATE_DEBOUNCE_SECONDS = float(os.getenv("MEMORY_UPDATE_DEBOUNCE_SECONDS", "2"))
+MEMORY_UPDATE_MAX_EVENTS = int(os.getenv("MEMORY_UPDATE_MAX_EVENTS", "20"))
+MEMORY_UPDATE_FLUSH_SECONDS = float(os.getenv("MEMORY_UPDATE_FLUSH_SECONDS", "30"))
+
+# formatted system prompts kept per distinct preferences text (i.e. per
+# preferences version), so the static prefix is byte-identical across calls
+# and can be served from Gemini's implicit context cache
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "1024"))
+
+# agent checkpoint retention: checkpoints kept per thread (resuming needs only
+# the latest), how long finished threads are kept, and how long a thread left
+# waiting on the user (or started before threads were tracked) survives
+CHECKPOINT_KEEP_LATEST = int(os.getenv("CHECKPOINT_KEEP_LATEST", "2"))
+CHECKPOINT_COMPLETED_TTL_HOURS = float(os.getenv("CHECKPOINT_COMPLETED_TTL_HOURS", "24"))
+CHECKPOINT_ABANDONED_TTL_DAYS = float(os.getenv("CHECKPOINT_ABANDONED_TTL_DAYS", "14"))
+CHECKPOINT_PRUNE_INTERVAL_MINUTES = int(os.getenv("CHECKPOINT_PRUNE_INTERVAL_MINUTES", "15"))
+CHECKPOINT_PRUNE_BATCH = int(os.getenv("CHECKPOINT_PRUNE_BATCH", "500"))
+
+# a run that has held its thread longer than this is assumed dead and can be restarted
+AGENT_RUN_LEASE_SECONDS = int(os.getenv("AGENT_RUN_LEASE_SECONDS", "600"))
+
+# agent job queue: runs are executed by worker processes (python -m worker),
+# each running up to AGENT_WORKER_CONCURRENCY jobs, with at most
+# AGENT_JOBS_MAX_RUNNING running across all workers and AGENT_JOBS_PER_USER per user;
+# a job whose worker misses heartbeats for the lease, or whose agent thread is
+# busy with another run, is retried (the latter after RETRY_DELAY) up to MAX_ATTEMPTS
+AGENT_WORKER_CONCURRENCY = int(os.getenv("AGENT_WORKER_CONCURRENCY", "4"))
+AGENT_WORKER_POLL_SECONDS = float(os.getenv("AGENT_WORKER_POLL_SECONDS", "0.5"))
+AGENT_JOBS_MAX_RUNNING = int(os.getenv("AGENT_JOBS_MAX_RUNNING", "16"))
+AGENT_JOBS_PER_USER = int(os.getenv("AGENT_JOBS_PER_USER", "2"))
+AGENT_JOB_LEASE_SECONDS = int(os.getenv("AGENT_JOB_LEASE_SECONDS", "300"))
+AGENT_JOB_MAX_ATTEMPTS = int(os.getenv("AGENT_JOB_MAX_ATTEMPTS", "2"))
+AGENT_JOB_RETRY_DELAY_SECONDS = int(os.getenv("AGENT_JOB_RETRY_DELAY_SECONDS", "30"))
+
 CLIENT_CONFIG = {
     "web": {
         "client_id": CLIENT_ID,
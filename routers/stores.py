@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from db.mongodb import state_store, token_store
 
 def save_state_key(state_key: str):
@@ -54,12 +54,50 @@ def update_access_token(user_id: str, new_access_token: str, new_expiry: str):
         {
             "$set": {
                 "access_token": new_access_token,
-                "expiry": new_expiry
-            }
+                "expiry": new_expiry,
+                "refreshed_at": datetime.utcnow().isoformat()
+            },
+            "$unset": {"refresh_lease_owner": "", "refresh_lease_until": ""}
         }
     )
 
 
+def acquire_refresh_lease(user_id: str, owner: str, seconds: int) -> bool:
+    """Atomically claim the right to refresh this user's token for `seconds`."""
+    now = datetime.utcnow()
+    doc = token_store.find_one_and_update(
+        {
+            "user_id": user_id,
+            "$or": [
+                {"refresh_lease_until": {"$exists": False}},
+                {"refresh_lease_until": {"$lt": now}}
+            ]
+        },
+        {"$set": {"refresh_lease_owner": owner, "refresh_lease_until": now + timedelta(seconds=seconds)}},
+        projection={"_id": 1}
+    )
+    return doc is not None
+
+
+def release_refresh_lease(user_id: str, owner: str):
+    token_store.update_one(
+        {"user_id": user_id, "refresh_lease_owner": owner},
+        {"$unset": {"refresh_lease_owner": "", "refresh_lease_until": ""}}
+    )
+
+
+def get_expiring_tokens(before_iso: str):
+    """Tokens whose stored expiry (naive UTC isoformat) falls before `before_iso`."""
+    try:
+        return list(token_store.find(
+            {"expiry": {"$ne": None, "$lt": before_iso}},
+            {"user_id": 1, "access_token": 1, "refresh_token": 1, "expiry": 1, "_id": 0}
+        ))
+    except Exception as e:
+        print(f"error fetching expiring tokens: {e}")
+        return []
+
+
 def delete_token(user_id: str):
     token_store.delete_one({"user_id": user_id})
 
@@ -0,0 +1,144 @@
+import time
+import logging
+import threading
+from uuid import uuid4
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from google.oauth2.credentials import Credentials
+from google.auth.transport.requests import Request as GoogleAuthRequest
+from routers.settings import CLIENT_CONFIG, SCOPES, TOKEN_RENEW_AHEAD_MINUTES
+from routers.stores import (
+    get_token,
+    update_access_token,
+    acquire_refresh_lease,
+    release_refresh_lease,
+    get_expiring_tokens,
+)
+
+logger = logging.getLogger(__name__)
+
+# refresh a little before Google would start rejecting the token
+EXPIRY_SKEW = timedelta(seconds=60)
+RENEW_AHEAD = timedelta(minutes=TOKEN_RENEW_AHEAD_MINUTES)
+# how long one process may hold the refresh lease before others take over
+LEASE_SECONDS = 30
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _user_lock(user_id: str) -> threading.Lock:
+    with _locks_guard:
+        lock = _locks.get(user_id)
+        if lock is None:
+            lock = _locks[user_id] = threading.Lock()
+        return lock
+
+
+def parse_expiry(expiry) -> Optional[datetime]:
+    if not expiry:
+        return None
+    if isinstance(expiry, datetime):
+        dt = expiry
+    else:
+        try:
+            dt = datetime.fromisoformat(str(expiry).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    # google-auth compares against naive UTC
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def is_fresh(token: Optional[str], expiry: Optional[datetime], margin: timedelta = EXPIRY_SKEW) -> bool:
+    if not token:
+        return False
+    if expiry is None:
+        return True
+    return datetime.utcnow() + margin < expiry
+
+
+def credentials_from_token(tok: dict) -> Credentials:
+    return Credentials(
+        token=tok.get("access_token"),
+        refresh_token=tok.get("refresh_token"),
+        token_uri=CLIENT_CONFIG["web"]["token_uri"],
+        client_id=CLIENT_CONFIG["web"]["client_id"],
+        client_secret=CLIENT_CONFIG["web"]["client_secret"],
+        scopes=SCOPES,
+        expiry=parse_expiry(tok.get("expiry")),
+    )
+
+
+def _adopt_stored(creds: Credentials, tok: Optional[dict], margin: timedelta) -> bool:
+    """Take over a token another process (or the renewal job) already refreshed."""
+    if not tok:
+        return False
+    expiry = parse_expiry(tok.get("expiry"))
+    if not is_fresh(tok.get("access_token"), expiry, margin):
+        return False
+    creds.token = tok.get("access_token")
+    creds.expiry = expiry
+    return True
+
+
+def ensure_fresh(user_id: str, creds: Credentials, margin: timedelta = EXPIRY_SKEW) -> Credentials:
+    """
+    Make creds valid for at least `margin`, refreshing at most once per user.
+
+    Threads in this process serialize on a per-user lock; across processes the
+    refresh goes to whoever wins the lease on the token_store document, and
+    everyone else picks the new token up from Mongo. The refreshed token is
+    written back with update_access_token, which also drops the lease.
+    """
+    if is_fresh(creds.token, creds.expiry, margin):
+        return creds
+
+    with _user_lock(user_id):
+        if is_fresh(creds.token, creds.expiry, margin):
+            return creds
+        if _adopt_stored(creds, get_token(user_id), margin):
+            return creds
+
+        owner = uuid4().hex
+        if not acquire_refresh_lease(user_id, owner, LEASE_SECONDS):
+            deadline = time.monotonic() + LEASE_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(0.25)
+                if _adopt_stored(creds, get_token(user_id), margin):
+                    return creds
+            # the other holder died mid-refresh; its lease has lapsed by now
+            acquire_refresh_lease(user_id, owner, LEASE_SECONDS)
+
+        try:
+            creds.refresh(GoogleAuthRequest())
+        except Exception:
+            release_refresh_lease(user_id, owner)
+            raise
+
+        update_access_token(
+            user_id,
+            creds.token,
+            creds.expiry.isoformat() if creds.expiry else None
+        )
+        return creds
+
+
+def renew_expiring_tokens(ahead: timedelta = RENEW_AHEAD) -> int:
+    """
+    Scheduler job: refresh every token that expires within `ahead`, so the
+    request path finds a valid token in Mongo instead of paying for a refresh.
+    """
+    cutoff = (datetime.utcnow() + ahead).isoformat()
+    renewed = 0
+    for tok in get_expiring_tokens(cutoff):
+        user_id = tok.get("user_id")
+        if not user_id or not tok.get("refresh_token"):
+            continue
+        try:
+            ensure_fresh(user_id, credentials_from_token(tok), margin=ahead)
+            renewed += 1
+        except Exception as e:
+            logger.warning("token renewal failed for %s: %s", user_id, e)
+    return renewed
@@ -0,0 +1,43 @@
+"""
+Run the app modules without Mongo or Google: db.mongodb connects and builds
+indexes at import, so the client is swapped for mongomock and the
+checkpointer for an in-memory one before anything imports it. mongomock's
+bulk_write predates the `sort` argument current pymongo sends, so bulk
+writes are replayed one operation at a time.
+"""
+import os
+import sys
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+import pymongo
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+import langgraph.checkpoint.mongodb as checkpoint_mongodb
+from langgraph.checkpoint.memory import InMemorySaver
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+_client = mongomock.MongoClient()
+pymongo.MongoClient = lambda *args, **kwargs: _client
+checkpoint_mongodb.MongoDBSaver = lambda *args, **kwargs: InMemorySaver()
+
+
+def _bulk_write(self, operations, ordered=True, **kwargs):
+    for op in operations:
+        if isinstance(op, InsertOne):
+            self.insert_one(op._doc)
+        elif isinstance(op, UpdateOne):
+            self.update_one(op._filter, op._doc, upsert=op._upsert)
+        elif isinstance(op, UpdateMany):
+            self.update_many(op._filter, op._doc, upsert=op._upsert)
+        elif isinstance(op, ReplaceOne):
+            self.replace_one(op._filter, op._doc, upsert=op._upsert)
+        elif isinstance(op, DeleteOne):
+            self.delete_one(op._filter)
+        elif isinstance(op, DeleteMany):
+            self.delete_many(op._filter)
+
+
+mongomock.collection.Collection.bulk_write = _bulk_write
@@ -0,0 +1,158 @@
+"""
+/process-email/stream and /resume/stream driven by a fake streaming chat
+model: the SSE events a run produces, replays for a message that already has
+a run, and no thread claim outliving a client that goes away.
+"""
+import asyncio
+import json
+from typing import List, Tuple
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+import my_agent.agent as agent
+import routers.agent_router as agent_router
+from db.agent_threads import agent_thread_id, get_thread
+from my_agent.schema import RouterSchema
+
+DRAFT = "Thanks, I will get back to you tomorrow"
+
+
+class FakeStreamingChat(BaseChatModel):
+    """Streams DRAFT word by word, then a send_email call in two argument chunks."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for word in DRAFT.split():
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                run_manager.on_llm_new_token(word + " ", chunk=chunk)
+            yield chunk
+        args = json.dumps({"user_id": "u1", "body_text": DRAFT})
+        for i, part in enumerate((args[:15], args[15:])):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[{
+                "name": "send_email" if i == 0 else None,
+                "args": part,
+                "id": "call_1" if i == 0 else None,
+                "index": 0,
+            }]))
+            if run_manager:
+                run_manager.on_llm_new_token("", chunk=chunk)
+            yield chunk
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        final = None
+        for chunk in self._stream(messages, stop, run_manager, **kwargs):
+            final = chunk if final is None else final + chunk
+        message = AIMessage(content=final.message.content, tool_calls=final.message.tool_calls)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+@pytest.fixture(autouse=True)
+def fake_models(monkeypatch):
+    decision = RouterSchema(reasoning="needs a reply", classification="respond")
+    monkeypatch.setattr(agent, "llm_router", RunnableLambda(lambda _: {"raw": None, "parsed": decision}))
+    monkeypatch.setattr(agent, "llm_with_tools", FakeStreamingChat())
+    monkeypatch.setattr(agent, "queue_memory_update", lambda *args: None)
+    monkeypatch.setattr(agent_router, "get_unread_email", lambda user_id, email_id: {
+        "id": email_id, "user_id": user_id, "thread_id": "t1",
+        "from": "alice@example.com", "to": "me@example.com", "subject": "Lunch?", "body_clean": "Free tomorrow?",
+    })
+
+
+def _parse(raw: str) -> Tuple[str, dict]:
+    event, data = raw.strip().split("\n")
+    return event[len("event: "):], json.loads(data[len("data: "):])
+
+
+async def _events(response) -> List[Tuple[str, dict]]:
+    return [_parse(raw) async for raw in response.body_iterator]
+
+
+def test_process_email_stream_events_and_replay():
+    req = agent_router.ProcessEmailRequest(user_id="u1", email_id="m-stream")
+
+    async def run():
+        first = await _events(await agent_router.process_email_stream(req))
+        again = await _events(await agent_router.process_email_stream(req))
+        return first, again
+
+    events, replay = asyncio.run(run())
+    kinds = [kind for kind, _ in events]
+    assert kinds[0] == "start" and kinds[-1] == "final", events[-1]
+    assert "node" in kinds and "error" not in kinds
+    assert "".join(d["text"] for k, d in events if k == "token").strip() == DRAFT
+    tool_chunks = [d for k, d in events if k == "tool_call_chunk"]
+    assert tool_chunks[0]["name"] == "send_email"
+    assert json.loads("".join(d["args"] for d in tool_chunks))["body_text"] == DRAFT
+
+    final = events[-1][1]
+    assert final["status"] == "interrupted" and final["interrupt_id"]
+    assert get_thread(final["thread_id"])["status"] == "interrupted"
+    # a second submit of the same message replays the outcome without running the graph
+    assert [kind for kind, _ in replay] == ["start", "final"]
+    assert replay[-1][1]["interrupt_id"] == final["interrupt_id"]
+
+
+def test_resume_stream_continues_the_pending_interrupt():
+    req = agent_router.ProcessEmailRequest(user_id="u1", email_id="m-resume")
+
+    async def run():
+        interrupted = (await _events(await agent_router.process_email_stream(req)))[-1][1]
+        answer = agent_router.ResumeRequest(
+            thread_id=interrupted["thread_id"],
+            user_response={"type": "response", "args": "make it shorter"},
+            interrupt_id=interrupted["interrupt_id"],
+        )
+        return interrupted, await _events(await agent_router.resume_stream(answer))
+
+    interrupted, events = asyncio.run(run())
+    assert events[0] == ("start", {"thread_id": interrupted["thread_id"]})
+    assert any(kind == "token" for kind, _ in events)
+    final = events[-1][1]
+    assert events[-1][0] == "final" and final["status"] == "interrupted"
+    assert final["interrupt_id"] != interrupted["interrupt_id"]
+
+
+def test_client_disconnect_releases_the_thread():
+    req = agent_router.ProcessEmailRequest(user_id="u1", email_id="m-gone")
+    thread_id = agent_thread_id("u1", "m-gone")
+
+    async def run():
+        response = await agent_router.process_email_stream(req)
+        events = response.body_iterator
+        async for raw in events:
+            if _parse(raw)[0] == "token":
+                break
+        # what Starlette does when the client goes away mid-stream
+        await events.aclose()
+        # the in-flight step is stopped and the thread released before aclose returns
+        return get_thread(thread_id)["status"]
+
+    assert asyncio.run(run()) == "error"
+    # the message can be processed again straight away instead of reporting "running"
+    final = asyncio.run(_events_for(req))[-1][1]
+    assert final["status"] == "interrupted"
+
+
+def test_unsent_response_holds_no_claim():
+    req = agent_router.ProcessEmailRequest(user_id="u1", email_id="m-unsent")
+
+    async def run():
+        # the client is gone before the body starts: the stream is never iterated
+        await agent_router.process_email_stream(req)
+
+    asyncio.run(run())
+    assert get_thread(agent_thread_id("u1", "m-unsent")) is None
+    assert asyncio.run(_events_for(req))[-1][1]["status"] == "interrupted"
+
+
+async def _events_for(req):
+    return await _events(await agent_router.process_email_stream(req))
@@ -0,0 +1,115 @@
+"""
+Agent worker process: runs the queued email_assistant jobs.
+
+    python -m worker
+
+Each process runs up to AGENT_WORKER_CONCURRENCY jobs at once; the global and
+per-user limits are enforced in Mongo (db/agent_jobs.py), so throughput scales
+by starting more of these next to the API.
+"""
+import os
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+from uuid import uuid4
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from db import agent_jobs
+from my_agent.agent import memory_updates
+from routers.agent_router import run_process_email, run_resume
+from routers.settings import (
+    AGENT_WORKER_CONCURRENCY,
+    AGENT_WORKER_POLL_SECONDS,
+    AGENT_JOB_LEASE_SECONDS,
+    MEMORY_UPDATE_FLUSH_SECONDS,
+)
+
+
+def _run_job(job: Dict[str, Any]) -> Any:
+    payload = job["payload"]
+    if job["kind"] == "process_email":
+        return run_process_email(payload["user_id"], payload["email_id"])
+    if job["kind"] == "resume":
+        return run_resume(payload["thread_id"], payload["user_response"], payload.get("interrupt_id"))
+    raise ValueError(f"unknown job kind {job['kind']!r}")
+
+
+class AgentWorker:
+    def __init__(self, concurrency: int = AGENT_WORKER_CONCURRENCY):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:6]}"
+        self.concurrency = concurrency
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="agent-job")
+        self._running: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _execute(self, job: Dict[str, Any]):
+        try:
+            result, error = jsonable_encoder(_run_job(job)), None
+        except HTTPException as e:
+            result, error = None, str(e.detail)
+        except Exception as e:
+            result, error = None, str(e)
+        try:
+            if isinstance(result, dict) and result.get("status") == "running":
+                # another run holds the agent thread; this one hasn't happened yet
+                agent_jobs.retry(job, "agent thread busy")
+            else:
+                agent_jobs.finish(job, result, error)
+        finally:
+            with self._lock:
+                self._running.pop(job["_id"], None)
+
+    def _free(self) -> int:
+        with self._lock:
+            return self.concurrency - len(self._running)
+
+    def _housekeeping(self):
+        # heartbeats well inside the lease; any worker may requeue another's dead jobs
+        interval = max(AGENT_JOB_LEASE_SECONDS / 3, 1)
+        while not self._stop.wait(interval):
+            try:
+                with self._lock:
+                    job_ids = list(self._running)
+                agent_jobs.heartbeat(job_ids)
+                recovered = agent_jobs.recover_stale()
+                if recovered:
+                    print(f"agent worker {self.worker_id}: recovered {recovered} stale jobs")
+            except Exception as e:
+                print(f"agent worker housekeeping error: {e}")
+
+    def run(self):
+        print(f"agent worker {self.worker_id} started ({self.concurrency} slots)")
+        # also resyncs the slot counters
+        agent_jobs.recover_stale()
+        threading.Thread(target=self._housekeeping, daemon=True).start()
+        while not self._stop.is_set():
+            job = None
+            if self._free() > 0:
+                try:
+                    job = agent_jobs.claim_next(self.worker_id)
+                except Exception as e:
+                    print(f"agent worker claim error: {e}")
+            if job is None:
+                self._stop.wait(AGENT_WORKER_POLL_SECONDS)
+                continue
+            with self._lock:
+                self._running[job["_id"]] = job
+            self._pool.submit(self._execute, job)
+        self._pool.shutdown(wait=True)
+        print(f"agent worker {self.worker_id} stopped")
+
+    def stop(self, *_):
+        # finish the jobs in hand, claim no more
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    worker = AgentWorker()
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+    # apply feedback the finished runs queued for the preference profiles
+    memory_updates.shutdown(MEMORY_UPDATE_FLUSH_SECONDS)